@@ -1,34 +1,21 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-import mysql.connector
-from mysql.connector import Error
+import io
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response
+from db import Error, get_db_connection, pool_stats as db_pool_stats
+import cart_store
+import catalog
+import catalog_import
+import exports
+import fragments
+import idempotency
+import ids
+import inventory
+import outbox
+import queries
+import reservations
 
 # Create admin blueprint
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'drugweb',
-    'user': 'root',
-    'password': ''
-}
-
-def get_db_connection():
-    """Create and return a database connection"""
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS drugweb")
-        cursor.execute("USE drugweb")
-        cursor.close()
-        
-        DB_CONFIG['database'] = 'drugweb'
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None
-
 @admin_bp.route('/payments')
 def admin_payments():
     """Admin view to see all customer payments"""
@@ -44,26 +31,14 @@ def admin_payments():
     try:
         cursor = connection.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT p.payment_id, p.Customer_ID, p.amount, p.payment_type, p.DeliveryMan_ID,
-                   CONCAT(u.F_name, ' ', u.L_name) as customer_name, u.phone as customer_phone, u.address as customer_address
-            FROM payment p
-            JOIN customer c ON p.Customer_ID = c.Customer_ID
-            JOIN user u ON c.Customer_ID = u.ID
-            ORDER BY p.payment_id DESC
-        """)
+        cursor.execute(queries.ADMIN_PAYMENTS)
         
         payments = cursor.fetchall()
         
         for payment in payments:
             if payment['DeliveryMan_ID']:
                 try:
-                    cursor.execute("""
-                        SELECT CONCAT(u.F_name, ' ', u.L_name) as Name, u.phone as Phone 
-                        FROM deliveryman d 
-                        JOIN user u ON d.DeliveryMan_ID = u.ID 
-                        WHERE d.DeliveryMan_ID = %s
-                    """, (payment['DeliveryMan_ID'],))
+                    cursor.execute(queries.PAYMENT_DELIVERYMAN, (payment['DeliveryMan_ID'],))
                     deliveryman = cursor.fetchone()
                     if deliveryman:
                         payment['deliveryman_name'] = deliveryman['Name']
@@ -79,12 +54,7 @@ def admin_payments():
                 payment['deliveryman_phone'] = None
         
         try:
-            cursor.execute("""
-                SELECT d.DeliveryMan_ID, CONCAT(u.F_name, ' ', u.L_name) as Name, u.phone as Phone 
-                FROM deliveryman d 
-                JOIN user u ON d.DeliveryMan_ID = u.ID 
-                ORDER BY u.F_name, u.L_name
-            """)
+            cursor.execute(queries.DELIVERYMEN_BY_NAME)
             deliverymen = cursor.fetchall()
         except:
             deliverymen = []
@@ -119,16 +89,12 @@ def assign_deliveryman():
     try:
         cursor = connection.cursor()
         
-        cursor.execute("""
-            UPDATE payment 
-            SET DeliveryMan_ID = %s 
-            WHERE payment_id = %s
-        """, (deliveryman_id, payment_id))
+        cursor.execute(queries.ASSIGN_DELIVERYMAN, (deliveryman_id, payment_id))
         
         if cursor.rowcount > 0:
             connection.commit()
             
-            cursor.execute("SELECT Name FROM deliveryman WHERE DeliveryMan_ID = %s", (deliveryman_id,))
+            cursor.execute(queries.DELIVERYMAN_NAME, (deliveryman_id,))
             deliveryman = cursor.fetchone()
             deliveryman_name = deliveryman[0] if deliveryman else "Unknown"
             
@@ -163,39 +129,13 @@ def dashboard():
         cursor = connection.cursor(dictionary=True)
         
         try:
-            cursor.execute("SELECT * FROM medicine ORDER BY Med_Code")
+            cursor.execute(queries.ADMIN_MEDICINES)
             medicines = cursor.fetchall()
             
-            cursor.execute("""
-                SELECT cr.*, CONCAT(u.F_name, ' ', u.L_name) as customer_name
-                FROM customer_review cr
-                JOIN customer c ON cr.Customer_ID = c.Customer_ID
-                JOIN user u ON c.Customer_ID = u.ID
-            """)
+            cursor.execute(queries.ADMIN_REVIEWS)
             reviews = cursor.fetchall()
             
-            try:
-                cursor.execute("""
-                    SELECT cmr.Customer_ID, cmr.request_med_name, cmr.Expected_date, 
-                           IFNULL(cmr.Status, 'Pending') as Status,
-                           CONCAT(u.F_name, ' ', u.L_name) as customer_name 
-                    FROM customer_request cmr
-                    JOIN customer c ON cmr.Customer_ID = c.Customer_ID
-                    JOIN user u ON c.Customer_ID = u.ID
-                    ORDER BY cmr.request_med_name
-                """)
-            except:
-                cursor.execute("ALTER TABLE customer_request ADD COLUMN Status VARCHAR(20) DEFAULT 'Pending'")
-                connection.commit()
-                cursor.execute("""
-                    SELECT cmr.Customer_ID, cmr.request_med_name, cmr.Expected_date, 
-                           IFNULL(cmr.Status, 'Pending') as Status,
-                           CONCAT(u.F_name, ' ', u.L_name) as customer_name 
-                    FROM customer_request cmr
-                    JOIN customer c ON cmr.Customer_ID = c.Customer_ID
-                    JOIN user u ON c.Customer_ID = u.ID
-                    ORDER BY cmr.request_med_name
-                """)
+            cursor.execute(queries.ADMIN_REQUESTS)
             requests = cursor.fetchall()
             
         except Exception as e:
@@ -223,13 +163,7 @@ def profile():
     if connection:
         cursor = connection.cursor(dictionary=True)
         try:
-            cursor.execute("""
-                SELECT u.F_name, u.L_name, u.email, u.phone, u.address,
-                       a.Admin_ID
-                FROM user u
-                JOIN admin a ON u.ID = a.Admin_ID
-                WHERE u.ID = %s
-            """, (admin_id,))
+            cursor.execute(queries.ADMIN_PROFILE, (admin_id,))
             
             admin_info = cursor.fetchone() or {}
             
@@ -256,40 +190,18 @@ def handle_request():
         cursor = connection.cursor(dictionary=True)
         
         try:
-            try:
-                cursor.execute("""
-                    ALTER TABLE customer_request 
-                    ADD COLUMN IF NOT EXISTS Status VARCHAR(20) DEFAULT 'Pending'
-                """)
-                connection.commit()
-            except:
-                pass
-            
-            cursor.execute("""
-                SELECT Customer_ID, request_med_name 
-                FROM customer_request 
-                WHERE Customer_ID = %s AND request_med_name = %s
-                LIMIT 1
-            """, (customer_id, medicine_name))
+            cursor.execute(queries.REQUEST_LOOKUP, (customer_id, medicine_name))
             request_info = cursor.fetchone()
             
             if not request_info:
                 return jsonify({'success': False, 'message': 'Request not found'})
             
             if action == 'accept':
-                cursor.execute("""
-                    UPDATE customer_request 
-                    SET Status = 'Accepted' 
-                    WHERE Customer_ID = %s AND request_med_name = %s
-                """, (customer_id, medicine_name))
+                cursor.execute(queries.ACCEPT_REQUEST, (customer_id, medicine_name))
                 message = f'Request for {medicine_name} has been accepted successfully!'
                 
             elif action == 'decline':
-                cursor.execute("""
-                    UPDATE customer_request 
-                    SET Status = 'Declined' 
-                    WHERE Customer_ID = %s AND request_med_name = %s
-                """, (customer_id, medicine_name))
+                cursor.execute(queries.DECLINE_REQUEST, (customer_id, medicine_name))
                 message = f'Request for {medicine_name} has been declined.'
                 
             else:
@@ -318,11 +230,7 @@ def get_deliverymen():
         cursor = connection.cursor(dictionary=True)
         
         try:
-            cursor.execute("""
-                SELECT d.DeliveryMan_ID, CONCAT(u.F_name, ' ', u.L_name) as name 
-                FROM deliveryman d
-                JOIN user u ON d.DeliveryMan_ID = u.ID
-            """)
+            cursor.execute(queries.DELIVERYMEN)
             deliverymen = cursor.fetchall()
             return jsonify({'success': True, 'deliverymen': deliverymen})
             
@@ -332,4 +240,113 @@ def get_deliverymen():
             cursor.close()
             connection.close()
     
-    return jsonify({'success': False, 'message': 'Database connection failed'})
\ No newline at end of file
+    return jsonify({'success': False, 'message': 'Database connection failed'})
+
+@admin_bp.route('/payment_items/<payment_id>', methods=['GET'])
+def payment_items(payment_id):
+    """Medicines, quantities and prices of one order"""
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    connection = get_db_connection()
+    if connection:
+        cursor = connection.cursor(dictionary=True)
+        
+        try:
+            cursor.execute(queries.PAYMENT_ITEMS, (payment_id,))
+            items = [dict(item, unit_price=float(item['unit_price']), total_price=float(item['total_price']))
+                     for item in cursor.fetchall()]
+            return jsonify({'success': True, 'payment_id': payment_id, 'items': items})
+            
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'Error: {str(e)}'})
+        finally:
+            cursor.close()
+            connection.close()
+    
+    return jsonify({'success': False, 'message': 'Database connection failed'})
+
+@admin_bp.route('/pool_stats', methods=['GET'])
+def pool_stats():
+    """Database connection pool statistics for monitoring"""
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    return jsonify({'success': True, 'pool': db_pool_stats()})
+
+@admin_bp.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Catalog cache statistics for monitoring"""
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    return jsonify({'success': True, 'catalog': catalog.cache_stats(), 'fragments': fragments.stats(),
+                    'cart_store': cart_store.store.stats(), 'reservations': reservations.holds.stats(),
+                    'idempotency': idempotency.checkouts.stats(), 'ids': ids.stats(),
+                    'outbox': outbox.outbox.stats()})
+
+@admin_bp.route('/import_medicines', methods=['POST'])
+def import_medicines():
+    """Bulk import medicines from an uploaded CSV or JSON price list"""
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'message': 'Please choose a CSV or JSON file'})
+    
+    fmt = request.form.get('format') or catalog_import.detect_format(upload.filename)
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    try:
+        result = catalog_import.import_medicines(stream, fmt)
+    except Error as e:
+        print(f"Error importing medicines: {e}")
+        return jsonify({'success': False, 'message': f'Import failed: {str(e)}'})
+    
+    message = (f"{result['inserted']} inserted, {result['updated']} updated, "
+               f"{result['rejected']} rejected")
+    if 'error' in result:
+        return jsonify(dict(result, success=False, message=f"Import stopped after {message}: {result['error']}"))
+    return jsonify(dict(result, success=True, message=message))
+
+@admin_bp.route('/adjust_medicines', methods=['POST'])
+def adjust_medicines():
+    """Apply a batch of stock and price changes in one transaction"""
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    data = request.get_json(silent=True) or {}
+    changes = data.get('changes')
+    if not isinstance(changes, list) or not changes:
+        return jsonify({'success': False, 'message': 'Please provide a list of changes'})
+    if len(changes) > inventory.ADJUST_CONFIG['max_changes']:
+        return jsonify({'success': False,
+                        'message': f"At most {inventory.ADJUST_CONFIG['max_changes']} changes per batch"})
+    
+    try:
+        results = inventory.adjust_medicines(changes)
+    except Error as e:
+        print(f"Error adjusting medicines: {e}")
+        return jsonify({'success': False, 'message': f'Adjustment failed, nothing was changed: {str(e)}'})
+    
+    return jsonify({'success': True, 'message': inventory.summarize(results), 'results': results})
+
+@admin_bp.route('/export/<table>')
+def export_table(table):
+    """Stream a table as CSV or NDJSON"""
+    if 'user_id' not in session or session['user_type'] != 'admin':
+        flash('Please login as admin first!', 'error')
+        return redirect(url_for('login'))
+    
+    fmt = request.args.get('format', 'csv')
+    if table not in exports.EXPORTS or fmt not in exports.FORMATS:
+        return jsonify({'success': False, 'message': 'Unknown export'}), 404
+    
+    try:
+        chunks = exports.export_rows(table, fmt)
+    except Error as e:
+        print(f"Error exporting {table}: {e}")
+        return jsonify({'success': False, 'message': f'Export failed: {str(e)}'}), 500
+    
+    return Response(chunks, mimetype=exports.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'})
@@ -1,6 +1,4 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-import mysql.connector
-from mysql.connector import Error
 import hashlib
 from datetime import datetime
 import re
@@ -9,6 +7,11 @@ import re
 from admin import admin_bp
 from customer import customer_bp
 from deliveryman import deliveryman_bp
+from db import Error, get_db_connection
+import catalog
+import ids
+import outbox
+import queries
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Change this to a secure secret key
@@ -18,141 +21,22 @@ app.register_blueprint(admin_bp)
 app.register_blueprint(customer_bp)
 app.register_blueprint(deliveryman_bp)
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'drugweb',
-    'user': 'root',
-    'password': ''  # Add your MySQL password here
-}
-
-def get_db_connection():
-    """Create and return a database connection"""
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        # Test if database exists, if not create it
-        cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS drugweb")
-        cursor.execute("USE drugweb")
-        cursor.close()
-        
-        # Reconnect to the database
-        DB_CONFIG['database'] = 'drugweb'
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        print("Please ensure MySQL server is running and accessible")
-        return None
+@app.before_request
+def start_outbox():
+    """Deliver outbox events left by earlier runs without waiting for the next checkout"""
+    outbox.outbox.start()
 
 def generate_customer_id():
-    """Generate next customer ID in format CM001, CM002, etc."""
-    connection = get_db_connection()
-    if connection:
-        cursor = connection.cursor()
-        cursor.execute("SELECT Customer_ID FROM customer ORDER BY Customer_ID DESC LIMIT 1")
-        result = cursor.fetchone()
-        
-        if result:
-            last_id = result[0]
-            number = int(last_id[2:]) + 1
-            new_id = f"CM{number:03d}"
-        else:
-            new_id = "CM001"
-        
-        cursor.close()
-        connection.close()
-        return new_id
-    return "CM001"
+    """Generate next customer ID in format CM001, CM002, etc. from this worker's reserved block"""
+    return ids.customer_id()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/update_medicine_db')
-def update_medicine_db():
-    """Add Category column to medicine table"""
-    connection = get_db_connection()
-    if not connection:
-        return "❌ Database connection failed."
-    
-    try:
-        cursor = connection.cursor()
-        
-        # Add Category column to medicine table
-        cursor.execute("ALTER TABLE medicine ADD COLUMN Category VARCHAR(50)")
-        connection.commit()
-        
-        # Update existing medicines with sample categories
-        cursor.execute("UPDATE medicine SET Category = 'Pain Relief' WHERE Name LIKE '%Paracetamol%' OR Name LIKE '%Aspirin%'")
-        cursor.execute("UPDATE medicine SET Category = 'Antibiotic' WHERE Name LIKE '%Amoxicillin%' OR Name LIKE '%Penicillin%'")
-        cursor.execute("UPDATE medicine SET Category = 'General' WHERE Category IS NULL")
-        connection.commit()
-        
-        cursor.close()
-        connection.close()
-        
-        return "✅ Category column added to medicine table and sample data updated!"
-        
-    except Exception as e:
-        return f"Database update result: {str(e)}<br><small>Note: If error mentions 'Duplicate column name', the column already exists and this is normal.</small>"
-
-@app.route('/update_db')
-def update_db():
-    """Add Status column to customer_request table"""
-    connection = get_db_connection()
-    if not connection:
-        return "❌ Database connection failed."
-    
-    try:
-        cursor = connection.cursor()
-        
-        # Add Status column to customer_request table
-        cursor.execute("ALTER TABLE customer_request ADD COLUMN Status VARCHAR(20) DEFAULT 'Pending'")
-        connection.commit()
-        
-        cursor.close()
-        connection.close()
-        
-        return "✅ Status column added to customer_request table successfully!"
-        
-    except Exception as e:
-        return f"Database update result: {str(e)}<br><small>Note: If error mentions 'Duplicate column name', the column already exists and this is normal.</small>"
-
-@app.route('/fix_db')
-def fix_db():
-    """Fix database by adding missing columns"""
-    connection = get_db_connection()
-    if not connection:
-        return "❌ Database connection failed."
-    
-    try:
-        cursor = connection.cursor()
-        
-        # Check if Request_ID column exists, if not add it
-        cursor.execute("""
-            ALTER TABLE customer_request 
-            ADD COLUMN Request_ID INT AUTO_INCREMENT PRIMARY KEY FIRST
-        """)
-        
-        # Add Status column if it doesn't exist
-        cursor.execute("""
-            ALTER TABLE customer_request 
-            ADD COLUMN IF NOT EXISTS Status VARCHAR(20) DEFAULT 'Pending'
-        """)
-        
-        connection.commit()
-        cursor.close()
-        connection.close()
-        
-        return "✅ Database structure fixed! Request_ID and Status columns added."
-        
-    except Exception as e:
-        return f"Database fix result: {str(e)} (This might be normal if columns already exist)"
-
 @app.route('/setup_db')
 def setup_db():
-    """Setup database tables and create test customer"""
+    """Create test users and sample medicines (run `python migrations.py` first)"""
     connection = get_db_connection()
     if not connection:
         return "❌ Database connection failed. Please start MySQL server."
@@ -160,128 +44,6 @@ def setup_db():
     try:
         cursor = connection.cursor()
         
-        # Create user table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user (
-                ID VARCHAR(10) PRIMARY KEY,
-                F_name VARCHAR(50) NOT NULL,
-                L_name VARCHAR(50) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                password VARCHAR(100) NOT NULL,
-                address TEXT,
-                phone VARCHAR(20)
-            )
-        """)
-        
-        # Create customer table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS customer (
-                Customer_ID VARCHAR(10) PRIMARY KEY,
-                points INT DEFAULT 0,
-                FOREIGN KEY (Customer_ID) REFERENCES user(ID)
-            )
-        """)
-        
-        # Create admin table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admin (
-                Admin_ID VARCHAR(10) PRIMARY KEY,
-                FOREIGN KEY (Admin_ID) REFERENCES user(ID)
-            )
-        """)
-        
-        # Create medicine table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS medicine (
-                Med_Code VARCHAR(10) PRIMARY KEY,
-                Name VARCHAR(100) NOT NULL,
-                Generic_name VARCHAR(100),
-                Category VARCHAR(50),
-                Price DECIMAL(10,2) NOT NULL,
-                Stock INT DEFAULT 0
-            )
-        """)
-        
-        # Create customer_review table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS customer_review (
-                Review_ID INT AUTO_INCREMENT PRIMARY KEY,
-                Customer_ID VARCHAR(10),
-                review TEXT,
-                FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID)
-            )
-        """)
-        
-        # Create customer_request table with Request_ID
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS customer_request (
-                Request_ID INT AUTO_INCREMENT PRIMARY KEY,
-                Customer_ID VARCHAR(10),
-                request_med_name VARCHAR(100),
-                Expected_date DATE,
-                Status VARCHAR(20) DEFAULT 'Pending',
-                FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID)
-            )
-        """)
-        
-        # Create cart table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS cart (
-                Cart_ID INT AUTO_INCREMENT PRIMARY KEY,
-                Customer_ID VARCHAR(10),
-                Med_Code VARCHAR(10),
-                Med_Name VARCHAR(100),
-                Quantity INT DEFAULT 1,
-                Price DECIMAL(10,2),
-                Added_Date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID),
-                FOREIGN KEY (Med_Code) REFERENCES medicine(Med_Code)
-            )
-        """)
-        
-        # Create notifications table for customer updates
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS notifications (
-                notification_id INT AUTO_INCREMENT PRIMARY KEY,
-                customer_id VARCHAR(10),
-                message TEXT NOT NULL,
-                type VARCHAR(50) DEFAULT 'general',
-                is_read BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (customer_id) REFERENCES customer(Customer_ID)
-            )
-        """)
-        
-        # Create points_history table for tracking points transactions
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS points_history (
-                history_id INT AUTO_INCREMENT PRIMARY KEY,
-                customer_id VARCHAR(10),
-                points_earned INT NOT NULL,
-                transaction_type VARCHAR(20) DEFAULT 'earned',
-                payment_id VARCHAR(20),
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (customer_id) REFERENCES customer(Customer_ID)
-            )
-        """)
-        
-        # Add missing columns to payment table if they don't exist
-        try:
-            cursor.execute("ALTER TABLE payment ADD COLUMN status VARCHAR(50) DEFAULT 'Assigned'")
-        except:
-            pass  # Column already exists
-            
-        try:
-            cursor.execute("ALTER TABLE payment ADD COLUMN delivery_date DATE")  
-        except:
-            pass  # Column already exists
-            
-        try:
-            cursor.execute("ALTER TABLE payment ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-        except:
-            pass  # Column already exists
-        
         # Create test customer
         cursor.execute("""
             INSERT IGNORE INTO user (ID, F_name, L_name, email, password, address, phone) 
@@ -293,6 +55,9 @@ def setup_db():
             VALUES ('CM001', 100)
         """)
         
+        # Keep signups from being given CM001
+        cursor.execute(queries.CUSTOMER_ID_FLOOR)
+        
         # Create test admin
         cursor.execute("""
             INSERT IGNORE INTO user (ID, F_name, L_name, email, password, address, phone) 
@@ -337,6 +102,7 @@ def setup_db():
         connection.commit()
         cursor.close()
         connection.close()
+        catalog.invalidate()
         
         return """
         <h2>✅ Database Setup Complete!</h2>
@@ -364,7 +130,7 @@ def login():
             cursor = connection.cursor(dictionary=True)
             
             # Check user credentials
-            cursor.execute("SELECT * FROM user WHERE email = %s AND password = %s", (email, password))
+            cursor.execute(queries.LOGIN_USER, (email, password))
             user = cursor.fetchone()
             
             if user:
@@ -372,7 +138,7 @@ def login():
                 
                 # Check user type and redirect accordingly
                 if user_type == 'admin':
-                    cursor.execute("SELECT * FROM admin WHERE Admin_ID = %s", (user_id,))
+                    cursor.execute(queries.ADMIN_BY_ID, (user_id,))
                     admin = cursor.fetchone()
                     if admin:
                         session['user_id'] = user_id
@@ -384,7 +150,7 @@ def login():
                         flash('Invalid admin credentials!', 'error')
                 
                 elif user_type == 'deliveryman':
-                    cursor.execute("SELECT * FROM deliveryman WHERE DeliveryMan_ID = %s", (user_id,))
+                    cursor.execute(queries.DELIVERYMAN_BY_ID, (user_id,))
                     deliveryman = cursor.fetchone()
                     if deliveryman:
                         session['user_id'] = user_id
@@ -396,7 +162,7 @@ def login():
                         flash('Invalid delivery man credentials!', 'error')
                 
                 elif user_type == 'customer':
-                    cursor.execute("SELECT * FROM customer WHERE Customer_ID = %s", (user_id,))
+                    cursor.execute(queries.CUSTOMER_BY_ID, (user_id,))
                     customer = cursor.fetchone()
                     print(f"Customer found: {customer}")  # Debug
                     if customer:
@@ -435,16 +201,16 @@ def signup():
             cursor = connection.cursor()
             
             # Check if email already exists
-            cursor.execute("SELECT * FROM user WHERE email = %s", (email,))
+            cursor.execute(queries.USER_BY_EMAIL, (email,))
             existing_user = cursor.fetchone()
             
             if existing_user:
                 flash('Email already exists!', 'error')
             else:
-                # Generate new customer ID
-                customer_id = generate_customer_id()
-                
                 try:
+                    # Generate new customer ID
+                    customer_id = generate_customer_id()
+                    
                     # Insert into user table
                     cursor.execute("""
                         INSERT INTO user (ID, F_name, L_name, email, password, address, phone) 
@@ -511,7 +277,7 @@ def check_customer_id():
         session_customer_id = session['user_id']
         
         # Check if customer exists
-        cursor.execute("SELECT * FROM customer WHERE Customer_ID = %s", (session_customer_id,))
+        cursor.execute(queries.CUSTOMER_BY_ID, (session_customer_id,))
         customer = cursor.fetchone()
         
         # Check payment table structure for foreign key constraints
@@ -0,0 +1,126 @@
+"""Request-level benchmark for the hot customer pages.
+
+Runs the whole app in-process against an embedded SQLite database, so it
+needs no MySQL server:
+
+    python benchmark.py --medicines 20000 --requests 300
+
+Set DRUGWEB_DB_BACKEND=mysql to benchmark against the configured MySQL
+database instead (it must already be migrated and seeded).
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('DRUGWEB_DB_BACKEND', 'sqlite')
+if os.environ['DRUGWEB_DB_BACKEND'] == 'sqlite' and 'DRUGWEB_SQLITE_PATH' not in os.environ:
+    scratch = tempfile.mkdtemp(prefix='drugweb-bench-')
+    os.environ['DRUGWEB_SQLITE_PATH'] = os.path.join(scratch, 'bench.sqlite3')
+    os.environ.setdefault('DRUGWEB_CART_JOURNAL', os.path.join(scratch, 'cart_journal'))
+
+import catalog
+import db
+import migrations
+from app import app
+
+CATEGORIES = ['Pain Relief', 'Antibiotic', 'Antacid', 'Vitamin', 'Allergy', 'Cardiac', 'Diabetes', 'General']
+
+SCENARIOS = [
+    ('dashboard', 'GET', '/customer/dashboard', None),
+    ('dashboard search', 'GET', '/customer/dashboard?search=para', None),
+    ('browse page 1', 'GET', '/customer/browse', None),
+    ('browse category', 'GET', '/customer/browse?category=Vitamin&sort_by=price', None),
+    ('browse deep page', 'GET', None, None),  # URL built by deep_page_url()
+    ('browse search', 'GET', '/customer/browse?search=mol', None),
+    ('suggest', 'GET', '/customer/suggest?q=para', None),
+    ('add to cart', 'POST', '/customer/add_to_cart', {'med_code': 'MED001', 'quantity': 1, 'price': 5}),
+    ('view cart', 'GET', '/customer/cart', None),
+    ('cart count', 'GET', '/customer/cart/count', None),
+    ('notifications', 'GET', '/customer/get_notifications', None)
+]
+
+
+def seed(medicine_count):
+    """Migrate the database and load test users plus a synthetic catalog"""
+    migrations.run_migrations()
+    app.test_client().get('/setup_db')
+    rows = [
+        (f'MED{i:06d}', f'Medicine {i} {"Paracetamol" if i % 7 == 0 else "Tablet"}',
+         f'Generic {i % 500}', CATEGORIES[i % len(CATEGORIES)], round(1 + (i % 997) / 10, 2), 1000)
+        for i in range(4, medicine_count + 1)
+    ]
+    with db.db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.executemany("""
+            INSERT IGNORE INTO medicine (Med_Code, Name, Generic_name, Category, Price, Stock)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, rows)
+        connection.commit()
+        cursor.close()
+
+
+def deep_page_url():
+    """Browse URL whose cursor points 90% of the way into the catalog"""
+    with db.db_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT COUNT(*) AS total FROM medicine")
+        offset = int(cursor.fetchone()['total'] * 0.9)
+        cursor.execute(f"SELECT Name, Med_Code FROM medicine ORDER BY Name, Med_Code LIMIT 1 OFFSET {offset}")
+        row = cursor.fetchone()
+        cursor.close()
+    token = catalog.encode_cursor({'s': 'name', 'c': '', 'q': '', 'd': 'next',
+                                   'k': [row['Name'], row['Med_Code']], 'p': offset // 12 + 1})
+    return f'/customer/browse?sort_by=name&cursor={token}'
+
+
+def login(client):
+    client.post('/login', data={
+        'email': 'customer@test.com',
+        'password': 'password123',
+        'user_type': 'customer'
+    })
+
+
+def run_scenario(client, method, url, body, requests):
+    """Time `requests` calls to one endpoint; returns latencies in milliseconds"""
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        if method == 'GET':
+            response = client.get(url)
+        else:
+            response = client.post(url, json=body)
+        timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} returned {response.status_code}")
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the DrugWeb customer pages')
+    parser.add_argument('--medicines', type=int, default=5000, help='catalog size to seed')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--no-seed', action='store_true', help='use the existing database as is')
+    args = parser.parse_args(argv)
+
+    if not args.no_seed:
+        seed(args.medicines)
+
+    client = app.test_client()
+    login(client)
+
+    print(f"{'scenario':<20}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}")
+    for name, method, url, body in SCENARIOS:
+        url = url or deep_page_url()
+        timings = run_scenario(client, method, url, body, args.requests)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        mean = statistics.mean(timings)
+        print(f"{name:<20}{mean:>10.2f}{statistics.median(timings):>10.2f}{p95:>10.2f}{1000 / mean:>10.0f}")
+    print(f"pool: {db.pool_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Cart operations shared by the customer cart endpoints.
+
+Carts are read and changed through the server-side store in
+cart_store.py, which writes them back to the cart table in the
+background, so these functions do not touch the database. Names, prices
+and stock come from the catalog cache, whose Stock checkout lowers as it
+sells; line totals use the current price. The cart table keeps one row per (Customer_ID, Med_Code).
+Adding an item or raising its quantity places a stock hold
+(reservations.py) and is refused when other carts hold the rest.
+
+apply_operations() runs a list of add / set / remove operations from
+/customer/cart/batch, so the cart page can send a burst of edits as a
+single request.
+"""
+import catalog
+from cart_store import store
+from reservations import holds
+
+CART_CONFIG = {
+    'max_operations': 100   # operations accepted in one batch request
+}
+
+
+def _hold(customer_id, med_code, stock, quantity, refused):
+    """Hold quantity units for the cart; records the units available if refused"""
+    placed, available = holds.reserve(customer_id, med_code, quantity, stock)
+    if not placed:
+        refused.append(available)
+        return None
+    return quantity
+
+
+def add_item(customer_id, med_code, quantity):
+    """Add quantity of a medicine to a cart; returns None or the reason it was refused"""
+    medicine = catalog.get_medicine(med_code)
+    if not medicine:
+        return 'Medicine not found'
+    refused = []
+    added, _ = store.update(customer_id, med_code,
+                            lambda current: _hold(customer_id, med_code, medicine['Stock'], current + quantity, refused))
+    if not added:
+        return f'Only {refused[0]} units available'
+    return None
+
+
+def set_quantity(customer_id, med_code, quantity):
+    """Set the quantity of an item already in the cart; returns None or the reason it was refused"""
+    medicine = catalog.get_medicine(med_code)
+    if not medicine:
+        return 'Item not found'
+    refused = []
+    changed, current = store.update(
+        customer_id, med_code,
+        lambda current: _hold(customer_id, med_code, medicine['Stock'], quantity, refused) if current else None)
+    if not changed:
+        return f'Only {refused[0]} units available' if refused else 'Item not found'
+    return None
+
+
+def remove_item(customer_id, med_code):
+    """Remove an item from the cart; returns None or the reason it was refused"""
+    removed, _ = store.update(customer_id, med_code, lambda current: 0 if current else None)
+    if not removed:
+        return 'Item not found'
+    holds.release(customer_id, [med_code])
+    return None
+
+
+def count(customer_id):
+    """Number of different medicines in the cart, for the navbar badge"""
+    return store.count(customer_id)
+
+
+def items(customer_id):
+    """The customer's cart items with names and prices, newest first"""
+    rows = []
+    for med_code, quantity in reversed(list(store.lines(customer_id).items())):
+        medicine = catalog.get_medicine(med_code)
+        if not medicine:
+            continue
+        rows.append({
+            'Med_Code': med_code,
+            'Med_Name': medicine['Name'],
+            'quantity': quantity,
+            'unit_price': medicine['Price'],
+            'total_price': quantity * medicine['Price']
+        })
+    return rows
+
+
+def summary(rows):
+    """JSON-ready cart state and totals for rows from items()"""
+    return {
+        'items': [{
+            'med_code': row['Med_Code'],
+            'med_name': row['Med_Name'],
+            'quantity': row['quantity'],
+            'unit_price': float(row['unit_price']),
+            'item_total': float(row['total_price'])
+        } for row in rows],
+        'total_items': len(rows),
+        'total_quantity': sum(row['quantity'] for row in rows),
+        'total_amount': float(sum(row['total_price'] for row in rows))
+    }
+
+
+def _positive_int(value):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def apply_operation(customer_id, operation):
+    """Apply one batch operation; returns None on success or the reason it was rejected"""
+    if not isinstance(operation, dict):
+        return 'Operation is not an object'
+    op = operation.get('op')
+    med_code = operation.get('med_code')
+    if op == 'add':
+        quantity = _positive_int(operation.get('quantity', 1))
+        if not med_code or quantity is None:
+            return 'Invalid input data'
+        return add_item(customer_id, med_code, quantity)
+    if op == 'set':
+        quantity = _positive_int(operation.get('quantity'))
+        if not med_code or quantity is None:
+            return 'Invalid quantity'
+        return set_quantity(customer_id, med_code, quantity)
+    if op == 'remove':
+        if not med_code:
+            return 'Invalid item'
+        return remove_item(customer_id, med_code)
+    return f'Unknown operation: {op}'
+
+
+def apply_operations(customer_id, operations):
+    """Apply operations in order.
+
+    Returns one result per operation: {'op', 'success'} plus 'message' for
+    rejected ones, which are skipped without stopping the batch.
+    """
+    results = []
+    for operation in operations:
+        reason = apply_operation(customer_id, operation)
+        result = {'op': operation.get('op') if isinstance(operation, dict) else None, 'success': reason is None}
+        if reason is not None:
+            result['message'] = reason
+        results.append(result)
+    return results
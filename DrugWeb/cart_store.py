@@ -0,0 +1,591 @@
+"""Server-side cart store with write-behind persistence to the cart table.
+
+Carts being edited live in a key-value store as {Med_Code: quantity}
+dicts, keyed by Customer_ID, so adding, changing, removing and viewing
+items never waits on the database. A cart missing from the store is
+loaded from the cart table on first use, and its items are held again
+(reservations.py), since holds are kept only in memory. Each change also
+updates a per-customer item count, which the navbar badge reads.
+
+Changes to one customer's cart are serialised by one of `stripes` locks,
+so customers in different stripes never wait on each other; the lock
+covers loading the cart, the change itself and its journal record.
+Every change is appended to a journal before it is applied. The cart
+table is brought up to date by a background thread every
+`flush_interval` seconds, writing up to `flush_batch` carts per
+transaction, and by flush_customer() at checkout. Each flush starts a new
+journal segment and deletes the older ones once their changes are
+committed. Journal records hold absolute quantities, so replaying them is
+harmless.
+
+Checkout removes only the lines it bought: items added in another tab
+while it ran stay in the cart. Before the payment commits, a marker with
+the payment_id and the quantities bought is journaled; on replay the
+bought quantities are taken out again if that payment exists, so a crash
+right after checkout cannot put paid items back in the cart.
+
+Segment names carry an owner ID unique to the process, and the process
+holds an exclusive lock on cart-<owner>.lock while it runs. On start-up,
+segments whose owner's lock can be taken were left by a process that
+has stopped and are replayed into the cart table before any cart is
+read; segments of processes still running are left alone.
+
+MemoryKV keeps carts in this process, so with the default backend the
+app must run as a single worker process: carts edited in one process
+are not seen by another. Deployments with several workers plug in a
+shared store (anything with get/put/delete) through KV_BACKENDS.
+"""
+import atexit
+import contextlib
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+import catalog
+import db
+import queries
+from reservations import holds
+from db import Error, StorageError, db_connection
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CART_STORE_CONFIG = {
+    'backend': os.environ.get('DRUGWEB_CART_STORE', 'memory'),
+    'journal_dir': os.environ.get('DRUGWEB_CART_JOURNAL', 'cart_journal'),
+    'flush_interval': 2.0,   # seconds between background flushes
+    'flush_batch': 500,      # carts written per transaction
+    'idle_ttl': 1800,        # seconds before an unchanged cart is dropped from memory
+    'stripes': 64,           # locks carts are shared out over; one customer's changes run one at a time
+    'fsync': False           # fsync every journal record (survives power loss, costs a disk wait per edit)
+}
+
+
+class MemoryKV:
+    """In-process key-value store for carts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            return dict(value) if value is not None else None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = dict(value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+KV_BACKENDS = {
+    'memory': MemoryKV
+}
+
+
+def create_kv(name):
+    if name not in KV_BACKENDS:
+        raise StorageError(f"Unknown cart store backend: {name}")
+    return KV_BACKENDS[name]()
+
+
+def _lock_file(path):
+    """Open path and take an exclusive lock on it without waiting; None if another process holds it"""
+    f = open(path, 'a+')
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _segment_owner(path):
+    # cart-<milliseconds>-<owner>-<sequence>.journal
+    return os.path.basename(path).split('-')[2]
+
+
+class Journal:
+    """Append-only segments of cart changes not yet committed to the cart table"""
+
+    def __init__(self, directory, fsync=False):
+        self.directory = directory
+        self.fsync = fsync
+        self.owner = uuid.uuid4().hex[:16]
+        self._lock = threading.Lock()
+        self._owner_lock = None
+        self._file = None
+        self._path = None
+        self._sequence = 0
+
+    def _lock_path(self, owner):
+        return os.path.join(self.directory, f"cart-{owner}.lock")
+
+    def claim(self):
+        """Lock this process's owner ID so other processes leave its segments alone"""
+        if self._owner_lock is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._owner_lock = _lock_file(self._lock_path(self.owner))
+            if self._owner_lock is None:
+                raise StorageError(f"Cart journal owner {self.owner} is already locked")
+
+    def append(self, record):
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            if self._file is None:
+                self.claim()
+                self._sequence += 1
+                self._path = os.path.join(
+                    self.directory, f"cart-{int(time.time() * 1000)}-{self.owner}-{self._sequence:06d}.journal")
+                self._file = open(self._path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def rotate(self):
+        """Close the current segment so later changes start a new one; returns its path or None"""
+        with self._lock:
+            if self._file is None:
+                return None
+            self._file.close()
+            path, self._file, self._path = self._path, None, None
+            return path
+
+    def segments(self):
+        """Segment paths of every process, oldest first"""
+        return sorted(glob.glob(os.path.join(self.directory, 'cart-*.journal')))
+
+    def abandoned(self):
+        """Segments of processes that have stopped, oldest first, and the owner locks taken for them.
+
+        Pass the locks to release() once the segments are applied and deleted.
+        """
+        by_owner = {}
+        for path in self.segments():
+            owner = _segment_owner(path)
+            if owner != self.owner:
+                by_owner.setdefault(owner, []).append(path)
+        paths, locks = [], []
+        for owner, owner_paths in by_owner.items():
+            lock = _lock_file(self._lock_path(owner))
+            if lock is None:
+                continue  # still running
+            paths.extend(owner_paths)
+            locks.append((lock, self._lock_path(owner)))
+        return sorted(paths), locks
+
+    def close(self):
+        """Drop this process's owner lock, removing its lock file if none of its segments is left"""
+        with self._lock:
+            if self._owner_lock is None or self._file is not None:
+                return
+            if not any(_segment_owner(path) == self.owner for path in self.segments()):
+                os.remove(self._lock_path(self.owner))
+            self._owner_lock.close()
+            self._owner_lock = None
+
+    def release(self, locks):
+        """Drop owner locks taken by abandoned() and remove their lock files"""
+        for lock, path in locks:
+            lock.close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # the next recovery removes it
+
+
+def read_segment(path):
+    """Journal records from one segment; a torn last line from a crash is ignored"""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+
+def paid_query(payment_ids):
+    """SQL and params finding which of some payments were committed"""
+    return (f"SELECT payment_id FROM payment WHERE payment_id IN ({', '.join(['%s'] * len(payment_ids))})",
+            list(payment_ids))
+
+
+def _paid(payment_ids):
+    """The payment_ids among these that are in the payment table"""
+    if not payment_ids:
+        return set()
+    with db_connection() as connection:
+        if not connection:
+            raise StorageError("Database connection failed")
+        cursor = connection.cursor()
+        try:
+            cursor.execute(*paid_query(sorted(payment_ids)))
+            return {payment_id for (payment_id,) in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+
+def _replay(records):
+    """{customer: (cleared, {Med_Code: quantity})} left by a list of journal records"""
+    paid = _paid({record['payment_id'] for record in records if 'bought' in record})
+    changes = {}
+    owed = {}   # (customer, Med_Code) -> units bought whose removal was not journaled yet
+    for record in records:
+        customer_id = record['customer']
+        if record.get('clear'):
+            changes[customer_id] = (True, {})
+        elif 'bought' in record:
+            if record['payment_id'] not in paid:
+                continue
+            lines = changes.setdefault(customer_id, (False, {}))[1]
+            for med_code, bought in record['bought'].items():
+                if med_code in lines:
+                    lines[med_code] = max(lines[med_code] - bought, 0)
+                owed[(customer_id, med_code)] = bought
+        else:
+            key = (customer_id, record['med_code'])
+            quantity = record['quantity']
+            if 'payment_id' in record:
+                owed.pop(key, None)   # written by checkout_done, with the bought units already out
+            else:
+                quantity = max(quantity - owed.get(key, 0), 0)
+            changes.setdefault(customer_id, (False, {}))[1][record['med_code']] = quantity
+    return changes
+
+
+def _write_changes(cursor, changes):
+    """Bring cart rows in line with {customer: (cleared, {Med_Code: quantity})}"""
+    cleared = [(customer_id,) for customer_id, (clear, _) in changes.items() if clear]
+    upserts = []
+    deletes = []
+    for customer_id, (_, lines) in changes.items():
+        for med_code, quantity in lines.items():
+            medicine = catalog.get_medicine(med_code) if quantity > 0 else None
+            if medicine:
+                upserts.append((customer_id, med_code, quantity, quantity * medicine['Price']))
+            else:
+                deletes.append((customer_id, med_code))
+    if cleared:
+        cursor.executemany(queries.CLEAR_CART, cleared)
+    if deletes:
+        cursor.executemany(queries.CART_LINE_DELETE, deletes)
+    if upserts:
+        cursor.executemany(db.backend.upsert_sql(
+            'cart', ('Customer_ID', 'Med_Code', 'quantity', 'total_price'), ('Customer_ID', 'Med_Code')), upserts)
+
+
+def _commit_changes(changes):
+    with db_connection() as connection:
+        if not connection:
+            raise StorageError("Database connection failed")
+        cursor = connection.cursor()
+        try:
+            _write_changes(cursor, changes)
+            connection.commit()
+        except Error:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+class CartStore:
+    """Carts in a key-value store, journaled and flushed to the cart table in the background"""
+
+    def __init__(self, kv, journal, flush_interval=2.0, flush_batch=500, idle_ttl=1800, stripes=64):
+        self.kv = kv
+        self.journal = journal
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.idle_ttl = idle_ttl
+        self._stripes = [threading.Lock() for _ in range(stripes)]   # held while a cart is loaded or changed
+        self._lock = threading.Lock()                                 # guards the bookkeeping below, briefly
+        self._flush_lock = threading.Lock()
+        self._dirty = {}      # customer -> Med_Codes changed since the last flush
+        self._used = {}       # customer -> last access time
+        self._counts = {}     # customer -> number of items, kept up to date by every change
+        self._segments = []   # rotated segments waiting for a successful flush
+        self._started = False
+        self._stopped = threading.Event()
+        self._stats = {'flushes': 0, 'carts_flushed': 0, 'flush_errors': 0, 'loads': 0, 'recovered': 0}
+
+    def _start(self):
+        """Replay journals left by a crash, then start the flusher (once, on first use)"""
+        if self._started:
+            return
+        with self._flush_lock:
+            if self._started:
+                return
+            self.recover()
+            thread = threading.Thread(target=self._flush_loop, name='cart-flusher', daemon=True)
+            thread.start()
+            atexit.register(self.close)
+            self._started = True
+
+    def recover(self):
+        """Apply the journal segments of stopped processes to the cart table and delete them"""
+        self.journal.claim()
+        paths, locks = self.journal.abandoned()
+        try:
+            if not paths:
+                return 0
+            changes = _replay([record for path in paths for record in read_segment(path)])
+            _commit_changes(changes)
+            for customer_id, (_, lines) in changes.items():
+                for med_code, quantity in lines.items():
+                    if quantity > 0:
+                        holds.place(customer_id, med_code, quantity)
+            for path in paths:
+                os.remove(path)
+        finally:
+            self.journal.release(locks)
+        self._stats['recovered'] += len(changes)
+        return len(changes)
+
+    def _stripe(self, customer_id):
+        return self._stripes[hash(customer_id) % len(self._stripes)]
+
+    @contextlib.contextmanager
+    def _all_stripes(self):
+        """Wait for every cart change in progress and hold off new ones"""
+        with contextlib.ExitStack() as stack:
+            for lock in self._stripes:
+                stack.enter_context(lock)
+            yield
+
+    def _load(self, customer_id):
+        """The customer's cart, read from the cart table if it is not in the store.
+
+        The caller holds the customer's stripe lock, so the cart cannot be
+        evicted or changed between this read and the caller's write.
+        """
+        lines = self.kv.get(customer_id)
+        if lines is None:
+            with db_connection() as connection:
+                if not connection:
+                    raise StorageError("Database connection failed")
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(queries.CART_LINES, (customer_id,))
+                    lines = {med_code: quantity for med_code, quantity in cursor.fetchall()}
+                finally:
+                    cursor.close()
+            for med_code, quantity in lines.items():
+                holds.place(customer_id, med_code, quantity)
+            self.kv.put(customer_id, lines)
+            with self._lock:
+                self._counts[customer_id] = len(lines)
+                self._used[customer_id] = time.time()   # otherwise a cart only ever read is never evicted
+                self._stats['loads'] += 1
+        return lines
+
+    def lines(self, customer_id):
+        """{Med_Code: quantity} for a customer, oldest item first"""
+        self._start()
+        lines = self.kv.get(customer_id)
+        if lines is None:
+            with self._stripe(customer_id):
+                lines = self._load(customer_id)
+        with self._lock:
+            self._used[customer_id] = time.time()
+        return lines
+
+    def count(self, customer_id):
+        """Number of different medicines in a customer's cart, without copying the cart"""
+        with self._lock:
+            count = self._counts.get(customer_id)
+        if count is None:
+            count = len(self.lines(customer_id))
+        return count
+
+    def update(self, customer_id, med_code, change):
+        """Set one item's quantity to change(current quantity) atomically.
+
+        change returns the new quantity (0 removes the item) or None to
+        leave it alone. Returns (applied, quantity now in the cart).
+        """
+        self._start()
+        with self._stripe(customer_id):
+            lines = self._load(customer_id)
+            current = lines.get(med_code, 0)
+            quantity = change(current)
+            if quantity is None:
+                return False, current
+            self.journal.append({'customer': customer_id, 'med_code': med_code, 'quantity': quantity})
+            if quantity > 0:
+                lines[med_code] = quantity
+            else:
+                lines.pop(med_code, None)
+            self.kv.put(customer_id, lines)
+            with self._lock:
+                self._counts[customer_id] = len(lines)
+                self._dirty.setdefault(customer_id, set()).add(med_code)
+                self._used[customer_id] = time.time()
+            return True, quantity
+
+    def checkout_started(self, customer_id, payment_id, quantities):
+        """Journal the quantities a checkout is buying, before its payment commits"""
+        self._start()
+        with self._stripe(customer_id):
+            self.journal.append({'customer': customer_id, 'payment_id': payment_id, 'bought': quantities})
+
+    def checkout_done(self, customer_id, payment_id, quantities):
+        """Take the bought quantities out of the stored cart once checkout has deleted their rows.
+
+        Quantities added in another tab since checkout read the cart stay
+        in it. Returns {Med_Code: quantity left} for the bought medicines.
+        """
+        with self._stripe(customer_id):
+            stored = self.kv.get(customer_id)
+            # A cart evicted since the flush is read back without the bought rows
+            lines = stored if stored is not None else self._load(customer_id)
+            left = {}
+            for med_code, bought in quantities.items():
+                quantity = lines.get(med_code, 0)
+                if stored is not None:
+                    quantity = max(quantity - bought, 0)
+                self.journal.append({'customer': customer_id, 'med_code': med_code,
+                                     'quantity': quantity, 'payment_id': payment_id})
+                if quantity > 0:
+                    lines[med_code] = quantity
+                else:
+                    lines.pop(med_code, None)
+                left[med_code] = quantity
+            self.kv.put(customer_id, lines)
+            with self._lock:
+                self._counts[customer_id] = len(lines)
+                # Checkout deleted these rows, so lines still in the cart are written again
+                kept = [med_code for med_code, quantity in left.items() if quantity > 0]
+                if kept:
+                    self._dirty.setdefault(customer_id, set()).update(kept)
+                self._used[customer_id] = time.time()
+            return left
+
+    def _take(self, customer_ids):
+        """Changes to write for some dirty customers, removing them from the dirty set"""
+        changes = {}
+        for customer_id in customer_ids:
+            med_codes = self._dirty.pop(customer_id, None)
+            if not med_codes:
+                continue
+            lines = self.kv.get(customer_id) or {}
+            changes[customer_id] = (False, {m: lines.get(m, 0) for m in med_codes})
+        return changes
+
+    def _restore(self, changes):
+        """Mark customers dirty again after a failed write"""
+        with self._lock:
+            for customer_id, (_, lines) in changes.items():
+                self._dirty.setdefault(customer_id, set()).update(lines)
+
+    def flush_customer(self, customer_id):
+        """Write one customer's pending changes now (used at checkout)"""
+        self._start()
+        with self._flush_lock:
+            with self._lock:
+                changes = self._take([customer_id])
+            if not changes:
+                return
+            try:
+                _commit_changes(changes)
+            except Error:
+                self._restore(changes)
+                raise
+
+    def flush(self):
+        """Write every pending change in batches; old journal segments go once all are committed"""
+        with self._flush_lock:
+            # Every change recorded in the old segment is in the dirty set once no change is in progress
+            with self._all_stripes(), self._lock:
+                segment = self.journal.rotate()
+                if segment:
+                    self._segments.append(segment)
+                pending = list(self._dirty)
+            failed = False
+            for start in range(0, len(pending), self.flush_batch):
+                with self._lock:
+                    changes = self._take(pending[start:start + self.flush_batch])
+                if not changes:
+                    continue
+                try:
+                    _commit_changes(changes)
+                except Error as e:
+                    print(f"Error flushing carts: {e}")
+                    self._stats['flush_errors'] += 1
+                    self._restore(changes)  # later batches were never taken and stay dirty
+                    failed = True
+                    break
+                self._stats['carts_flushed'] += len(changes)
+            self._stats['flushes'] += 1
+            if not failed:
+                for path in self._segments:
+                    os.remove(path)
+                self._segments = []
+        self._evict_idle()
+
+    def _evict_idle(self):
+        """Drop carts with nothing to flush that have not been used for idle_ttl seconds"""
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            idle = [customer_id for customer_id, used in self._used.items() if used < cutoff]
+        for customer_id in idle:
+            with self._stripe(customer_id), self._lock:
+                # Used or changed again since the list was made
+                if self._used.get(customer_id, cutoff) >= cutoff or customer_id in self._dirty:
+                    continue
+                self.kv.delete(customer_id)
+                self._counts.pop(customer_id, None)
+                del self._used[customer_id]
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in cart flusher: {e}")
+
+    def close(self):
+        """Stop the flusher and write what is left"""
+        self._stopped.set()
+        try:
+            self.flush()
+        except Error as e:
+            print(f"Error flushing carts at exit: {e}")
+        self.journal.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(carts=len(self.kv), dirty=len(self._dirty), segments=len(self._segments))
+        return stats
+
+
+# One store per process. With MemoryKV each worker process has its own carts, so run a single
+# worker process or register a shared backend in KV_BACKENDS.
+store = CartStore(
+    create_kv(CART_STORE_CONFIG['backend']),
+    Journal(CART_STORE_CONFIG['journal_dir'], fsync=CART_STORE_CONFIG['fsync']),
+    flush_interval=CART_STORE_CONFIG['flush_interval'],
+    flush_batch=CART_STORE_CONFIG['flush_batch'],
+    idle_ttl=CART_STORE_CONFIG['idle_ttl'],
+    stripes=CART_STORE_CONFIG['stripes'])
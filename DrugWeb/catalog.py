@@ -0,0 +1,516 @@
+"""In-process medicine catalog cache.
+
+The medicine table changes only when stock or prices are edited, so the
+customer pages read listings, category lists and single medicines through
+this module instead of querying on every page view. Entries live in a
+size-bounded LRU with a TTL; every code path that writes the medicine
+table calls invalidate(), which drops all entries and bumps the catalog
+version. The TTL bounds staleness for writes made by other worker
+processes. A checkout changes only Stock, so stock_changed() lowers Stock
+on the cached rows of the medicines sold, found through a Med_Code index
+kept beside the LRU, and on the search index, which is kept outside the
+LRU; nothing is dropped. The version, which keys rendered fragments and
+ETags, moves only when a medicine sells out, since the pages show
+whether a medicine is in stock but not how many units are left. Category and price-range facets (facets.py), the typeahead
+prefix index (suggest.py) and the "did you mean" vocabulary (fuzzy.py)
+are updated per medicine through medicines_saved(); nothing deletes
+medicines, so anything that does should call invalidate().
+"""
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+import db
+import facets
+import fuzzy
+import search as search_engine
+import suggest
+import queries
+from db import StorageError, db_connection
+
+CACHE_CONFIG = {
+    'max_entries': 1024,   # cached listings, counts and lookups
+    'ttl': 300             # seconds before an entry is reloaded from the database
+}
+
+SORT_ORDERS = {
+    'price': 'Price ASC',
+    'price_desc': 'Price DESC',
+    'name': 'Name ASC'
+}
+
+SEARCH_FIELDS = ('Name', 'Generic_name')
+
+# Keyset pagination: the sort column for each order; Med_Code breaks ties
+KEYSET_ORDERS = {
+    'name': ('Name', 'ASC'),
+    'price': ('Price', 'ASC'),
+    'price_desc': ('Price', 'DESC')
+}
+
+PAGINATION_CONFIG = {
+    'approximate_count': False   # use MySQL's table statistics for unfiltered totals
+}
+
+
+class CatalogCache:
+    """Thread-safe LRU cache with per-entry expiry and a version counter"""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys = {}      # Med_Code -> keys of the entries holding its row
+        self._lock = threading.Lock()
+        self._writes = 0     # invalidations and stock changes, for loads racing them
+        self.version = 1
+        self.modified_at = time.time()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'stock_patches': 0}
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() to fill a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                return entry[1]
+            self._counters['misses'] += 1
+            writes = self._writes
+
+        value = loader()
+
+        with self._lock:
+            # A write that landed while we were loading makes this value stale
+            if writes == self._writes:
+                self._store(key, (now + self.ttl, value))
+                while len(self._entries) > self.max_entries:
+                    self._forget(*self._entries.popitem(last=False))
+                    self._counters['evictions'] += 1
+        return value
+
+    def _store(self, key, entry):
+        """Put an entry at the recent end and index its rows (caller holds the lock)"""
+        if key in self._entries:
+            self._forget(key, self._entries[key])
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        for row in _rows(entry[1]):
+            self._keys.setdefault(row['Med_Code'], set()).add(key)
+
+    def _forget(self, key, entry):
+        for row in _rows(entry[1]):
+            keys = self._keys.get(row['Med_Code'])
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._keys[row['Med_Code']]
+
+    def invalidate(self):
+        """Drop every entry and move to a new catalog version"""
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+            self._writes += 1
+            self.version += 1
+            self.modified_at = time.time()
+            self._counters['invalidations'] += 1
+
+    def take_stock(self, quantities):
+        """Lower Stock by {Med_Code: quantity} in the cached rows, keeping the version.
+
+        Patched entries get new rows and lists, so callers still holding the
+        old ones (and the search index rows they may share) are untouched.
+        Returns the Med_Codes whose cached Stock is now 0.
+        """
+        sold_out = set()
+        with self._lock:
+            self._writes += 1
+            keys = set()
+            for med_code in quantities:
+                keys.update(self._keys.get(med_code, ()))
+            for key in keys:
+                expires, value = self._entries[key]
+                if isinstance(value, dict):
+                    value = _less_stock(value, quantities, sold_out)
+                else:
+                    value = [_less_stock(row, quantities, sold_out) for row in value]
+                self._entries[key] = (expires, value)
+            self._counters['stock_patches'] += len(keys)
+        return sold_out
+
+    def touch(self):
+        """Move to a new catalog version without dropping entries"""
+        with self._lock:
+            self.version += 1
+            self.modified_at = time.time()
+
+    def stats(self):
+        with self._lock:
+            stats = {'entries': len(self._entries), 'max_entries': self.max_entries,
+                     'ttl': self.ttl, 'version': self.version}
+            stats.update(self._counters)
+            return stats
+
+
+def _rows(value):
+    """The medicine rows in a cached value: a row, a list of rows, or none"""
+    if isinstance(value, dict):
+        return [value] if 'Med_Code' in value else []
+    if isinstance(value, list):
+        return [row for row in value if isinstance(row, dict) and 'Med_Code' in row]
+    return []
+
+
+def _less_stock(row, quantities, sold_out):
+    """A copy of a row with the units sold taken off its Stock"""
+    if not isinstance(row, dict) or row.get('Med_Code') not in quantities:
+        return row
+    row = dict(row, Stock=row['Stock'] - quantities[row['Med_Code']])
+    if row['Stock'] <= 0:
+        sold_out.add(row['Med_Code'])
+    return row
+
+
+cache = CatalogCache(**CACHE_CONFIG)
+
+
+class SearchIndexCache:
+    """The in-process search index, rebuilt after ttl seconds or invalidate() by one thread at a time"""
+
+    def __init__(self, loader, ttl=300):
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._index = None
+        self._expires = 0
+        self._version = 0
+        self._stats = {'builds': 0}
+
+    def _current(self):
+        with self._lock:
+            if self._index is not None and self._expires > time.monotonic():
+                return self._index
+        return None
+
+    def get(self):
+        """The current index; concurrent callers on a miss wait for a single build"""
+        index = self._current()
+        if index is not None:
+            return index
+        with self._build_lock:
+            index = self._current()
+            if index is not None:
+                return index
+            with self._lock:
+                version = self._version
+            index = search_engine.SearchIndex(self.loader())
+            with self._lock:
+                # A write that landed while we were loading makes this index stale
+                if version == self._version:
+                    self._index = index
+                    self._expires = time.monotonic() + self.ttl
+                self._stats['builds'] += 1
+            return index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+            self._version += 1
+
+    def take_stock(self, quantities):
+        """Lower Stock in the index; returns the Med_Codes now out of stock"""
+        with self._lock:
+            if self._index is not None:
+                return self._index.take_stock(quantities)
+        return set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+def _query(sql, params=()):
+    """Run a catalog query on a pooled connection"""
+    with db_connection() as connection:
+        if not connection:
+            raise StorageError("Database connection failed")
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+facet_index = facets.FacetIndex(
+    lambda: _query(queries.FACET_ROWS), **facets.FACET_CONFIG)
+
+prefix_index = suggest.PrefixIndex(
+    lambda: _query(queries.NAME_ROWS),
+    fields=suggest.SUGGEST_CONFIG['fields'], rebuild_after=suggest.SUGGEST_CONFIG['rebuild_after'])
+
+fuzzy_index = fuzzy.FuzzyIndex(
+    lambda: _query(queries.NAME_ROWS), **fuzzy.FUZZY_CONFIG)
+
+search_index = SearchIndexCache(lambda: _query(queries.SEARCH_ROWS), CACHE_CONFIG['ttl'])
+
+
+def _where(category):
+    if category:
+        return " WHERE Category = %s", [category]
+    return "", []
+
+
+def _in_bucket(rows, bucket):
+    """Rows priced inside a facet bucket"""
+    if not bucket:
+        return rows
+    low, high = bucket
+    return [row for row in rows if row['Price'] >= low and (high is None or row['Price'] < high)]
+
+
+def _use_fulltext(search, search_fields):
+    engine = search_engine.SEARCH_CONFIG['engine']
+    if engine == 'memory' or (engine == 'auto' and db.backend.name != 'mysql'):
+        return False
+    return search_engine.fulltext_supported(search, search_fields)
+
+
+def search_medicines(search, category='', sort_by='relevance', search_fields=SEARCH_FIELDS):
+    """Every medicine matching a search, ranked or sorted as requested"""
+    key = ('search', search_engine.normalize(search), category, sort_by, tuple(search_fields))
+
+    def load():
+        if _use_fulltext(search, search_fields):
+            sql, params = search_engine.fulltext_query(search, category, sort_by, search_fields)
+            return _query(sql, params)
+        return search_index.get().search(search, category, sort_by, search_fields)
+
+    return cache.get(key, load)
+
+
+def list_medicines(search='', category='', sort_by='name', limit=None, offset=0,
+                   search_fields=SEARCH_FIELDS):
+    """Medicines matching the filters, in the requested order"""
+    if search:
+        results = search_medicines(search, category, sort_by, search_fields)
+        return results[offset:offset + limit] if limit is not None else results[offset:]
+
+    key = ('list', category, sort_by, limit, offset)
+    return cache.get(key, lambda: _query(*list_query(category, sort_by, limit, offset)))
+
+
+def list_query(category='', sort_by='name', limit=None, offset=0):
+    """SQL and params for one page of the unsearched catalog"""
+    where, params = _where(category)
+    sql = "SELECT * FROM medicine" + where + " ORDER BY " + SORT_ORDERS.get(sort_by, SORT_ORDERS['name'])
+    if limit is not None:
+        sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+    return sql, params
+
+
+def count_medicines(search='', category='', search_fields=SEARCH_FIELDS, price=''):
+    """Number of medicines matching the filters"""
+    bucket = facets.bucket_for_key(price)
+    if search:
+        return len(_in_bucket(search_medicines(search, category, 'relevance', search_fields), bucket))
+    return facet_index.count(category, bucket)
+
+
+def approximate_count():
+    """Estimated medicine count from MySQL's table statistics (exact count elsewhere)"""
+    if db.backend.name != 'mysql':
+        return count_medicines()
+    return cache.get(('approximate_count',), lambda: _query(
+        "SELECT TABLE_ROWS AS total FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'medicine'"
+    )[0]['total'])
+
+
+def encode_cursor(state):
+    """Opaque, URL-safe page token"""
+    raw = json.dumps(state, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Page state from a token, or None if it is missing or malformed"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        state = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def seek_query(category, sort_by, key, forward, limit, bucket=None):
+    """SQL and params for the rows after (or before) a key in sort order, plus one to detect more"""
+    column, order = KEYSET_ORDERS[sort_by]
+    ascending = (order == 'ASC') == forward
+    direction = 'ASC' if ascending else 'DESC'
+    compare = '>' if ascending else '<'
+
+    sql = "SELECT * FROM medicine WHERE 1=1"
+    params = []
+    if category:
+        sql += " AND Category = %s"
+        params.append(category)
+    if bucket:
+        sql += " AND Price >= %s"
+        params.append(bucket[0])
+        if bucket[1] is not None:
+            sql += " AND Price < %s"
+            params.append(bucket[1])
+    if key:
+        sql += f" AND ({column} {compare} %s OR ({column} = %s AND Med_Code {compare} %s))"
+        params.extend([key[0], key[0], key[1]])
+    sql += f" ORDER BY {column} {direction}, Med_Code {direction} LIMIT {int(limit) + 1}"
+    return sql, params
+
+
+def _seek(category, sort_by, key, forward, limit, bucket=None):
+    """Rows after (or before) a key in sort order, fetching one extra to detect more"""
+    cache_key = ('seek', category, bucket, sort_by, tuple(key) if key else None, forward, limit)
+    return cache.get(cache_key, lambda: _query(*seek_query(category, sort_by, key, forward, limit, bucket)))
+
+
+def browse_page(search='', category='', sort_by='name', cursor=None, per_page=12,
+                search_fields=SEARCH_FIELDS, price=''):
+    """One page of the catalog with opaque next/prev tokens.
+
+    Unfiltered and category listings seek from the last row of the previous
+    page using (sort column, Med_Code), so any page costs one indexed range
+    read. Searches page through the cached result list.
+    """
+    bucket = facets.bucket_for_key(price)
+    price = facets.bucket_key(bucket) if bucket else ''
+    state = decode_cursor(cursor)
+    if state and (state.get('s') != sort_by or state.get('c') != category or state.get('q') != search
+                  or state.get('r', '') != price):
+        state = None
+    page = state.get('p', 1) if state else 1
+    base = {'s': sort_by, 'c': category, 'q': search, 'r': price}
+
+    if search:
+        results = _in_bucket(search_medicines(search, category, sort_by, search_fields), bucket)
+        offset = max(0, int(state.get('o', 0))) if state else 0
+        medicines = results[offset:offset + per_page]
+        has_prev = offset > 0
+        has_next = offset + per_page < len(results)
+        next_state = dict(base, o=offset + per_page, p=page + 1)
+        prev_state = dict(base, o=max(0, offset - per_page), p=page - 1)
+    else:
+        if sort_by not in KEYSET_ORDERS:
+            sort_by = base['s'] = 'name'
+        forward = not state or state.get('d') != 'prev'
+        key = state.get('k') if state else None
+        rows = _seek(category, sort_by, key, forward, per_page, bucket)
+        more = len(rows) > per_page
+        medicines = rows[:per_page]
+        if not forward:
+            medicines = medicines[::-1]
+        has_prev = more if not forward else bool(key)
+        has_next = more if forward else True
+        column = KEYSET_ORDERS[sort_by][0]
+        if medicines:
+            first, last = medicines[0], medicines[-1]
+            next_state = dict(base, d='next', k=[last[column], last['Med_Code']], p=page + 1)
+            prev_state = dict(base, d='prev', k=[first[column], first['Med_Code']], p=page - 1)
+        else:
+            has_prev = has_next = False
+
+    return {
+        'medicines': medicines,
+        'page': page,
+        'next_cursor': encode_cursor(next_state) if has_next else None,
+        'prev_cursor': encode_cursor(prev_state) if has_prev else None
+    }
+
+
+def get_categories(price=''):
+    """Non-empty categories with their medicine counts, for the filter dropdown"""
+    return facet_index.categories(facets.bucket_for_key(price))
+
+
+def price_ranges(category=''):
+    """Price buckets with their medicine counts, for the filter dropdown"""
+    return facet_index.price_ranges(category)
+
+
+def suggest_names(prefix, limit=8):
+    """Medicine and generic names for the search-box typeahead"""
+    return prefix_index.suggest(prefix, limit)
+
+
+def did_you_mean(search, category='', search_fields=SEARCH_FIELDS):
+    """A spelling-corrected search that finds medicines, or None"""
+    corrected = fuzzy_index.did_you_mean(search)
+    if corrected and search_medicines(corrected, category, 'relevance', search_fields):
+        return corrected
+    return None
+
+
+def get_medicine(med_code):
+    """A single medicine by Med_Code, or None"""
+    def load():
+        rows = _query(queries.MEDICINE_BY_CODE, (med_code,))
+        return rows[0] if rows else None
+
+    return cache.get(('medicine', med_code), load)
+
+
+def invalidate():
+    """Call after any write to the medicine table"""
+    cache.invalidate()
+    search_index.invalidate()
+    facet_index.invalidate()
+    prefix_index.invalidate()
+    fuzzy_index.invalidate()
+
+
+def stock_changed(quantities):
+    """Call after checkout takes {Med_Code: quantity} from Stock.
+
+    Only the cached rows of the medicines sold are patched, and the
+    version stays put unless one of them sold out, so other listings,
+    rendered fragments and ETags stay valid. The facet, prefix and
+    spelling indexes do not use Stock.
+    """
+    # Cache first: it copies the rows it shares with the search index, which then lowers its own in place
+    sold_out = cache.take_stock(quantities)
+    sold_out |= search_index.take_stock(quantities)
+    if sold_out:
+        cache.touch()
+
+
+def medicines_saved(rows):
+    """Call after inserting or updating medicines; rows carry Med_Code, Name,
+    Generic_name, Category and Price"""
+    cache.invalidate()
+    search_index.invalidate()
+    for row in rows:
+        facet_index.save(row['Med_Code'], row['Category'], row['Price'])
+        prefix_index.save(row)
+        fuzzy_index.save(row)
+
+
+def version():
+    """Current catalog version; changes on every invalidation"""
+    return cache.version
+
+
+def freshness():
+    """(version, wall-clock time of the last change) for conditional GETs"""
+    return cache.version, cache.modified_at
+
+
+def cache_stats():
+    stats = cache.stats()
+    stats['search_index'] = search_index.stats()
+    return stats
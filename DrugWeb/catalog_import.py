@@ -0,0 +1,256 @@
+"""Streaming bulk import of supplier price lists into the medicine table.
+
+    python catalog_import.py supplier.csv
+    python catalog_import.py supplier.json --chunk-size 5000
+    DRUGWEB_DB_BACKEND=sqlite python catalog_import.py supplier.ndjson
+
+Admins can upload the same files at /admin/import_medicines. Files are
+read and validated one record at a time and written in chunks: each chunk
+is one executemany upsert (keyed on Med_Code) and one transaction, so
+memory use does not grow with the file and a failure loses at most the
+chunk in progress.
+
+CSV files need a header row; JSON files may be an array of objects or
+one object per line. Med_Code, Name and Price are required. Generic_name,
+Category and Stock are optional; when left out or blank, an existing
+medicine keeps its current value.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from decimal import Decimal, InvalidOperation
+import catalog
+import db
+from db import Error, StorageError, db_connection
+
+IMPORT_CONFIG = {
+    'chunk_size': 1000,   # rows per executemany batch and transaction
+    'max_errors': 100     # rejected rows reported back individually
+}
+
+COLUMNS = ('Med_Code', 'Name', 'Generic_name', 'Category', 'Price', 'Stock')
+REQUIRED = ('Med_Code', 'Name', 'Price')
+
+# VARCHAR sizes from the medicine table
+MAX_LENGTHS = {'Med_Code': 10, 'Name': 100, 'Generic_name': 100, 'Category': 50}
+
+MAX_PRICE = Decimal('99999999.99')  # DECIMAL(10,2)
+
+MAX_JSON_RECORD = 1024 * 1024
+
+
+class RowRejected(ValueError):
+    """A record that cannot be imported"""
+
+
+def detect_format(filename):
+    """'csv' or 'json' from a file name"""
+    return 'json' if filename.lower().endswith(('.json', '.ndjson', '.jsonl')) else 'csv'
+
+
+def read_csv(stream):
+    """(line number, record) for each CSV row"""
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_json(stream, read_size=65536):
+    """(record number, record) for each object of a JSON array or JSON-lines file"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    number = 0
+    eof = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,[]')
+        if buffer:
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof or len(buffer) > MAX_JSON_RECORD:
+                    raise RowRejected(f"Malformed JSON after record {number}")
+            else:
+                number += 1
+                yield number, record
+                buffer = buffer[end:]
+                continue
+        elif eof:
+            return
+        chunk = stream.read(read_size)
+        if chunk:
+            buffer += chunk
+        else:
+            eof = True
+
+
+def read_records(stream, fmt):
+    return read_json(stream) if fmt == 'json' else read_csv(stream)
+
+
+def validate_record(record):
+    """Medicine column values from a raw record; raises RowRejected"""
+    if not isinstance(record, dict):
+        raise RowRejected("Record is not an object")
+    by_name = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+    values = {}
+    for column in COLUMNS:
+        value = by_name.get(column.lower())
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            if column in REQUIRED:
+                raise RowRejected(f"Missing {column}")
+            continue
+        values[column] = value
+
+    for column, limit in MAX_LENGTHS.items():
+        if column in values:
+            values[column] = str(values[column])
+            if len(values[column]) > limit:
+                raise RowRejected(f"{column} longer than {limit} characters")
+
+    try:
+        price = Decimal(str(values['Price']))
+    except InvalidOperation:
+        raise RowRejected(f"Invalid Price: {values['Price']}")
+    if not price.is_finite() or price < 0 or price > MAX_PRICE:
+        raise RowRejected(f"Price out of range: {values['Price']}")
+    values['Price'] = str(price.quantize(Decimal('0.01')))
+
+    if 'Stock' in values:
+        try:
+            stock = int(str(values['Stock']))
+        except ValueError:
+            raise RowRejected(f"Invalid Stock: {values['Stock']}")
+        if stock < 0:
+            raise RowRejected(f"Negative Stock: {stock}")
+        values['Stock'] = stock
+    return values
+
+
+def validated(records):
+    """(row number, values, None) for valid records, (row number, None, reason) otherwise"""
+    try:
+        for number, record in records:
+            try:
+                yield number, validate_record(record), None
+            except RowRejected as e:
+                yield number, None, str(e)
+    except RowRejected as e:  # the file itself is unreadable from here on
+        yield None, None, str(e)
+    except (csv.Error, UnicodeDecodeError) as e:
+        yield None, None, f"Unreadable file: {e}"
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def existing_codes_query(codes):
+    """SQL and params finding which of some Med_Codes are already in the table"""
+    return f"SELECT Med_Code FROM medicine WHERE Med_Code IN ({', '.join(['%s'] * len(codes))})", list(codes)
+
+
+def _write_chunk(cursor, chunk):
+    """Upsert a chunk of validated rows; returns (inserted, updated)"""
+    codes = list({values['Med_Code'] for values in chunk})
+    cursor.execute(*existing_codes_query(codes))
+    seen = {row[0] for row in cursor.fetchall()}
+
+    inserted = updated = 0
+    for values in chunk:
+        if values['Med_Code'] in seen:
+            updated += 1
+        else:
+            inserted += 1
+            seen.add(values['Med_Code'])
+
+    # Rows that leave out optional columns need a statement that does not touch them
+    by_columns = {}
+    for values in chunk:
+        columns = tuple(c for c in COLUMNS if c in values)
+        by_columns.setdefault(columns, []).append(tuple(values[c] for c in columns))
+    for columns, params in by_columns.items():
+        cursor.executemany(db.backend.upsert_sql('medicine', columns, ('Med_Code',)), params)
+    return inserted, updated
+
+
+def import_medicines(stream, fmt='csv', chunk_size=None):
+    """Stream records from a text file object into the medicine table.
+
+    Returns inserted, updated and rejected counts, the first rejected rows,
+    and 'error' if a database error stopped the import (earlier chunks stay
+    committed).
+    """
+    chunk_size = chunk_size or IMPORT_CONFIG['chunk_size']
+    result = {'inserted': 0, 'updated': 0, 'rejected': 0, 'errors': []}
+
+    def accepted():
+        for number, values, reason in validated(read_records(stream, fmt)):
+            if reason is None:
+                yield values
+                continue
+            result['rejected'] += 1
+            if len(result['errors']) < IMPORT_CONFIG['max_errors']:
+                result['errors'].append({'row': number, 'reason': reason})
+
+    with db_connection() as connection:
+        if not connection:
+            raise StorageError("Database connection failed")
+        cursor = connection.cursor()
+        try:
+            for chunk in _chunks(accepted(), chunk_size):
+                try:
+                    inserted, updated = _write_chunk(cursor, chunk)
+                    connection.commit()
+                except Error as e:
+                    connection.rollback()
+                    print(f"Error importing medicines: {e}")
+                    result['error'] = str(e)
+                    break
+                result['inserted'] += inserted
+                result['updated'] += updated
+        finally:
+            cursor.close()
+
+    # One rebuild for the whole import rather than per-row cache updates
+    if result['inserted'] or result['updated']:
+        catalog.invalidate()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import medicines from a CSV or JSON file")
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'json'), help="defaults to the file extension")
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CONFIG['chunk_size'])
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.path)
+    try:
+        with io.open(args.path, encoding='utf-8-sig', newline='') as stream:
+            result = import_medicines(stream, fmt, args.chunk_size)
+    except (OSError, Error) as e:
+        print(f"Import failed: {e}")
+        return 1
+
+    for error in result['errors']:
+        print(f"REJECTED  row {error['row']}: {error['reason']}")
+    print(f"{result['inserted']} inserted, {result['updated']} updated, {result['rejected']} rejected.")
+    if 'error' in result:
+        print(f"Import stopped: {result['error']}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
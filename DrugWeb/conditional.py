@@ -0,0 +1,98 @@
+"""Conditional GET (ETag / Last-Modified) for pages and JSON endpoints.
+
+Handlers describe what a response depends on: request parameters plus
+the (version, modified time) of each piece of data it shows, taken from
+catalog.freshness() or the counters kept here for notifications, points
+and reviews. Code that writes those tables calls bump(). A handler asks
+check() first and returns its 304 before opening a connection or
+rendering anything.
+
+Counters are per process, so a write handled by another worker is not
+seen here. Validators therefore also roll over every `max_staleness`
+seconds, which bounds how long a client can keep a stale copy, as the
+catalog cache's TTL does for cached data.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from flask import Response, request, session
+
+CONDITIONAL_CONFIG = {
+    'max_staleness': 60   # seconds before validators change even with no local writes
+}
+
+
+class VersionCounters:
+    """Thread-safe (version, modified time) per scope, e.g. ('notifications', 'CM001')"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self.started = time.time()
+
+    def bump(self, *scope):
+        with self._lock:
+            version, _ = self._versions.get(scope, (0, self.started))
+            self._versions[scope] = (version + 1, time.time())
+
+    def get(self, *scope):
+        with self._lock:
+            return self._versions.get(scope, (0, self.started))
+
+
+counters = VersionCounters()
+
+
+def bump(*scope):
+    """Call after writing data shown by a conditional response"""
+    counters.bump(*scope)
+
+
+def version(*scope):
+    return counters.get(*scope)
+
+
+def validators(parts, versions):
+    """Strong ETag and Last-Modified for a response built from versions"""
+    now = time.time()
+    window = CONDITIONAL_CONFIG['max_staleness']
+    window_start = now - now % window
+    key = repr((parts, [v for v, _ in versions], window_start))
+    etag = hashlib.sha1(key.encode()).hexdigest()[:24]
+    modified = max([m for _, m in versions] + [window_start])
+    return etag, datetime.fromtimestamp(int(modified), timezone.utc)
+
+
+def add_validators(response, etag, last_modified):
+    """Attach validators; browsers revalidate on every use and never share the copy"""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def check(parts, versions):
+    """(etag, last_modified, 304 response or None) for the current request.
+
+    Pending flash messages always get a full response so they are shown.
+    """
+    etag, last_modified = validators(parts, versions)
+    if session.get('_flashes'):
+        return etag, last_modified, None
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    elif request.if_modified_since:
+        fresh = last_modified <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return etag, last_modified, None
+    return etag, last_modified, add_validators(Response(status=304), etag, last_modified)
+
+
+def respond(body, etag, last_modified):
+    """A rendered page or jsonify() result with validators attached"""
+    response = body if isinstance(body, Response) else Response(body)
+    return add_validators(response, etag, last_modified)
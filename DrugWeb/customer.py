@@ -1,37 +1,23 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-import mysql.connector
-from mysql.connector import Error
+from db import Error, get_db_connection
+import cart
+import cart_store
+import catalog
+import conditional
+import fragments
+import idempotency
+import ids
+import outbox
+import queries
+import reservations
+from markupsafe import Markup
+from suggest import SUGGEST_CONFIG
 from datetime import datetime, date, timedelta
-import random
-import string
+import uuid
 
 # Create customer blueprint
 customer_bp = Blueprint('customer', __name__, url_prefix='/customer')
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'drugweb',
-    'user': 'root',
-    'password': ''
-}
-
-def get_db_connection():
-    """Create and return a database connection"""
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS drugweb")
-        cursor.execute("USE drugweb")
-        cursor.close()
-        
-        DB_CONFIG['database'] = 'drugweb'
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None
-
 @customer_bp.route('/dashboard')
 def dashboard():
     """Customer dashboard"""
@@ -41,11 +27,17 @@ def dashboard():
     
     # Get search and sort parameters
     search = request.args.get('search', '')
-    sort_by = request.args.get('sort_by', 'name')
+    sort_by = request.args.get('sort_by', 'relevance' if search else 'name')
     show_all = request.args.get('show_all', '0')
     
+    # Answer revalidations from the catalog and points versions alone
+    etag, last_modified, not_modified = conditional.check(
+        ('dashboard', session['user_id'], search, sort_by, show_all),
+        [catalog.freshness(), conditional.version('points', session['user_id'])])
+    if not_modified:
+        return not_modified
+    
     connection = get_db_connection()
-    medicines = []
     customer_points = 0
     
     if connection:
@@ -53,41 +45,35 @@ def dashboard():
         
         # Get customer's current points
         try:
-            cursor.execute("SELECT points FROM customer WHERE Customer_ID = %s", (session['user_id'],))
+            cursor.execute(queries.CUSTOMER_POINTS, (session['user_id'],))
             points_result = cursor.fetchone()
             customer_points = points_result['points'] if points_result else 0
         except Exception as e:
             print(f"Error fetching customer points: {e}")
             customer_points = 0
         
-        # Build query based on search and sort
-        base_query = "SELECT * FROM medicine WHERE 1=1"
-        params = []
-        
-        # Add search condition
-        if search:
-            base_query += " AND (Name LIKE %s OR Generic_name LIKE %s)"
-            params.extend([f'%{search}%', f'%{search}%'])
-        
-        # Add sorting
-        if sort_by == 'price':
-            base_query += " ORDER BY Price ASC"
-        elif sort_by == 'price_desc':
-            base_query += " ORDER BY Price DESC"
-        else:
-            base_query += " ORDER BY Name ASC"
-        
-        # Add limit if not showing all
-        if show_all != '1' and not search:
-            base_query += " LIMIT 9"
-        
-        cursor.execute(base_query, params)
-        medicines = cursor.fetchall()
         cursor.close()
         connection.close()
     
-    return render_template('customer_dashboard.html', medicines=medicines, 
-                         search=search, sort_by=sort_by, show_all=show_all, customer_points=customer_points)
+    # The medicine grid is the same for every customer, so it is rendered
+    # once per catalog version; limit unless showing all
+    limit = None if show_all == '1' or search else 9
+    grid = {'search': search, 'sort_by': sort_by, 'show_all': show_all}
+    
+    def grid_context():
+        medicines = catalog.list_medicines(search=search, sort_by=sort_by, limit=limit)
+        suggestion = catalog.did_you_mean(search) if search and not medicines else None
+        return dict(grid, medicines=medicines, suggestion=suggestion)
+    
+    try:
+        medicine_grid = fragments.render('dashboard_medicines.html', (search, sort_by, show_all), grid_context)
+    except Error as e:
+        print(f"Error fetching medicines: {e}")
+        medicine_grid = Markup(render_template('dashboard_medicines.html', medicines=[], suggestion=None, **grid))
+    
+    return conditional.respond(render_template('customer_dashboard.html', medicine_grid=medicine_grid,
+                         search=search, sort_by=sort_by, show_all=show_all, customer_points=customer_points),
+                         etag, last_modified)
 
 @customer_bp.route('/notifications')
 def notifications():
@@ -105,21 +91,17 @@ def notifications():
             cursor = connection.cursor(dictionary=True)
             
             # Get all notifications for this customer, ordered by newest first
-            cursor.execute("""
-                SELECT notification_id, message, type, is_read, created_at
-                FROM notifications
-                WHERE customer_id = %s
-                ORDER BY created_at DESC
-            """, (customer_id,))
+            cursor.execute(queries.NOTIFICATIONS, (customer_id,))
             
             notifications = cursor.fetchall()
             
             # Mark all notifications as read
-            cursor.execute("""
-                UPDATE notifications SET is_read = TRUE WHERE customer_id = %s
-            """, (customer_id,))
+            cursor.execute(queries.MARK_NOTIFICATIONS_READ, (customer_id,))
+            marked = cursor.rowcount
             
             connection.commit()
+            if marked:
+                conditional.bump('notifications', customer_id)
             
         except Exception as e:
             print(f"Error fetching notifications: {e}")
@@ -146,17 +128,12 @@ def points():
             cursor = connection.cursor(dictionary=True)
             
             # Get current points balance
-            cursor.execute("SELECT points FROM customer WHERE Customer_ID = %s", (customer_id,))
+            cursor.execute(queries.CUSTOMER_POINTS, (customer_id,))
             points_result = cursor.fetchone()
             current_points = points_result['points'] if points_result else 0
             
             # Get points transaction history
-            cursor.execute("""
-                SELECT points_earned, transaction_type, payment_id, description, created_at
-                FROM points_history
-                WHERE customer_id = %s
-                ORDER BY created_at DESC
-            """, (customer_id,))
+            cursor.execute(queries.POINTS_HISTORY, (customer_id,))
             
             points_history = cursor.fetchall()
             
@@ -177,78 +154,87 @@ def browse_medicines():
         return redirect(url_for('login'))
     
     search = request.args.get('search', '').strip()
-    sort_by = request.args.get('sort_by', 'name')
+    sort_by = request.args.get('sort_by', 'relevance' if search else 'name')
     category = request.args.get('category', '')
-    page = int(request.args.get('page', 1))
+    price = request.args.get('price', '')
+    cursor = request.args.get('cursor', '')
     per_page = 12  # Show 12 medicines per page
     
-    medicines = []
+    etag, last_modified, not_modified = conditional.check(
+        ('browse', session['user_id'], sorted(request.args.items())), [catalog.freshness()])
+    if not_modified:
+        return not_modified
+    
+    categories = []
+    price_ranges = []
     total_count = 0
+    search_fields = ('Name', 'Generic_name', 'Category')
     
-    connection = get_db_connection()
-    if connection:
-        cursor = connection.cursor(dictionary=True)
-        
-        # Build the base query
-        base_query = "SELECT * FROM medicine WHERE 1=1"
-        count_query = "SELECT COUNT(*) as total FROM medicine WHERE 1=1"
-        params = []
-        
-        # Add search condition
-        if search:
-            base_query += " AND (Name LIKE %s OR Generic_name LIKE %s OR Category LIKE %s)"
-            count_query += " AND (Name LIKE %s OR Generic_name LIKE %s OR Category LIKE %s)"
-            params.extend([f'%{search}%', f'%{search}%', f'%{search}%'])
-        
-        # Add category filter
-        if category:
-            base_query += " AND Category = %s"
-            count_query += " AND Category = %s"
-            params.append(category)
-        
-        # Add ordering
-        if sort_by == 'price':
-            base_query += " ORDER BY Price ASC"
-        elif sort_by == 'price_desc':
-            base_query += " ORDER BY Price DESC"
+    # Counts and facets are served from memory
+    try:
+        if not search and not category and not price and catalog.PAGINATION_CONFIG['approximate_count']:
+            total_count = catalog.approximate_count()
         else:
-            base_query += " ORDER BY Name ASC"
-        
-        # Get total count for pagination
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()['total']
-        
-        # Add pagination
-        offset = (page - 1) * per_page
-        base_query += f" LIMIT {per_page} OFFSET {offset}"
-        
-        # Get medicines
-        cursor.execute(base_query, params)
-        medicines = cursor.fetchall()
-        
-        # Get all categories for filter dropdown
-        cursor.execute("SELECT DISTINCT Category FROM medicine WHERE Category IS NOT NULL AND Category != '' ORDER BY Category")
-        categories = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
+            total_count = catalog.count_medicines(search=search, category=category,
+                                                  search_fields=search_fields, price=price)
+        categories = catalog.get_categories(price=price)
+        price_ranges = catalog.price_ranges(category=category)
+    except Error as e:
+        print(f"Error browsing medicines: {e}")
     
     # Calculate pagination info
-    total_pages = (total_count + per_page - 1) // per_page
-    has_prev = page > 1
-    has_next = page < total_pages
+    total_pages = max(1, (total_count + per_page - 1) // per_page)
+    
+    # The results grid is the same for every customer, so it is rendered once
+    # per catalog version from the catalog cache
+    grid = {'search': search, 'category': category, 'price': price, 'sort_by': sort_by,
+            'total_pages': total_pages}
+    
+    def grid_context():
+        page_info = catalog.browse_page(search=search, category=category, sort_by=sort_by,
+                                        cursor=cursor, per_page=per_page,
+                                        search_fields=search_fields, price=price)
+        suggestion = None
+        if search and not page_info['medicines'] and not cursor:
+            suggestion = catalog.did_you_mean(search, category=category, search_fields=search_fields)
+        return dict(grid, medicines=page_info['medicines'], page=page_info['page'],
+                    next_cursor=page_info['next_cursor'], prev_cursor=page_info['prev_cursor'],
+                    suggestion=suggestion)
+    
+    try:
+        medicine_grid = fragments.render('browse_results.html',
+                                         (search, category, price, sort_by, cursor, total_pages), grid_context)
+    except Error as e:
+        print(f"Error browsing medicines: {e}")
+        medicine_grid = Markup(render_template('browse_results.html', medicines=[], suggestion=None, **grid))
     
-    return render_template('browse_medicines.html', 
-                         medicines=medicines, 
+    return conditional.respond(render_template('browse_medicines.html', 
+                         medicine_grid=medicine_grid,
                          categories=categories,
+                         price_ranges=price_ranges,
                          search=search, 
                          sort_by=sort_by,
                          category=category,
-                         page=page,
-                         total_pages=total_pages,
-                         has_prev=has_prev,
-                         has_next=has_next,
-                         total_count=total_count)
+                         price=price,
+                         total_count=total_count), etag, last_modified)
+
+@customer_bp.route('/suggest')
+def suggest():
+    """Typeahead suggestions for the medicine search box"""
+    if 'user_id' not in session or session['user_type'] != 'customer':
+        return jsonify({'success': False, 'message': 'Unauthorized access'})
+    
+    prefix = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', SUGGEST_CONFIG['default_limit'], type=int),
+                SUGGEST_CONFIG['max_limit'])
+    
+    try:
+        suggestions = catalog.suggest_names(prefix, max(1, limit))
+    except Error as e:
+        print(f"Error loading suggestions: {e}")
+        return jsonify({'success': False, 'message': 'Suggestions unavailable'})
+    
+    return jsonify({'success': True, 'suggestions': suggestions})
 
 @customer_bp.route('/get_notifications')
 def get_notifications():
@@ -257,31 +243,31 @@ def get_notifications():
         return jsonify({'success': False, 'message': 'Unauthorized access'})
     
     customer_id = session['user_id']
+    etag, last_modified, not_modified = conditional.check(
+        ('get_notifications', customer_id), [conditional.version('notifications', customer_id)])
+    if not_modified:
+        return not_modified
+    
     connection = get_db_connection()
     
     if connection:
         cursor = connection.cursor(dictionary=True)
         try:
             # Get unread notifications for the customer
-            cursor.execute("""
-                SELECT Notification_ID, Message, Type, Created_at, Is_read
-                FROM notifications 
-                WHERE Customer_ID = %s 
-                ORDER BY Created_at DESC
-                LIMIT 10
-            """, (customer_id,))
+            cursor.execute(queries.RECENT_NOTIFICATIONS, (customer_id,))
             
             notifications = cursor.fetchall()
             
             # Mark notifications as read
-            cursor.execute("""
-                UPDATE notifications 
-                SET Is_read = 1 
-                WHERE Customer_ID = %s AND Is_read = 0
-            """, (customer_id,))
+            cursor.execute(queries.MARK_RECENT_NOTIFICATIONS_READ, (customer_id,))
+            marked = cursor.rowcount
             
             connection.commit()
-            return jsonify({'success': True, 'notifications': notifications})
+            # The response shows the unread state, so it keeps the pre-update ETag
+            if marked:
+                conditional.bump('notifications', customer_id)
+            return conditional.respond(jsonify({'success': True, 'notifications': notifications}),
+                                       etag, last_modified)
             
         except Exception as e:
             return jsonify({'success': False, 'message': f'Error: {str(e)}'})
@@ -298,6 +284,13 @@ def reviews():
         flash('Please login as customer first!', 'error')
         return redirect(url_for('login'))
     
+    etag = last_modified = None
+    if request.method == 'GET':
+        etag, last_modified, not_modified = conditional.check(
+            ('reviews', session['user_id']), [conditional.version('reviews')])
+        if not_modified:
+            return not_modified
+    
     connection = get_db_connection()
     
     if request.method == 'POST':
@@ -312,6 +305,7 @@ def reviews():
                     VALUES (%s, %s)
                 """, (customer_id, review_text))
                 connection.commit()
+                conditional.bump('reviews')
                 flash('Your review has been submitted successfully!', 'success')
             except Error as e:
                 connection.rollback()
@@ -323,17 +317,14 @@ def reviews():
     reviews_list = []
     if connection:
         cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT cr.review, u.F_name, u.L_name, cr.Customer_ID
-            FROM customer_review cr
-            JOIN user u ON cr.Customer_ID = u.ID
-            ORDER BY cr.Customer_ID DESC
-        """)
+        cursor.execute(queries.REVIEWS)
         reviews_list = cursor.fetchall()
         cursor.close()
         connection.close()
     
-    return render_template('reviews.html', reviews=reviews_list)
+    if etag is None:
+        return render_template('reviews.html', reviews=reviews_list)
+    return conditional.respond(render_template('reviews.html', reviews=reviews_list), etag, last_modified)
 
 @customer_bp.route('/request_medicine', methods=['GET', 'POST'])
 def request_medicine():
@@ -368,33 +359,7 @@ def request_medicine():
     requests_list = []
     if connection:
         cursor = connection.cursor(dictionary=True)
-        
-        # First ensure the Status column exists
-        try:
-            cursor.execute("ALTER TABLE customer_request ADD COLUMN IF NOT EXISTS Status VARCHAR(20) DEFAULT 'Pending'")
-            connection.commit()
-        except:
-            pass  # Column might already exist
-        
-        try:
-            cursor.execute("""
-                SELECT request_med_name, Expected_date, 
-                       IFNULL(Status, 'Pending') as Status
-                FROM customer_request
-                WHERE Customer_ID = %s
-                ORDER BY request_med_name DESC
-            """, (session['user_id'],))
-        except:
-            # If Status column still doesn't exist, add it and retry
-            cursor.execute("ALTER TABLE customer_request ADD COLUMN Status VARCHAR(20) DEFAULT 'Pending'")
-            connection.commit()
-            cursor.execute("""
-                SELECT request_med_name, Expected_date, 
-                       IFNULL(Status, 'Pending') as Status
-                FROM customer_request
-                WHERE Customer_ID = %s
-                ORDER BY request_med_name DESC
-            """, (session['user_id'],))
+        cursor.execute(queries.CUSTOMER_REQUESTS, (session['user_id'],))
         requests_list = cursor.fetchall()
         cursor.close()
         connection.close()
@@ -423,10 +388,7 @@ def profile():
         if connection:
             cursor = connection.cursor()
             try:
-                cursor.execute("""
-                    UPDATE user SET F_name = %s, L_name = %s, email = %s, 
-                    phone = %s, address = %s WHERE ID = %s
-                """, (f_name, l_name, email, phone, address, session['user_id']))
+                cursor.execute(queries.UPDATE_PROFILE, (f_name, l_name, email, phone, address, session['user_id']))
                 connection.commit()
                 session['user_name'] = f"{f_name} {l_name}"
                 flash('Profile updated successfully!', 'success')
@@ -441,23 +403,16 @@ def profile():
         cursor = connection.cursor(dictionary=True)
         
         # Get user info
-        cursor.execute("SELECT * FROM user WHERE ID = %s", (session['user_id'],))
+        cursor.execute(queries.USER_BY_ID, (session['user_id'],))
         user_info = cursor.fetchone() or {}
         
         # Get customer info (points)
-        cursor.execute("SELECT * FROM customer WHERE Customer_ID = %s", (session['user_id'],))
+        cursor.execute(queries.CUSTOMER_BY_ID, (session['user_id'],))
         customer_info = cursor.fetchone() or {}
         
         # Get recent requests for notifications with status
         try:
-            cursor.execute("""
-                SELECT request_med_name, Expected_date, 
-                       IFNULL(Status, 'Pending') as Status 
-                FROM customer_request 
-                WHERE Customer_ID = %s 
-                ORDER BY request_med_name DESC 
-                LIMIT 5
-            """, (session['user_id'],))
+            cursor.execute(queries.RECENT_REQUESTS, (session['user_id'],))
         except:
             # If Status column doesn't exist, just get without it
             cursor.execute("""
@@ -471,13 +426,7 @@ def profile():
         recent_requests = cursor.fetchall()
         
         # Get recent reviews
-        cursor.execute("""
-            SELECT review 
-            FROM customer_review 
-            WHERE Customer_ID = %s 
-            ORDER BY Customer_ID DESC 
-            LIMIT 3
-        """, (session['user_id'],))
+        cursor.execute(queries.RECENT_REVIEWS, (session['user_id'],))
         recent_reviews = cursor.fetchall()
         
         cursor.close()
@@ -506,13 +455,7 @@ def all_notifications():
         
         # Create notifications based on requests and current date
         try:
-            cursor.execute("""
-                SELECT request_med_name, Expected_date, 
-                       IFNULL(Status, 'Pending') as Status 
-                FROM customer_request 
-                WHERE Customer_ID = %s 
-                ORDER BY request_med_name DESC
-            """, (session['user_id'],))
+            cursor.execute(queries.CUSTOMER_REQUESTS, (session['user_id'],))
         except:
             # If Status column doesn't exist, just get without it
             cursor.execute("""
@@ -584,7 +527,7 @@ def all_notifications():
                         })
         
         # Add welcome notification for new users
-        cursor.execute("SELECT points FROM customer WHERE Customer_ID = %s", (session['user_id'],))
+        cursor.execute(queries.CUSTOMER_POINTS, (session['user_id'],))
         result = cursor.fetchone()
         
         cursor.close()
@@ -607,64 +550,19 @@ def add_to_cart():
         data = request.json
         
         med_code = data.get('med_code')
-        med_name = data.get('med_name')
         quantity = int(data.get('quantity', 1))
-        price = float(data.get('price', 0))
         customer_id = session['user_id']
         
         if not med_code or quantity <= 0:
             return jsonify({'success': False, 'message': 'Invalid input data'})
         
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'success': False, 'message': 'Database connection failed'})
-        
-        cursor = connection.cursor(dictionary=True)
-        
-        # Check if medicine exists and has enough stock
-        cursor.execute("SELECT Stock FROM medicine WHERE Med_code = %s", (med_code,))
-        medicine = cursor.fetchone()
+        # Goes to the cart store; the cart table is written in the background
+        reason = cart.add_item(customer_id, med_code, quantity)
+        if reason:
+            return jsonify({'success': False, 'message': reason})
         
-        if not medicine:
-            cursor.close()
-            connection.close()
-            return jsonify({'success': False, 'message': 'Medicine not found'})
-        
-        if medicine['Stock'] < quantity:
-            cursor.close()
-            connection.close()
-            return jsonify({'success': False, 'message': f'Only {medicine["Stock"]} units available'})
-        
-        # Check if item already exists in cart
-        cursor.execute("""
-            SELECT quantity FROM cart 
-            WHERE Customer_ID = %s AND Med_Code = %s
-        """, (customer_id, med_code))
-        
-        existing_item = cursor.fetchone()
-        
-        if existing_item:
-            # Update quantity
-            new_quantity = existing_item['quantity'] + quantity
-            new_total = new_quantity * price
-            cursor.execute("""
-                UPDATE cart 
-                SET quantity = %s, total_price = %s
-                WHERE Customer_ID = %s AND Med_Code = %s
-            """, (new_quantity, new_total, customer_id, med_code))
-        else:
-            # Add new item to cart
-            total_price = quantity * price
-            cursor.execute("""
-                INSERT INTO cart (Customer_ID, Med_Code, quantity, total_price) 
-                VALUES (%s, %s, %s, %s)
-            """, (customer_id, med_code, quantity, total_price))
-        
-        connection.commit()
-        cursor.close()
-        connection.close()
-        
-        return jsonify({'success': True, 'message': 'Item added to cart successfully'})
+        return jsonify({'success': True, 'message': 'Item added to cart successfully',
+                        'cart_count': cart.count(customer_id)})
         
     except Exception as e:
         print(f"Error adding to cart: {e}")
@@ -679,22 +577,8 @@ def view_cart():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    connection = get_db_connection()
-    if not connection:
-        flash("Database connection failed", "error")
-        return redirect(url_for('customer.dashboard'))
-    
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT c.Cart_ID, c.Med_Code, c.quantity, c.total_price,
-                   m.Name as Med_Name, m.Price as unit_price
-            FROM cart c 
-            JOIN medicine m ON c.Med_Code = m.Med_Code
-            WHERE c.Customer_ID = %s
-            ORDER BY c.Cart_ID DESC
-        """, (session['user_id'],))
-        cart_items = cursor.fetchall()
+        cart_items = cart.items(session['user_id'])
         
         # Calculate total cart value
         total_cart_value = sum(item['total_price'] for item in cart_items)
@@ -705,9 +589,6 @@ def view_cart():
         print(f"Error fetching cart: {e}")
         flash("Error loading cart", "error")
         return redirect(url_for('customer.dashboard'))
-    finally:
-        cursor.close()
-        connection.close()
 
 @customer_bp.route('/update_cart_quantity', methods=['POST'])
 def update_cart_quantity():
@@ -716,54 +597,28 @@ def update_cart_quantity():
         return jsonify({'success': False, 'message': 'Not logged in'})
     
     data = request.get_json()
-    cart_id = data.get('cart_id')
+    med_code = data.get('med_code')
     new_quantity = data.get('quantity')
     
-    if not cart_id or not new_quantity or int(new_quantity) < 1:
+    if not med_code or not new_quantity or int(new_quantity) < 1:
         return jsonify({'success': False, 'message': 'Invalid quantity'})
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'success': False, 'message': 'Database connection failed'})
-    
     try:
-        cursor = connection.cursor()
-        
-        # Get current item details to calculate new total
-        cursor.execute("""
-            SELECT c.Med_Code, m.Price 
-            FROM cart c 
-            JOIN medicine m ON c.Med_Code = m.Med_Code 
-            WHERE c.Cart_ID = %s
-        """, (cart_id,))
-        
-        item = cursor.fetchone()
-        if not item:
-            return jsonify({'success': False, 'message': 'Item not found'})
-        
-        new_total = int(new_quantity) * item[1]  # quantity * unit price
-        
-        # Update the quantity and total
-        cursor.execute("""
-            UPDATE cart 
-            SET quantity = %s, total_price = %s
-            WHERE Cart_ID = %s AND Customer_ID = %s
-        """, (new_quantity, new_total, cart_id, session['user_id']))
-        
-        connection.commit()
+        reason = cart.set_quantity(session['user_id'], med_code, int(new_quantity))
+        if reason:
+            return jsonify({'success': False, 'message': reason})
         
+        medicine = catalog.get_medicine(med_code)
         return jsonify({
             'success': True, 
             'new_quantity': int(new_quantity),
-            'item_total': float(new_total)
+            'item_total': float(int(new_quantity) * medicine['Price']),
+            'cart_count': cart.count(session['user_id'])
         })
         
     except Exception as e:
         print(f"Error updating cart: {e}")
         return jsonify({'success': False, 'message': 'Error updating cart'})
-    finally:
-        cursor.close()
-        connection.close()
 
 @customer_bp.route('/remove_from_cart', methods=['POST'])
 def remove_from_cart():
@@ -772,34 +627,56 @@ def remove_from_cart():
         return jsonify({'success': False, 'message': 'Not logged in'})
     
     data = request.get_json()
-    cart_id = data.get('cart_id')
+    med_code = data.get('med_code')
     
-    if not cart_id:
+    if not med_code:
         return jsonify({'success': False, 'message': 'Invalid item'})
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({'success': False, 'message': 'Database connection failed'})
-    
     try:
-        cursor = connection.cursor()
-        
-        # Remove the item
-        cursor.execute("""
-            DELETE FROM cart 
-            WHERE Cart_ID = %s AND Customer_ID = %s
-        """, (cart_id, session['user_id']))
-        
-        connection.commit()
+        cart.remove_item(session['user_id'], med_code)
         
-        return jsonify({'success': True, 'message': 'Item removed from cart'})
+        return jsonify({'success': True, 'message': 'Item removed from cart',
+                        'cart_count': cart.count(session['user_id'])})
         
     except Exception as e:
         print(f"Error removing from cart: {e}")
         return jsonify({'success': False, 'message': 'Error removing item'})
-    finally:
-        cursor.close()
-        connection.close()
+
+@customer_bp.route('/cart/count')
+def cart_count():
+    """Number of items in the cart for the navbar badge, from the cart store's counter"""
+    if 'user_id' not in session or session['user_type'] != 'customer':
+        return jsonify({'success': False, 'message': 'Please login as customer first'})
+    
+    try:
+        return jsonify({'success': True, 'count': cart.count(session['user_id'])})
+    except Error as e:
+        print(f"Error counting cart items: {e}")
+        return jsonify({'success': False, 'message': 'Error loading cart'})
+
+@customer_bp.route('/cart/batch', methods=['POST'])
+def cart_batch():
+    """Apply a batch of cart edits and return the new cart"""
+    if 'user_id' not in session or session['user_type'] != 'customer':
+        return jsonify({'success': False, 'message': 'Please login as customer first'})
+    
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'success': False, 'message': 'No operations given'})
+    if len(operations) > cart.CART_CONFIG['max_operations']:
+        return jsonify({'success': False, 'message': f"At most {cart.CART_CONFIG['max_operations']} operations per batch"})
+    
+    try:
+        results = cart.apply_operations(session['user_id'], operations)
+        state = cart.summary(cart.items(session['user_id']))
+        
+        return jsonify({'success': True, 'results': results, **state})
+        
+    except Error as e:
+        print(f"Error applying cart batch: {e}")
+        return jsonify({'success': False, 'message': 'Error updating cart'})
 
 @customer_bp.route('/proceed_checkout')
 def proceed_checkout():
@@ -815,9 +692,25 @@ def payment_page():
         flash("Please login first", "error")
         return redirect(url_for('login'))
     
-    connection = get_db_connection()
-    if not connection:
-        # Fallback test data if database fails
+    try:
+        # Same items and prices as the cart view, from the cart store
+        cart_items = []
+        total_amount = 0
+        
+        for item in cart.items(session['user_id']):
+            cart_items.append({
+                'name': item['Med_Name'],
+                'quantity': item['quantity'], 
+                'unit_price': float(item['unit_price']),
+                'total': float(item['total_price'])
+            })
+            total_amount += float(item['total_price'])
+        
+        print(f"DEBUG: Loaded {len(cart_items)} items from cart")
+        
+    except Exception as e:
+        print(f"Database error in payment_page: {e}")
+        # Fallback data
         cart_items = [
             {
                 'name': 'Sample Medicine',
@@ -827,56 +720,13 @@ def payment_page():
             }
         ]
         total_amount = 20.00
-    else:
-        try:
-            cursor = connection.cursor(dictionary=True)
-            # Get cart items for the user - same query as cart view
-            cursor.execute("""
-                SELECT c.Cart_ID, c.Med_Code, c.quantity, c.total_price,
-                       m.Name as Med_Name, m.Price as unit_price
-                FROM cart c 
-                JOIN medicine m ON c.Med_Code = m.Med_Code
-                WHERE c.Customer_ID = %s
-                ORDER BY c.Cart_ID DESC
-            """, (session['user_id'],))
-            
-            cart_results = cursor.fetchall()
-            
-            cart_items = []
-            total_amount = 0
-            
-            for item in cart_results:
-                cart_items.append({
-                    'name': item['Med_Name'],
-                    'quantity': item['quantity'], 
-                    'unit_price': float(item['unit_price']),
-                    'total': float(item['total_price'])
-                })
-                total_amount += float(item['total_price'])
-            
-            cursor.close()
-            connection.close()
-            
-            print(f"DEBUG: Loaded {len(cart_items)} items from database")
-            
-        except Exception as e:
-            print(f"Database error in payment_page: {e}")
-            # Fallback data
-            cart_items = [
-                {
-                    'name': 'Sample Medicine',
-                    'quantity': 1,
-                    'unit_price': 20.00,
-                    'total': 20.00
-                }
-            ]
-            total_amount = 20.00
     
     try:
         print("DEBUG: Attempting to render payment_page.html")
         return render_template('payment_page.html', 
                              cart_items=cart_items, 
-                             total_amount=total_amount)
+                             total_amount=total_amount,
+                             idempotency_key=uuid.uuid4().hex)
     except Exception as e:
         print(f"Template rendering error: {e}")
         import traceback
@@ -895,6 +745,24 @@ def process_payment():
         flash("Please select a payment method", "error")
         return redirect(url_for('customer.payment_page'))
     
+    # Repeated submits with the same key replay the first payment
+    idempotency_key = idempotency.clean_key(
+        request.form.get('idempotency_key') or request.headers.get('Idempotency-Key'))
+    if not idempotency_key:
+        return _checkout(payment_type, None)
+    with idempotency.checkouts.single_flight(session['user_id'], idempotency_key) as earlier_payment:
+        if earlier_payment:
+            return _replay_payment(earlier_payment)
+        return _checkout(payment_type, idempotency_key)
+
+def _replay_payment(payment_id):
+    """Answer a repeated checkout with the payment it already made"""
+    idempotency.checkouts.replayed()
+    flash(f"Payment already processed. Payment ID: {payment_id}", "info")
+    return redirect(url_for('customer.dashboard'))
+
+def _checkout(payment_type, idempotency_key):
+    """Take the stock, save the payment and remove the bought cart lines in one transaction"""
     connection = get_db_connection()
     if not connection:
         flash("Database connection failed", "error")
@@ -906,32 +774,52 @@ def process_payment():
         print(f"DEBUG: Processing payment for user {session['user_id']}")
         print(f"DEBUG: Payment method selected: {payment_type}")
         
-        # Calculate total from cart using same method as cart view
-        cursor.execute("""
-            SELECT SUM(c.total_price) as total
-            FROM cart c 
-            WHERE c.Customer_ID = %s
-        """, (session['user_id'],))
+        # A checkout with this key committed in another worker
+        if idempotency_key:
+            earlier_payment = idempotency.lookup(cursor, session['user_id'], idempotency_key)
+            if earlier_payment:
+                idempotency.checkouts.put(session['user_id'], idempotency_key, earlier_payment)
+                return _replay_payment(earlier_payment)
         
-        result = cursor.fetchone()
-        total_amount = result[0] if result and result[0] else 0
+        # Write pending cart edits so the cart table is current
+        cart_store.store.flush_customer(session['user_id'])
+        
+        # Read the cart lines
+        cursor.execute(queries.CHECKOUT_CART_LINES, (session['user_id'],))
+        
+        quantities = {med_code: quantity for med_code, quantity in cursor.fetchall()}
         
-        if total_amount <= 0:
+        if not quantities:
             flash("Cart is empty", "error")
             return redirect(url_for('customer.dashboard'))
         
-        # Generate unique payment ID
-        payment_id = 'PAY' + ''.join(random.choices(string.digits, k=6))
+        # Time-ordered and unique across workers, made in memory
+        payment_id = ids.payment_id()
+        
+        # Journal what is being bought, so a crash after the commit cannot put it back in the cart
+        cart_store.store.checkout_started(session['user_id'], payment_id, quantities)
+        
+        # Claim the key first so a duplicate in another worker waits for this transaction
+        if idempotency_key:
+            idempotency.record(cursor, session['user_id'], idempotency_key, payment_id)
+        
+        # Take the stock in one conditional UPDATE; nothing is sold if any item is short
+        if not reservations.take_stock(cursor, quantities):
+            connection.rollback()
+            for med_code, units in reservations.shortages(cursor, quantities):
+                medicine = catalog.get_medicine(med_code)
+                name = medicine['Name'] if medicine else med_code
+                flash(f"Sorry, only {units} units of {name} are left. Please update your cart.", "error")
+            return redirect(url_for('customer.view_cart'))
+        
+        # Price the lines from medicine, whose rows take_stock has just locked, as the cart page does;
+        # the cart table's total_price is only a copy made when the cart was last flushed
+        cursor.execute(queries.CHECKOUT_TOTAL, (session['user_id'],))
+        total_amount = cursor.fetchone()[0]
         
         # Save payment record to existing payment table
         
         try:
-            # First check if payment_id already exists
-            cursor.execute("SELECT COUNT(*) FROM payment WHERE payment_id = %s", (payment_id,))
-            if cursor.fetchone()[0] > 0:
-                # Generate a new payment ID if collision
-                payment_id = 'PAY' + ''.join(random.choices(string.digits, k=8))
-            
             # Convert values to ensure proper types
             customer_id_str = str(session['user_id'])
             total_amount_decimal = float(total_amount)
@@ -949,36 +837,51 @@ def process_payment():
         # Points calculation: 1 point for every 10 BDT spent (rounded down)
         points_earned = int(total_amount_decimal // 10)
         
+        # Keep the order lines, priced as the total was
+        cursor.execute(queries.CHECKOUT_PAYMENT_ITEMS, (payment_id, customer_id_str))
+        
+        # Points, their history row and the order notification are written by the outbox workers
+        outbox.enqueue(cursor, 'payment_completed', {
+            'payment_id': payment_id,
+            'customer_id': customer_id_str,
+            'amount': total_amount_decimal,
+            'points': points_earned
+        })
+        
         if points_earned > 0:
-            print(f"DEBUG: Awarding {points_earned} points for purchase of ৳{total_amount_decimal}")
-            
-            # Add points to customer's account
-            cursor.execute("""
-                UPDATE customer 
-                SET points = points + %s 
-                WHERE Customer_ID = %s
-            """, (points_earned, customer_id_str))
-            
-            # Log the points transaction
-            cursor.execute("""
-                INSERT INTO points_history (customer_id, points_earned, transaction_type, payment_id, description, created_at)
-                VALUES (%s, %s, 'earned', %s, %s, NOW())
-            """, (customer_id_str, points_earned, payment_id, f"Purchase reward: {points_earned} points for ৳{total_amount_decimal} purchase"))
-            
-            # Update the flash message to include points earned
-            flash(f"Payment successful! Payment ID: {payment_id}. You earned {points_earned} points!", "success")
+            # Points are credited by the outbox workers, shortly after this commit
+            flash(f"Payment successful! Payment ID: {payment_id}. {points_earned} points are being credited to your account.", "success")
         else:
             flash(f"Payment successful! Payment ID: {payment_id}", "success")
         
-        # Clear cart after successful payment
-        cursor.execute("DELETE FROM cart WHERE Customer_ID = %s", (session['user_id'],))
+        # Remove the lines bought; items added in another tab since they were read stay in the cart
+        cursor.executemany(queries.CART_LINE_DELETE, [(session['user_id'], med_code) for med_code in quantities])
         
         connection.commit()
+        if idempotency_key:
+            idempotency.checkouts.put(session['user_id'], idempotency_key, payment_id)
+        left = cart_store.store.checkout_done(session['user_id'], payment_id, quantities)
+        reservations.holds.release(session['user_id'], [med_code for med_code in quantities if not left[med_code]])
+        for med_code, quantity in left.items():
+            if quantity:
+                # Added in another tab while this checkout ran; hold only what is still in the cart
+                reservations.holds.place(session['user_id'], med_code, quantity)
+        catalog.stock_changed(quantities)
+        outbox.notify()
         
         return redirect(url_for('customer.dashboard'))
         
     except Exception as e:
         connection.rollback()
+        if idempotency_key:
+            # Lost the race for the key to another worker, whose payment has now committed
+            try:
+                earlier_payment = idempotency.lookup(cursor, session['user_id'], idempotency_key)
+            except Error:
+                earlier_payment = None
+            if earlier_payment:
+                idempotency.checkouts.put(session['user_id'], idempotency_key, earlier_payment)
+                return _replay_payment(earlier_payment)
         flash("Payment failed. Please try again.", "error")
         return redirect(url_for('customer.payment_page'))
     finally:
@@ -0,0 +1,233 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from storage import Error, StorageError, create_backend
+
+# Storage backend: 'mysql' in production, 'sqlite' for tests and benchmarks
+DB_BACKEND = os.environ.get('DRUGWEB_DB_BACKEND', 'mysql')
+SQLITE_PATH = os.environ.get('DRUGWEB_SQLITE_PATH', 'drugweb.sqlite3')
+
+# Database configuration
+DB_CONFIG = {
+    'host': 'localhost',
+    'database': 'drugweb',
+    'user': 'root',
+    'password': ''  # Add your MySQL password here
+}
+
+# Connection pool configuration
+POOL_CONFIG = {
+    'pool_size': 10,       # connections kept open between requests
+    'max_overflow': 10,    # extra connections allowed under load, closed on return
+    'recycle': 3600,       # seconds before a connection is replaced
+    'pre_ping': True,      # check a connection is alive before handing it out
+    'timeout': 30          # seconds to wait for a free connection
+}
+
+
+class PoolTimeout(StorageError):
+    """Raised when no connection becomes free within the pool timeout"""
+
+
+class PooledConnection:
+    """Connection borrowed from the pool; close() hands it back instead of closing it"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        if self.__dict__.get('_raw') is None:
+            raise StorageError("Connection has already been returned to the pool")
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self.__dict__.get('_raw') is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Handlers that return early without closing still give the connection back
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections shared by every blueprint"""
+
+    def __init__(self, connect, pool_size=10, max_overflow=10, recycle=3600,
+                 pre_ping=True, timeout=30):
+        self._connect = connect
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+
+        self._idle = deque()
+        self._lock = threading.Condition()
+        self._open = 0
+        self._checked_out = 0
+        self._counters = {
+            'connects': 0,
+            'checkouts': 0,
+            'recycled': 0,
+            'ping_failures': 0,
+            'discarded': 0,
+            'waits': 0,
+            'timeouts': 0
+        }
+
+    def get(self):
+        """Borrow a connection, opening a new one only if none is idle"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                idle = self._idle.pop() if self._idle else None
+                if idle is None:
+                    while self._open >= self.pool_size + self.max_overflow:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._counters['timeouts'] += 1
+                            raise PoolTimeout("Timed out waiting for a free database connection")
+                        self._counters['waits'] += 1
+                        self._lock.wait(remaining)
+                        if self._idle:
+                            idle = self._idle.pop()
+                            break
+                    else:
+                        self._open += 1
+                self._checked_out += 1
+                self._counters['checkouts'] += 1
+
+            # Ping and connect outside the lock so a slow server does not block other borrowers
+            if idle is not None:
+                raw, created_at = idle
+                if self._usable(raw, created_at):
+                    return PooledConnection(self, raw, created_at)
+                with self._lock:
+                    self._open -= 1
+                    self._checked_out -= 1
+                    self._lock.notify()
+                continue
+
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._lock:
+                    self._open -= 1
+                    self._checked_out -= 1
+                    self._lock.notify()
+                raise
+            with self._lock:
+                self._counters['connects'] += 1
+            return PooledConnection(self, raw, time.monotonic())
+
+    def _usable(self, raw, created_at):
+        """Drop connections that are too old or no longer answer a ping"""
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            with self._lock:
+                self._counters['recycled'] += 1
+            self._close_quietly(raw)
+            return False
+        if self.pre_ping:
+            try:
+                alive = raw.is_connected()
+            except Exception:
+                alive = False
+            if not alive:
+                with self._lock:
+                    self._counters['ping_failures'] += 1
+                self._close_quietly(raw)
+                return False
+        return True
+
+    def _release(self, raw, created_at):
+        # Roll back whatever the handler left open so the next borrower starts clean
+        try:
+            raw.rollback()
+            reusable = True
+        except Exception:
+            reusable = False
+
+        with self._lock:
+            self._checked_out -= 1
+            if reusable and len(self._idle) < self.pool_size:
+                self._idle.append((raw, created_at))
+            else:
+                self._open -= 1
+                self._counters['discarded'] += 1
+                self._close_quietly(raw)
+            self._lock.notify()
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def dispose(self):
+        """Close every idle connection (used on shutdown and in tests)"""
+        with self._lock:
+            while self._idle:
+                raw, _ = self._idle.pop()
+                self._open -= 1
+                self._close_quietly(raw)
+
+    def stats(self):
+        """Snapshot of pool usage for monitoring"""
+        with self._lock:
+            stats = {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'checked_out': self._checked_out,
+                'overflow': max(0, self._open - self.pool_size)
+            }
+            stats.update(self._counters)
+            return stats
+
+
+backend = create_backend(DB_BACKEND, mysql_config=DB_CONFIG, sqlite_path=SQLITE_PATH)
+pool = ConnectionPool(backend.connect, **POOL_CONFIG)
+
+
+def get_db_connection():
+    """Borrow a connection from the shared pool, or None if the database is unreachable"""
+    try:
+        return pool.get()
+    except Error as e:
+        print(f"Error connecting to the database ({backend.name}): {e}")
+        print("Please ensure the database server is running and accessible")
+        return None
+
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection for the duration of a with block"""
+    connection = get_db_connection()
+    try:
+        yield connection
+    finally:
+        if connection:
+            connection.close()
+
+
+def pool_stats():
+    """Current pool statistics"""
+    stats = pool.stats()
+    stats['backend'] = backend.name
+    return stats
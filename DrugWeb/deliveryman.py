@@ -1,35 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
-import mysql.connector
-from mysql.connector import Error
+from db import get_db_connection
+import conditional
+import queries
 from datetime import datetime
 
 # Create deliveryman blueprint
 deliveryman_bp = Blueprint('deliveryman', __name__, url_prefix='/deliveryman')
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'drugweb',
-    'user': 'root',
-    'password': ''
-}
-
-def get_db_connection():
-    """Create and return a database connection"""
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS drugweb")
-        cursor.execute("USE drugweb")
-        cursor.close()
-        
-        DB_CONFIG['database'] = 'drugweb'
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None
-
 @deliveryman_bp.route('/dashboard')
 def dashboard():
     """Deliveryman dashboard"""
@@ -46,20 +23,7 @@ def dashboard():
             cursor = connection.cursor(dictionary=True)
             
             # Get all payments assigned to this delivery man (including reassigned ones)
-            cursor.execute("""
-                SELECT p.payment_id as Payment_ID, p.Customer_ID, p.amount as Total_Amount, 
-                       p.payment_type, p.DeliveryMan_ID,
-                       CONCAT(u.F_name, ' ', u.L_name) as Customer_name,
-                       u.email as Customer_email, u.phone as Customer_phone, 
-                       u.address as Customer_address,
-                       COALESCE(p.status, 'Assigned') as Status,
-                       p.created_at as Payment_date, p.delivery_date
-                FROM payment p
-                JOIN customer c ON p.Customer_ID = c.Customer_ID
-                JOIN user u ON c.Customer_ID = u.ID
-                WHERE p.DeliveryMan_ID = %s
-                ORDER BY p.created_at DESC
-            """, (deliveryman_id,))
+            cursor.execute(queries.ASSIGNED_PAYMENTS, (deliveryman_id,))
             
             assigned_payments = cursor.fetchall()
             
@@ -96,14 +60,7 @@ def handle_delivery():
         cursor = connection.cursor(dictionary=True)
         
         # Verify this payment is assigned to this delivery man
-        cursor.execute("""
-            SELECT p.*, CONCAT(u.F_name, ' ', u.L_name) as customer_name,
-                   u.email as customer_email
-            FROM payment p
-            JOIN customer c ON p.Customer_ID = c.Customer_ID  
-            JOIN user u ON c.Customer_ID = u.ID
-            WHERE p.payment_id = %s AND p.DeliveryMan_ID = %s
-        """, (payment_id, deliveryman_id))
+        cursor.execute(queries.DELIVERY_PAYMENT, (payment_id, deliveryman_id))
         
         payment = cursor.fetchone()
         if not payment:
@@ -111,11 +68,7 @@ def handle_delivery():
         
         if action == 'accept':
             # Update payment status to accepted
-            cursor.execute("""
-                UPDATE payment 
-                SET status = 'Accepted for Delivery', delivery_date = %s 
-                WHERE payment_id = %s
-            """, (delivery_date, payment_id))
+            cursor.execute(queries.ACCEPT_DELIVERY, (delivery_date, payment_id))
             
             # Add notification for customer
             notification_message = f"Great news! Your order (Payment #{payment_id}) has been accepted by our delivery partner and will be delivered on {delivery_date}."
@@ -128,11 +81,7 @@ def handle_delivery():
             
         elif action == 'decline':
             # Update payment to remove delivery man assignment
-            cursor.execute("""
-                UPDATE payment 
-                SET DeliveryMan_ID = NULL, status = 'Pending Assignment' 
-                WHERE payment_id = %s
-            """, (payment_id,))
+            cursor.execute(queries.RELEASE_DELIVERY, (payment_id,))
             
             # Add notification for customer
             notification_message = f"We apologize, but your order (Payment #{payment_id}) needs to be reassigned to a different delivery partner. Our admin will assign it shortly."
@@ -144,6 +93,7 @@ def handle_delivery():
             message = f"Order #{payment_id} declined and made available for reassignment. Customer has been notified."
         
         connection.commit()
+        conditional.bump('notifications', payment['Customer_ID'])
         return jsonify({'success': True, 'message': message})
         
     except Exception as e:
@@ -167,13 +117,7 @@ def profile():
     if connection:
         cursor = connection.cursor(dictionary=True)
         try:
-            cursor.execute("""
-                SELECT u.F_name, u.L_name, u.email, u.phone, u.address,
-                       d.DeliveryMan_ID
-                FROM user u
-                JOIN deliveryman d ON u.ID = d.DeliveryMan_ID
-                WHERE u.ID = %s
-            """, (deliveryman_id,))
+            cursor.execute(queries.DELIVERYMAN_PROFILE, (deliveryman_id,))
             
             deliveryman_info = cursor.fetchone() or {}
             
@@ -0,0 +1,97 @@
+"""Streaming CSV and NDJSON table exports.
+
+Rows are read through an unbuffered cursor (mysql.connector's default;
+the SQLite adapter's cursors are lazy as well) in batches of FETCH_SIZE
+and written out as they arrive, so the admin export endpoints send the
+first bytes straight away and hold only one batch in memory however big
+the table is. Each export walks its table in primary-key order.
+"""
+import csv
+import io
+import itertools
+import json
+from db import Error, StorageError, get_db_connection
+
+FETCH_SIZE = 1000
+
+EXPORTS = {
+    'medicine': "SELECT Med_Code, Name, Generic_name, Category, Price, Stock FROM medicine ORDER BY Med_Code",
+    'payment': """
+        SELECT payment_id, Customer_ID, amount, payment_type, DeliveryMan_ID, status, delivery_date, created_at
+        FROM payment ORDER BY payment_id
+    """,
+    'payment_item': """
+        SELECT item_id, payment_id, Med_Code, quantity, unit_price, total_price
+        FROM payment_item ORDER BY item_id
+    """,
+    'customer_request': """
+        SELECT Request_ID, Customer_ID, request_med_name, Expected_date, Status
+        FROM customer_request ORDER BY Request_ID
+    """,
+    'points_history': """
+        SELECT history_id, customer_id, points_earned, transaction_type, payment_id, description, created_at
+        FROM points_history ORDER BY history_id
+    """
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+def _batches(table):
+    """(column names, row batch) pairs for a table, streamed from the database.
+
+    The first batch is empty so callers can send headers before any rows.
+    """
+    connection = get_db_connection()
+    if not connection:
+        raise StorageError("Database connection failed")
+    cursor = connection.cursor(buffered=False)
+    try:
+        cursor.execute(EXPORTS[table])
+        columns = [d[0] for d in cursor.description]
+        yield columns, []
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield columns, rows
+    finally:
+        # An abandoned download leaves unread rows; the pool discards the
+        # connection if it cannot be rolled back cleanly
+        try:
+            cursor.close()
+        except Error:
+            pass
+        connection.close()
+
+
+def _csv(table):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for columns, rows in _batches(table):
+        if not rows:
+            writer.writerow(columns)
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _ndjson(table):
+    for columns, rows in _batches(table):
+        yield ''.join(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in rows)
+
+
+def export_rows(table, fmt):
+    """Iterator of text chunks for one table in 'csv' or 'ndjson'.
+
+    The query is started here, so connection and SQL errors are raised to
+    the caller before any response has been sent.
+    """
+    if table not in EXPORTS or fmt not in FORMATS:
+        raise KeyError(f"No {fmt} export for {table}")
+    chunks = _csv(table) if fmt == 'csv' else _ndjson(table)
+    return itertools.chain([next(chunks)], chunks)
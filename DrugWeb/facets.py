@@ -0,0 +1,125 @@
+"""Category and price-range facets for the medicine catalog.
+
+Counts are kept per (category, price bucket) in memory and adjusted
+incrementally as medicines are saved, so the browse page gets
+its filter dropdowns, per-category counts and page totals without a
+query. The index remembers each medicine's current bucket, which lets an
+update move it between buckets without reading the old row. It is
+rebuilt from the database when first used, after invalidate(), and
+every `rebuild_after` seconds so writes made by other worker processes
+show up.
+"""
+import threading
+import time
+from collections import Counter
+
+# Price buckets as (low, high); high is exclusive, None means unbounded
+PRICE_BUCKETS = [(0, 10), (10, 50), (50, 100), (100, 500), (500, None)]
+
+FACET_CONFIG = {
+    'rebuild_after': 300   # seconds between full rebuilds from the database
+}
+
+
+def bucket_key(bucket):
+    low, high = bucket
+    return f'{low}-{high}' if high is not None else f'{low}+'
+
+
+def bucket_for_key(key):
+    """(low, high) for a bucket key from the query string, or None"""
+    for bucket in PRICE_BUCKETS:
+        if bucket_key(bucket) == key:
+            return bucket
+    return None
+
+
+def bucket_index(price):
+    price = float(price or 0)
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        if price >= low and (high is None or price < high):
+            return index
+    return 0
+
+
+class FacetIndex:
+    """Medicine counts per (category, price bucket)"""
+
+    def __init__(self, loader, rebuild_after=300):
+        self._loader = loader
+        self.rebuild_after = rebuild_after
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._members = {}   # Med_Code -> (category, bucket index)
+        self._built_at = None
+
+    def _ensure_built(self):
+        with self._lock:
+            fresh = self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_after
+        if not fresh:
+            self.rebuild()
+
+    def rebuild(self):
+        """Recount every medicine from the database"""
+        rows = self._loader()
+        counts = Counter()
+        members = {}
+        for row in rows:
+            member = (row['Category'] or '', bucket_index(row['Price']))
+            members[row['Med_Code']] = member
+            counts[member] += 1
+        with self._lock:
+            self._counts = counts
+            self._members = members
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a rebuild on next use"""
+        with self._lock:
+            self._built_at = None
+
+    def save(self, med_code, category, price):
+        """Record an inserted or updated medicine"""
+        member = (category or '', bucket_index(price))
+        with self._lock:
+            if self._built_at is None:
+                return  # the next rebuild will see the write
+            old = self._members.get(med_code)
+            if old == member:
+                return
+            if old is not None:
+                self._counts[old] -= 1
+                if self._counts[old] <= 0:
+                    del self._counts[old]
+            self._members[med_code] = member
+            self._counts[member] += 1
+
+    def count(self, category='', bucket=None):
+        """Medicines in a category and/or price bucket"""
+        self._ensure_built()
+        index = PRICE_BUCKETS.index(bucket) if bucket else None
+        with self._lock:
+            return sum(n for (cat, b), n in self._counts.items()
+                       if (not category or cat == category) and (index is None or b == index))
+
+    def categories(self, bucket=None):
+        """[{'Category', 'count'}] for non-empty categories, sorted by name"""
+        self._ensure_built()
+        index = PRICE_BUCKETS.index(bucket) if bucket else None
+        totals = Counter()
+        with self._lock:
+            for (cat, b), n in self._counts.items():
+                if cat and (index is None or b == index):
+                    totals[cat] += n
+        return [{'Category': cat, 'count': totals[cat]} for cat in sorted(totals)]
+
+    def price_ranges(self, category=''):
+        """[{'key', 'low', 'high', 'count'}] for every bucket"""
+        self._ensure_built()
+        totals = Counter()
+        with self._lock:
+            for (cat, b), n in self._counts.items():
+                if not category or cat == category:
+                    totals[b] += n
+        return [{'key': bucket_key(bucket), 'low': bucket[0], 'high': bucket[1], 'count': totals[index]}
+                for index, bucket in enumerate(PRICE_BUCKETS)]
@@ -0,0 +1,33 @@
+"""Rendered-HTML cache for template fragments shared by every customer.
+
+The medicine grids on the dashboard and browse pages depend only on the
+query parameters and the catalog, so they are rendered once per
+(template, catalog version, parameters) and reused; only the per-user
+parts of the page (navbar, points badge) are rendered on each request.
+Entries are held in the same LRU/TTL cache the catalog uses. A catalog
+write changes the version, so old fragments are never served again and
+age out of the LRU.
+"""
+from markupsafe import Markup
+from flask import render_template
+import catalog
+
+FRAGMENT_CONFIG = {
+    'max_entries': 512,   # rendered fragments kept
+    'ttl': 300            # seconds, matching the catalog cache
+}
+
+cache = catalog.CatalogCache(**FRAGMENT_CONFIG)
+
+
+def render(template, params, context):
+    """HTML for a fragment template, rendered with context() on a miss.
+
+    Errors raised by context() propagate and nothing is cached.
+    """
+    key = (template, catalog.version(), params)
+    return Markup(cache.get(key, lambda: render_template(template, **context())))
+
+
+def stats():
+    return cache.stats()
@@ -0,0 +1,186 @@
+"""Typo-tolerant "did you mean" lookup over medicine names.
+
+The vocabulary is every word of every Name and Generic_name. A search
+term that is not in it is corrected to the closest vocabulary word within
+a small edit distance (insertions, deletions, substitutions and adjacent
+transpositions). Candidates come from padded bigram postings bucketed by
+word length; only the rarest postings are scanned, so only words of a
+compatible length that share enough bigrams are considered, and at most
+`max_candidates` of them are verified with a bounded edit distance.
+Words are reference-counted per Med_Code so saves update the index in
+place.
+"""
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+FUZZY_CONFIG = {
+    'fields': ('Name', 'Generic_name'),
+    'min_length': 3,        # shorter terms are never corrected
+    'max_candidates': 50,   # vocabulary words verified per term
+    'rebuild_after': 300    # seconds between full rebuilds from the database
+}
+
+_WORD = re.compile(r'\w+')
+
+
+def words(text):
+    return _WORD.findall(str(text or '').lower())
+
+
+def max_distance(term):
+    """Edits allowed when correcting a term"""
+    return 1 if len(term) <= 4 else 2
+
+
+def bigrams(word):
+    padded = f'^{word}$'
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class FuzzyIndex:
+    """Vocabulary of medicine name words with bigram candidate lookup"""
+
+    def __init__(self, loader, fields=FUZZY_CONFIG['fields'], min_length=3, max_candidates=50,
+                 rebuild_after=300):
+        self._loader = loader
+        self.fields = fields
+        self.min_length = min_length
+        self.max_candidates = max_candidates
+        self.rebuild_after = rebuild_after
+        self._lock = threading.Lock()
+        self._refs = Counter()
+        self._postings = defaultdict(set)   # (bigram, word length) -> words
+        self._members = {}                  # Med_Code -> set of words
+        self._built_at = None
+
+    def _words(self, row):
+        found = set()
+        for field in self.fields:
+            found.update(w for w in words(row.get(field)) if len(w) >= self.min_length)
+        return found
+
+    def _ensure_built(self):
+        with self._lock:
+            fresh = self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_after
+        if not fresh:
+            self.rebuild()
+
+    def rebuild(self):
+        """Reindex every medicine from the database"""
+        refs = Counter()
+        members = {}
+        for row in self._loader():
+            found = self._words(row)
+            members[row['Med_Code']] = found
+            refs.update(found)
+        postings = defaultdict(set)
+        for word in refs:
+            for gram in bigrams(word):
+                postings[(gram, len(word))].add(word)
+        with self._lock:
+            self._refs = refs
+            self._postings = postings
+            self._members = members
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a rebuild on next use"""
+        with self._lock:
+            self._built_at = None
+
+    def _add(self, word):
+        self._refs[word] += 1
+        if self._refs[word] == 1:
+            for gram in bigrams(word):
+                self._postings[(gram, len(word))].add(word)
+
+    def _discard(self, word):
+        self._refs[word] -= 1
+        if self._refs[word] <= 0:
+            del self._refs[word]
+            for gram in bigrams(word):
+                self._postings[(gram, len(word))].discard(word)
+
+    def save(self, row):
+        """Record an inserted or updated medicine"""
+        found = self._words(row)
+        with self._lock:
+            if self._built_at is None:
+                return  # the next rebuild will see the write
+            old = self._members.get(row['Med_Code'], set())
+            for word in old - found:
+                self._discard(word)
+            for word in found - old:
+                self._add(word)
+            self._members[row['Med_Code']] = found
+
+    def correct(self, term):
+        """Closest vocabulary word to term, or None if there is none close enough"""
+        limit = max_distance(term)
+        grams = bigrams(term)
+        # One edit removes at most 3 of the term's bigrams (a transposition:
+        # ^zinc$ -> ^zicn$ loses in, nc, c$), so a word within `limit` edits
+        # keeps at least len(grams) - 3 * limit of them and appears in one of
+        # the 3 * limit + 1 rarest postings: only those are scanned, the rest
+        # are probed. Words sharing no bigram at all are not looked for.
+        needed = max(len(grams) - 3 * limit, 1)
+        shared = {}
+        with self._lock:
+            for length in range(len(term) - limit, len(term) + limit + 1):
+                postings = sorted((self._postings.get((g, length), ()) for g in grams), key=len)
+                scan = len(postings) - needed + 1
+                if scan <= 0:
+                    continue
+                for word in set().union(*postings[:scan]):
+                    count = sum(1 for posting in postings if word in posting)
+                    if count >= needed:
+                        shared[word] = count
+            candidates = sorted(shared, key=lambda w: (-shared[w], -self._refs[w], w))
+            candidates = [(w, self._refs[w]) for w in candidates[:self.max_candidates]]
+
+        best = None
+        for word, refs in candidates:
+            distance = edit_distance(term, word, limit)
+            if distance <= limit:
+                rank = (distance, -refs, word)
+                if best is None or rank < best:
+                    best = rank
+        return best[2] if best else None
+
+    def did_you_mean(self, query):
+        """The query with misspelled terms corrected, or None if nothing changed"""
+        self._ensure_built()
+        corrected = []
+        changed = False
+        for term in query.lower().split():
+            with self._lock:
+                known = term in self._refs
+            if known or len(term) < self.min_length or not term.isalnum():
+                corrected.append(term)
+                continue
+            word = self.correct(term)
+            if word:
+                changed = True
+            corrected.append(word or term)
+        return ' '.join(corrected) if changed else None
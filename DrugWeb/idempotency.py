@@ -0,0 +1,132 @@
+"""Idempotency keys for checkout.
+
+The payment page puts a fresh key in its form (API clients may send an
+Idempotency-Key header instead). The first checkout with a key records
+(Customer_ID, key) -> payment_id in the checkout_key table inside the
+payment transaction, so the key and the payment commit or roll back
+together. A request repeating a key gets the original payment ID back
+and no new transaction is started.
+
+Duplicates arriving together, e.g. a double-clicked submit button, are
+collapsed by single_flight(): the first request runs the checkout while
+the others wait on a per-key lock, then find its result in a small
+in-memory table and replay it. The lock is per process; a duplicate
+handled by another worker waits on the checkout_key row instead and
+replays from the table once the first transaction commits.
+
+Keys are kept for `ttl` seconds. Expired rows are deleted by checkouts
+every `sweep_interval` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import queries
+
+IDEMPOTENCY_CONFIG = {
+    'ttl': 600,             # seconds a key replays its payment
+    'max_keys': 10000,      # results kept in memory
+    'max_length': 64,       # longest key accepted
+    'sweep_interval': 60    # seconds between deletions of expired checkout_key rows
+}
+
+
+class KeyResults:
+    """Results of finished checkouts by (customer, key), with a lock per key in flight"""
+
+    def __init__(self, ttl=600, max_keys=10000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._results = OrderedDict()   # (customer, key) -> (payment_id, expires); every entry has the same TTL
+        self._flights = {}              # (customer, key) -> [lock, requests using it]
+        self._stats = {'stored': 0, 'replayed': 0, 'waited': 0}
+
+    def get(self, customer_id, key):
+        with self._lock:
+            self._expire()
+            entry = self._results.get((customer_id, key))
+            return entry[0] if entry else None
+
+    def put(self, customer_id, key, payment_id):
+        with self._lock:
+            self._results.pop((customer_id, key), None)
+            self._results[(customer_id, key)] = (payment_id, time.time() + self.ttl)
+            while len(self._results) > self.max_keys:
+                self._results.popitem(last=False)
+            self._stats['stored'] += 1
+
+    def replayed(self):
+        with self._lock:
+            self._stats['replayed'] += 1
+
+    def _expire(self):
+        now = time.time()
+        while self._results:
+            _, (_, expires) = next(iter(self._results.items()))
+            if expires > now:
+                break
+            self._results.popitem(last=False)
+
+    @contextmanager
+    def single_flight(self, customer_id, key):
+        """Run one request per key at a time; yields the payment ID of an earlier checkout or None"""
+        with self._lock:
+            flight = self._flights.setdefault((customer_id, key), [threading.Lock(), 0])
+            flight[1] += 1
+        if not flight[0].acquire(blocking=False):
+            with self._lock:
+                self._stats['waited'] += 1
+            flight[0].acquire()
+        try:
+            yield self.get(customer_id, key)
+        finally:
+            flight[0].release()
+            with self._lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[(customer_id, key)]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(keys=len(self._results), in_flight=len(self._flights))
+        return stats
+
+
+checkouts = KeyResults(IDEMPOTENCY_CONFIG['ttl'], IDEMPOTENCY_CONFIG['max_keys'])
+_next_sweep = [0.0]
+
+
+def clean_key(value):
+    """A usable key from a form field or header, or None"""
+    value = (value or '').strip()
+    if not value or len(value) > IDEMPOTENCY_CONFIG['max_length']:
+        return None
+    return value
+
+
+def lookup(cursor, customer_id, key):
+    """Payment ID recorded for a key that has not expired, or None"""
+    cursor.execute(queries.CHECKOUT_KEY_LOOKUP, (customer_id, key, int(time.time())))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def record(cursor, customer_id, key, payment_id):
+    """Claim a key for a payment inside the checkout transaction.
+
+    A concurrent checkout with the same key blocks on, or fails with, the
+    duplicate primary key until this transaction ends. Expired keys are
+    deleted here now and then, including any this key replaces.
+    """
+    now = int(time.time())
+    if now >= _next_sweep[0]:
+        _next_sweep[0] = now + IDEMPOTENCY_CONFIG['sweep_interval']
+        cursor.execute(queries.CHECKOUT_KEY_SWEEP, (now,))
+    else:
+        cursor.execute(queries.CHECKOUT_KEY_EXPIRE, (customer_id, key, now))
+    cursor.execute("""
+        INSERT INTO checkout_key (Customer_ID, idem_key, payment_id, expires_at)
+        VALUES (%s, %s, %s, %s)
+    """, (customer_id, key, payment_id, now + IDEMPOTENCY_CONFIG['ttl']))
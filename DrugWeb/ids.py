@@ -0,0 +1,218 @@
+"""Unique IDs handed out from memory.
+
+Payment IDs are time-ordered, Snowflake style: milliseconds since
+`epoch_ms`, then a worker number, then a per-millisecond counter, written
+as 'PAY' and 17 digits (20 characters, the width of payment_id). A
+process makes IDs with no database access apart from its worker number,
+which it leases from the id_worker table for `worker_lease` seconds. The
+lease is renewed by the first ID made after half of it has passed; if it
+ran out meanwhile and another process took the number, a new one is
+leased before the next ID is made, so two running processes never share
+a worker number. A process stopping normally gives its number back. When
+all 2**worker_bits numbers are leased, making a payment ID raises
+StorageError rather than risk a duplicate.
+
+A process that asks for more than 2**sequence_bits IDs in one
+millisecond borrows the next millisecond rather than waiting, and a
+clock that steps back is ignored until it catches up, so IDs from one
+process only ever increase. Payment IDs made before this generator (PAY
+and six or eight random digits) do not sort by time.
+
+Customer IDs are CM and a number of at least three digits (CM001,
+CM1000000), up to the 10 characters of Customer_ID. Each process reserves
+`customer_block` numbers at a time with one atomic UPDATE of the
+id_sequence row and hands them out from memory. Numbers are unique but
+not gap-free: whatever is left of a block when a process stops is never
+used.
+"""
+import atexit
+import threading
+import time
+import uuid
+import db
+import queries
+from db import Error, StorageError, db_connection
+
+IDS_CONFIG = {
+    'epoch_ms': 1704067200000,   # 2024-01-01 UTC; 40 bits of milliseconds from here last until 2058
+    'worker_bits': 8,            # worker numbers in use at once
+    'sequence_bits': 8,          # payment IDs per millisecond per worker
+    'worker_lease': 600,         # seconds a process holds its worker number without renewing
+    'customer_block': 20         # customer numbers reserved per trip to id_sequence
+}
+
+
+def _transaction(work):
+    """Run work(cursor) in its own transaction and return its result"""
+    with db_connection() as connection:
+        if not connection:
+            raise StorageError("Database connection failed")
+        cursor = connection.cursor()
+        try:
+            result = work(cursor)
+            connection.commit()
+        except Error:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    return result
+
+
+def reserve(name, count):
+    """Reserve count consecutive values of an id_sequence; returns the first"""
+    return _transaction(lambda cursor: db.backend.reserve_range(cursor, name, count))
+
+
+def lease_worker(owner, workers, lease):
+    """Lease a worker number below workers for lease seconds; returns it"""
+    def take(cursor):
+        now = int(time.time())
+        cursor.execute(queries.WORKER_FREE, (now,))
+        row = cursor.fetchone()
+        if row:
+            worker = row[0]
+            cursor.execute(queries.WORKER_TAKE, (owner, now + lease, worker, now))
+        else:
+            cursor.execute(queries.WORKER_LAST)
+            last = cursor.fetchone()[0]
+            worker = 0 if last is None else last + 1
+            if worker >= workers:
+                raise StorageError(f"All {workers} payment worker numbers are leased")
+            cursor.execute(queries.WORKER_ADD, (worker, owner, now + lease))
+        return worker if cursor.rowcount == 1 else None
+
+    # Another process may take the same number between the read and the write
+    for _ in range(5):
+        worker = _transaction(take)
+        if worker is not None:
+            return worker
+    raise StorageError("Could not lease a payment worker number")
+
+
+def renew_worker(worker, owner, lease):
+    """Extend a lease; False if it ran out and another process took the number"""
+    def renew(cursor):
+        cursor.execute(queries.WORKER_RENEW, (int(time.time()) + lease, worker, owner))
+        return cursor.rowcount == 1
+    return _transaction(renew)
+
+
+def release_worker(worker, owner):
+    """Give a worker number back before its lease ends"""
+    # Free from the next second, so the next holder's IDs start after this process's last one
+    _transaction(lambda cursor: cursor.execute(queries.WORKER_RELEASE, (int(time.time()) + 1, worker, owner)))
+
+
+class Snowflake:
+    """Time-ordered numeric IDs: (milliseconds, worker, counter) packed into one number"""
+
+    def __init__(self, prefix, digits, epoch_ms, worker_bits, sequence_bits, worker_lease):
+        self.prefix = prefix
+        self.digits = digits
+        self.epoch_ms = epoch_ms
+        self.worker_bits = worker_bits
+        self.sequence_bits = sequence_bits
+        self.worker_lease = worker_lease
+        self._owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._worker = None
+        self._renew_at = 0
+        self._last = -1
+        self._counter = 0
+        self._stats = {'issued': 0, 'borrowed_ms': 0, 'leases': 0, 'renewals': 0}
+
+    def _hold_worker(self):
+        """Lease a worker number, or renew the lease once half of it has passed (caller holds the lock)"""
+        if self._worker is not None and time.time() < self._renew_at:
+            return
+        if self._worker is not None and renew_worker(self._worker, self._owner, self.worker_lease):
+            self._stats['renewals'] += 1
+        else:
+            first = self._worker is None
+            self._worker = lease_worker(self._owner, 1 << self.worker_bits, self.worker_lease)
+            self._stats['leases'] += 1
+            if first:
+                atexit.register(self.release)
+        self._renew_at = time.time() + self.worker_lease / 2
+
+    def release(self):
+        """Give the worker number back (at exit)"""
+        with self._lock:
+            if self._worker is None:
+                return
+            try:
+                release_worker(self._worker, self._owner)
+            except Error as e:
+                print(f"Error releasing payment worker number {self._worker}: {e}")  # it expires instead
+            self._worker = None
+
+    def next(self):
+        with self._lock:
+            self._hold_worker()
+            now = max(int(time.time() * 1000) - self.epoch_ms, self._last)
+            if now == self._last:
+                self._counter = (self._counter + 1) & ((1 << self.sequence_bits) - 1)
+                if not self._counter:
+                    now += 1
+                    self._stats['borrowed_ms'] += 1
+            else:
+                self._counter = 0
+            self._last = now
+            self._stats['issued'] += 1
+            number = (now << (self.worker_bits + self.sequence_bits)) | (self._worker << self.sequence_bits) | self._counter
+            return f"{self.prefix}{number:0{self.digits}d}"
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['worker'] = self._worker
+        return stats
+
+
+class BlockAllocator:
+    """Consecutive numbers from an id_sequence, reserved block_size at a time"""
+
+    def __init__(self, sequence, block_size):
+        self.sequence = sequence
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._stats = {'issued': 0, 'blocks': 0}
+
+    def next(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next = reserve(self.sequence, self.block_size)
+                self._end = self._next + self.block_size
+                self._stats['blocks'] += 1
+            number = self._next
+            self._next += 1
+            self._stats['issued'] += 1
+            return number
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['remaining'] = self._end - self._next
+        return stats
+
+
+payments = Snowflake('PAY', 17, IDS_CONFIG['epoch_ms'], IDS_CONFIG['worker_bits'],
+                     IDS_CONFIG['sequence_bits'], IDS_CONFIG['worker_lease'])
+customers = BlockAllocator('customer', IDS_CONFIG['customer_block'])
+
+
+def payment_id():
+    """A new payment ID, unique across processes"""
+    return payments.next()
+
+
+def customer_id():
+    """A new customer ID: CM001, ..., CM999, CM1000, ..."""
+    return f"CM{customers.next():03d}"
+
+
+def stats():
+    return {'payments': payments.stats(), 'customers': customers.stats()}
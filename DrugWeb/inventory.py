@@ -0,0 +1,205 @@
+"""Bulk stock and price adjustments for the medicine table.
+
+    python inventory.py changes.csv
+    python inventory.py changes.json
+
+Each change names a Med_Code and any of: Stock (new absolute level),
+Stock_Delta (added to the current level, negative to remove) and Price.
+Admins can post the same batch as JSON to /admin/adjust_medicines.
+
+A batch runs in one transaction. For each chunk the affected rows are
+read with FOR UPDATE, the new values are worked out in Python, and one
+UPDATE ... CASE statement writes the whole chunk. Changes for unknown
+medicines, or that would take stock below zero, are rejected
+individually without stopping the batch. The catalog caches are updated
+once, after the commit.
+"""
+import argparse
+import io
+import sys
+from decimal import Decimal, InvalidOperation
+import catalog
+from catalog_import import MAX_PRICE, RowRejected, detect_format, read_records
+from db import Error, StorageError, db_connection
+
+ADJUST_CONFIG = {
+    'chunk_size': 500,     # medicines per UPDATE statement
+    'max_changes': 10000   # largest batch accepted in one request
+}
+
+
+def _field(change, name):
+    """A change field by case-insensitive name, with blanks treated as missing"""
+    for key, value in change.items():
+        if str(key).strip().lower() == name.lower():
+            if isinstance(value, str):
+                value = value.strip()
+            return None if value == '' else value
+    return None
+
+
+def parse_change(change):
+    """(Med_Code, absolute stock, stock delta, price) from a raw change; raises RowRejected"""
+    if not isinstance(change, dict):
+        raise RowRejected("Change is not an object")
+    med_code = _field(change, 'Med_Code')
+    if med_code is None:
+        raise RowRejected("Missing Med_Code")
+
+    stock, delta, price = _field(change, 'Stock'), _field(change, 'Stock_Delta'), _field(change, 'Price')
+    if stock is None and delta is None and price is None:
+        raise RowRejected("Nothing to change")
+    if stock is not None and delta is not None:
+        raise RowRejected("Give either Stock or Stock_Delta, not both")
+    try:
+        stock = int(str(stock)) if stock is not None else None
+        delta = int(str(delta)) if delta is not None else None
+    except ValueError:
+        raise RowRejected("Stock and Stock_Delta must be whole numbers")
+    if stock is not None and stock < 0:
+        raise RowRejected(f"Negative Stock: {stock}")
+    if price is not None:
+        try:
+            price = Decimal(str(price))
+        except InvalidOperation:
+            raise RowRejected(f"Invalid Price: {price}")
+        if not price.is_finite() or price < 0 or price > MAX_PRICE:
+            raise RowRejected(f"Price out of range: {price}")
+        price = price.quantize(Decimal('0.01'))
+    return str(med_code), stock, delta, price
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _apply_chunk(cursor, chunk, results):
+    """Lock, recompute and rewrite the medicines of one chunk; returns the changed rows"""
+    codes = list(dict.fromkeys(med_code for _, (med_code, _, _, _) in chunk))
+    cursor.execute(*lock_query(codes))
+    rows = {row['Med_Code']: dict(row) for row in cursor.fetchall()}
+
+    # Changes are applied in batch order, so repeated codes accumulate
+    changed = {}
+    for index, (med_code, stock, delta, price) in chunk:
+        row = rows.get(med_code)
+        if row is None:
+            results[index].update(status='not_found', reason='No such medicine')
+            continue
+        new_stock = stock if stock is not None else row['Stock'] + (delta or 0)
+        if new_stock < 0:
+            results[index].update(status='rejected', reason=f"Only {row['Stock']} in stock")
+            continue
+        row['Stock'] = new_stock
+        if price is not None:
+            row['Price'] = price
+        changed[med_code] = row
+        results[index].update(status='updated', stock=new_stock, price=float(row['Price']))
+
+    if not changed:
+        return []
+    cursor.execute(*update_query(changed))
+    return list(changed.values())
+
+
+def lock_query(codes):
+    """SQL and params that read and lock the medicines of a chunk"""
+    sql = f"""
+        SELECT Med_Code, Name, Generic_name, Category, Price, Stock
+        FROM medicine WHERE Med_Code IN ({', '.join(['%s'] * len(codes))})
+        FOR UPDATE
+    """
+    return sql, list(codes)
+
+
+def update_query(changed):
+    """SQL and params writing {Med_Code: row} back in one UPDATE"""
+    stock_cases = ' '.join(['WHEN %s THEN %s'] * len(changed))
+    price_cases = ' '.join(['WHEN %s THEN %s'] * len(changed))
+    params = []
+    for med_code, row in changed.items():
+        params.extend([med_code, row['Stock']])
+    for med_code, row in changed.items():
+        params.extend([med_code, str(row['Price'])])
+    params.extend(changed)
+    sql = f"""
+        UPDATE medicine
+        SET Stock = CASE Med_Code {stock_cases} ELSE Stock END,
+            Price = CASE Med_Code {price_cases} ELSE Price END
+        WHERE Med_Code IN ({', '.join(['%s'] * len(changed))})
+    """
+    return sql, params
+
+
+def adjust_medicines(changes, chunk_size=None):
+    """Apply a batch of stock/price changes in one transaction.
+
+    Returns one result per change, in order, with a status of 'updated'
+    (plus the new stock and price), 'not_found' or 'rejected' (plus a
+    reason). A database error rolls the whole batch back and is raised.
+    """
+    chunk_size = chunk_size or ADJUST_CONFIG['chunk_size']
+    results = []
+    parsed = []
+    for index, change in enumerate(changes):
+        med_code = _field(change, 'Med_Code') if isinstance(change, dict) else None
+        results.append({'med_code': med_code})
+        try:
+            parsed.append((index, parse_change(change)))
+        except RowRejected as e:
+            results[index].update(status='rejected', reason=str(e))
+
+    saved = []
+    if parsed:
+        with db_connection() as connection:
+            if not connection:
+                raise StorageError("Database connection failed")
+            cursor = connection.cursor(dictionary=True)
+            try:
+                for chunk in _chunks(parsed, chunk_size):
+                    saved.extend(_apply_chunk(cursor, chunk, results))
+                connection.commit()
+            except Error:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    if saved:
+        catalog.medicines_saved(saved)
+    return results
+
+
+def summarize(results):
+    """'N updated, N not found, N rejected'"""
+    counts = {'updated': 0, 'not_found': 0, 'rejected': 0}
+    for result in results:
+        counts[result['status']] += 1
+    return f"{counts['updated']} updated, {counts['not_found']} not found, {counts['rejected']} rejected"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply stock and price changes from a CSV or JSON file")
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'json'), help="defaults to the file extension")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.path)
+    try:
+        with io.open(args.path, encoding='utf-8-sig', newline='') as stream:
+            changes = [record for _, record in read_records(stream, fmt)]
+        results = adjust_medicines(changes)
+    except (OSError, Error, RowRejected) as e:
+        print(f"Adjustment failed: {e}")
+        return 1
+
+    for result in results:
+        if result['status'] != 'updated':
+            print(f"{result['status'].upper():<10} {result['med_code']}: {result['reason']}")
+    print(summarize(results) + ".")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
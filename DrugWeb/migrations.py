@@ -0,0 +1,399 @@
+"""Numbered schema migrations for the DrugWeb database.
+
+Run once at deploy time, before starting the app:
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # show applied and pending migrations
+
+Request handlers never issue DDL; every schema change is added here as a new
+numbered migration and recorded in the schema_version table.
+
+Statements are written in MySQL and translated for SQLite by the storage
+layer. A step that only makes sense on one backend is given as a dict
+keyed by backend name; backends missing from the dict skip it. Steps that
+fail because they were already applied by hand (through the old
+/update_db and /fix_db pages) are skipped as well.
+"""
+import argparse
+import sys
+import db
+from db import Error, StorageError, db_connection
+
+MIGRATIONS = [
+    (1, 'Create base tables', [
+        """
+        CREATE TABLE IF NOT EXISTS user (
+            ID VARCHAR(10) PRIMARY KEY,
+            F_name VARCHAR(50) NOT NULL,
+            L_name VARCHAR(50) NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password VARCHAR(100) NOT NULL,
+            address TEXT,
+            phone VARCHAR(20)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS customer (
+            Customer_ID VARCHAR(10) PRIMARY KEY,
+            points INT DEFAULT 0,
+            FOREIGN KEY (Customer_ID) REFERENCES user(ID)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS admin (
+            Admin_ID VARCHAR(10) PRIMARY KEY,
+            FOREIGN KEY (Admin_ID) REFERENCES user(ID)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS deliveryman (
+            DeliveryMan_ID VARCHAR(10) PRIMARY KEY,
+            Name VARCHAR(100),
+            Phone VARCHAR(20),
+            Email VARCHAR(100),
+            Area VARCHAR(100),
+            FOREIGN KEY (DeliveryMan_ID) REFERENCES user(ID)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS medicine (
+            Med_Code VARCHAR(10) PRIMARY KEY,
+            Name VARCHAR(100) NOT NULL,
+            Generic_name VARCHAR(100),
+            Category VARCHAR(50),
+            Price DECIMAL(10,2) NOT NULL,
+            Stock INT DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS customer_review (
+            Review_ID INT AUTO_INCREMENT PRIMARY KEY,
+            Customer_ID VARCHAR(10),
+            review TEXT,
+            FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS customer_request (
+            Request_ID INT AUTO_INCREMENT PRIMARY KEY,
+            Customer_ID VARCHAR(10),
+            request_med_name VARCHAR(100),
+            Expected_date DATE,
+            Status VARCHAR(20) DEFAULT 'Pending',
+            FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS cart (
+            Cart_ID INT AUTO_INCREMENT PRIMARY KEY,
+            Customer_ID VARCHAR(10),
+            Med_Code VARCHAR(10),
+            Med_Name VARCHAR(100),
+            Quantity INT DEFAULT 1,
+            Price DECIMAL(10,2),
+            Added_Date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID),
+            FOREIGN KEY (Med_Code) REFERENCES medicine(Med_Code)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS payment (
+            payment_id VARCHAR(20) PRIMARY KEY,
+            Customer_ID VARCHAR(10),
+            amount DECIMAL(10,2) NOT NULL,
+            payment_type VARCHAR(50),
+            DeliveryMan_ID VARCHAR(10),
+            status VARCHAR(50) DEFAULT 'Assigned',
+            delivery_date DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (Customer_ID) REFERENCES customer(Customer_ID),
+            FOREIGN KEY (DeliveryMan_ID) REFERENCES deliveryman(DeliveryMan_ID)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS notifications (
+            notification_id INT AUTO_INCREMENT PRIMARY KEY,
+            customer_id VARCHAR(10),
+            message TEXT NOT NULL,
+            type VARCHAR(50) DEFAULT 'general',
+            is_read BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customer(Customer_ID)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS points_history (
+            history_id INT AUTO_INCREMENT PRIMARY KEY,
+            customer_id VARCHAR(10),
+            points_earned INT NOT NULL,
+            transaction_type VARCHAR(20) DEFAULT 'earned',
+            payment_id VARCHAR(20),
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customer(Customer_ID)
+        )
+        """
+    ]),
+    (2, 'Add medicine Category with sample categories', [
+        "ALTER TABLE medicine ADD COLUMN Category VARCHAR(50)",
+        "UPDATE medicine SET Category = 'Pain Relief' WHERE Category IS NULL AND (Name LIKE '%Paracetamol%' OR Name LIKE '%Aspirin%')",
+        "UPDATE medicine SET Category = 'Antibiotic' WHERE Category IS NULL AND (Name LIKE '%Amoxicillin%' OR Name LIKE '%Penicillin%')",
+        "UPDATE medicine SET Category = 'General' WHERE Category IS NULL"
+    ]),
+    (3, 'Add customer_request Request_ID and Status', [
+        {'mysql': "ALTER TABLE customer_request ADD COLUMN Request_ID INT AUTO_INCREMENT PRIMARY KEY FIRST"},
+        "ALTER TABLE customer_request ADD COLUMN Status VARCHAR(20) DEFAULT 'Pending'",
+        "UPDATE customer_request SET Status = 'Pending' WHERE Status IS NULL"
+    ]),
+    (4, 'Add payment delivery tracking columns', [
+        "ALTER TABLE payment ADD COLUMN status VARCHAR(50) DEFAULT 'Assigned'",
+        "ALTER TABLE payment ADD COLUMN delivery_date DATE",
+        {'mysql': "ALTER TABLE payment ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"}
+    ]),
+    (5, 'Add cart total_price', [
+        "ALTER TABLE cart ADD COLUMN total_price DECIMAL(10,2)",
+        "UPDATE cart SET total_price = Quantity * Price WHERE total_price IS NULL AND Price IS NOT NULL"
+    ]),
+    (6, 'Add indexes for the hot lookup queries', [
+        "CREATE INDEX idx_cart_customer_med ON cart (Customer_ID, Med_Code)",
+        "CREATE INDEX idx_notifications_customer_created ON notifications (customer_id, created_at)",
+        "CREATE INDEX idx_points_history_customer_created ON points_history (customer_id, created_at)",
+        "CREATE INDEX idx_request_customer_med ON customer_request (Customer_ID, request_med_name)",
+        "CREATE INDEX idx_payment_deliveryman_created ON payment (DeliveryMan_ID, created_at)",
+        "CREATE INDEX idx_medicine_category_price_name ON medicine (Category, Price, Name)",
+        "CREATE INDEX idx_medicine_name ON medicine (Name)",
+        "CREATE INDEX idx_medicine_price ON medicine (Price)"
+    ]),
+    (7, 'Index foreign key columns that SQLite does not index automatically', [
+        "CREATE INDEX idx_review_customer ON customer_review (Customer_ID)",
+        "CREATE INDEX idx_payment_customer ON payment (Customer_ID)",
+        "CREATE INDEX idx_cart_med ON cart (Med_Code)"
+    ]),
+    (8, 'Add FULLTEXT indexes for medicine search', [
+        {'mysql': "CREATE FULLTEXT INDEX ft_medicine_name_generic ON medicine (Name, Generic_name)"},
+        {'mysql': "CREATE FULLTEXT INDEX ft_medicine_search ON medicine (Name, Generic_name, Category)"}
+    ]),
+    (9, 'Add keyset pagination indexes on (sort column, Med_Code)', [
+        "CREATE INDEX idx_medicine_name_code ON medicine (Name, Med_Code)",
+        "CREATE INDEX idx_medicine_price_code ON medicine (Price, Med_Code)",
+        "CREATE INDEX idx_medicine_category_name_code ON medicine (Category, Name, Med_Code)",
+        "CREATE INDEX idx_medicine_category_price_code ON medicine (Category, Price, Med_Code)",
+        # Prefixes of the indexes above, so they only slow down writes now
+        {'mysql': "DROP INDEX idx_medicine_name ON medicine",
+         'sqlite': "DROP INDEX idx_medicine_name"},
+        {'mysql': "DROP INDEX idx_medicine_price ON medicine",
+         'sqlite': "DROP INDEX idx_medicine_price"},
+        # Category and price filters and orders are served by (Category, Price, Med_Code)
+        {'mysql': "DROP INDEX idx_medicine_category_price_name ON medicine",
+         'sqlite': "DROP INDEX idx_medicine_category_price_name"}
+    ]),
+    (10, 'Merge duplicate cart rows and make (Customer_ID, Med_Code) unique', [
+        # The surviving row is the oldest one for each customer and medicine
+        {'mysql': """
+            UPDATE cart c
+            JOIN (
+                SELECT MIN(Cart_ID) AS keep_id, SUM(quantity) AS quantity, SUM(total_price) AS total_price
+                FROM cart GROUP BY Customer_ID, Med_Code HAVING COUNT(*) > 1
+            ) d ON c.Cart_ID = d.keep_id
+            SET c.quantity = d.quantity, c.total_price = d.total_price
+        """,
+         'sqlite': """
+            UPDATE cart SET
+                quantity = (SELECT SUM(d.quantity) FROM cart d
+                            WHERE d.Customer_ID = cart.Customer_ID AND d.Med_Code = cart.Med_Code),
+                total_price = (SELECT SUM(d.total_price) FROM cart d
+                               WHERE d.Customer_ID = cart.Customer_ID AND d.Med_Code = cart.Med_Code)
+            WHERE Cart_ID IN (SELECT MIN(Cart_ID) FROM cart GROUP BY Customer_ID, Med_Code HAVING COUNT(*) > 1)
+        """},
+        {'mysql': """
+            DELETE c FROM cart c
+            JOIN cart k ON k.Customer_ID = c.Customer_ID AND k.Med_Code = c.Med_Code AND k.Cart_ID < c.Cart_ID
+        """,
+         'sqlite': "DELETE FROM cart WHERE Cart_ID NOT IN (SELECT MIN(Cart_ID) FROM cart GROUP BY Customer_ID, Med_Code)"},
+        "CREATE UNIQUE INDEX uq_cart_customer_med ON cart (Customer_ID, Med_Code)",
+        # Same columns as the unique key, so it only slows down writes now
+        {'mysql': "DROP INDEX idx_cart_customer_med ON cart",
+         'sqlite': "DROP INDEX idx_cart_customer_med"}
+    ]),
+    (11, 'Add the checkout_key table for idempotent checkout', [
+        """
+        CREATE TABLE IF NOT EXISTS checkout_key (
+            Customer_ID VARCHAR(10) NOT NULL,
+            idem_key VARCHAR(64) NOT NULL,
+            payment_id VARCHAR(20) NOT NULL,
+            expires_at BIGINT NOT NULL,
+            PRIMARY KEY (Customer_ID, idem_key)
+        )
+        """,
+        "CREATE INDEX idx_checkout_key_expires ON checkout_key (expires_at)"
+    ]),
+    (12, 'Add the id_sequence table and the payment worker sequence', [
+        """
+        CREATE TABLE IF NOT EXISTS id_sequence (
+            name VARCHAR(32) PRIMARY KEY,
+            next_value BIGINT NOT NULL
+        )
+        """,
+        "INSERT IGNORE INTO id_sequence (name, next_value) VALUES ('payment_worker', 0)"
+    ]),
+    (13, 'Start the customer ID sequence after the highest existing CM number', [
+        {'mysql': """
+            INSERT IGNORE INTO id_sequence (name, next_value)
+            SELECT 'customer', COALESCE(MAX(CAST(SUBSTRING(Customer_ID, 3) AS UNSIGNED)), 0) + 1
+            FROM customer WHERE Customer_ID LIKE 'CM%'
+        """,
+         'sqlite': """
+            INSERT IGNORE INTO id_sequence (name, next_value)
+            SELECT 'customer', COALESCE(MAX(CAST(SUBSTR(Customer_ID, 3) AS INTEGER)), 0) + 1
+            FROM customer WHERE Customer_ID LIKE 'CM%'
+        """}
+    ]),
+    (14, 'Add the outbox table for work that follows a checkout', [
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            event_id INT AUTO_INCREMENT PRIMARY KEY,
+            event_type VARCHAR(50) NOT NULL,
+            payload TEXT NOT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            available_at BIGINT NOT NULL,
+            claim_token VARCHAR(32),
+            claimed_until BIGINT NOT NULL DEFAULT 0,
+            last_error VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX idx_outbox_status_available ON outbox (status, available_at)",
+        "CREATE INDEX idx_outbox_claim ON outbox (claim_token)"
+    ]),
+    (15, 'Add the payment_item table for order lines', [
+        """
+        CREATE TABLE IF NOT EXISTS payment_item (
+            item_id INT AUTO_INCREMENT PRIMARY KEY,
+            payment_id VARCHAR(20) NOT NULL,
+            Med_Code VARCHAR(10) NOT NULL,
+            quantity INT NOT NULL,
+            unit_price DECIMAL(10,2) NOT NULL,
+            total_price DECIMAL(10,2) NOT NULL,
+            FOREIGN KEY (payment_id) REFERENCES payment(payment_id),
+            FOREIGN KEY (Med_Code) REFERENCES medicine(Med_Code)
+        )
+        """,
+        # An order's lines, and sales of one medicine, are each one index range
+        "CREATE UNIQUE INDEX uq_payment_item_payment_med ON payment_item (payment_id, Med_Code)",
+        "CREATE INDEX idx_payment_item_med ON payment_item (Med_Code, payment_id)"
+    ]),
+    (16, 'Add the id_worker table for leased payment worker numbers', [
+        """
+        CREATE TABLE IF NOT EXISTS id_worker (
+            worker INTEGER PRIMARY KEY,
+            owner VARCHAR(32),
+            expires_at BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        # A free number is any row whose lease has run out
+        "CREATE INDEX idx_id_worker_expires ON id_worker (expires_at)"
+    ])
+]
+
+
+def ensure_version_table(cursor):
+    """Create the schema_version bookkeeping table"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    """Return the set of migration numbers already applied"""
+    cursor.execute("SELECT version FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending_migrations(cursor):
+    """Return the migrations not yet recorded in schema_version, in order"""
+    done = applied_versions(cursor)
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def apply_migration(connection, cursor, migration):
+    """Run one migration's statements and record it"""
+    version, description, statements = migration
+    for statement in statements:
+        if isinstance(statement, dict):
+            statement = statement.get(db.backend.name)
+            if statement is None:
+                continue
+        try:
+            cursor.execute(statement)
+        except Error as e:
+            if not db.backend.is_already_applied(e):
+                raise
+            print(f"  skipped (already applied): {e}")
+    cursor.execute(
+        "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+        (version, description)
+    )
+    connection.commit()
+
+
+def run_migrations():
+    """Apply every pending migration; returns the number applied"""
+    db.backend.ensure_database()
+    with db_connection() as connection:
+        if not connection:
+            raise StorageError("Database connection failed")
+        cursor = connection.cursor()
+        try:
+            db.backend.acquire_migration_lock(cursor)
+            try:
+                ensure_version_table(cursor)
+                pending = pending_migrations(cursor)
+                for migration in pending:
+                    print(f"Applying migration {migration[0]}: {migration[1]}")
+                    apply_migration(connection, cursor, migration)
+                return len(pending)
+            finally:
+                db.backend.release_migration_lock(cursor)
+        finally:
+            cursor.close()
+
+
+def show_status():
+    """Print applied and pending migrations"""
+    db.backend.ensure_database()
+    with db_connection() as connection:
+        if not connection:
+            raise StorageError("Database connection failed")
+        cursor = connection.cursor()
+        ensure_version_table(cursor)
+        done = applied_versions(cursor)
+        cursor.close()
+    for version, description, _ in MIGRATIONS:
+        state = 'applied' if version in done else 'pending'
+        print(f"{version:>4}  {state:<8} {description}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply DrugWeb database migrations')
+    parser.add_argument('--status', action='store_true', help='list applied and pending migrations')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.status:
+            show_status()
+        else:
+            count = run_migrations()
+            print(f"Database is up to date ({count} migration(s) applied).")
+    except Error as e:
+        print(f"Migration failed: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""Durable outbox for work that follows a checkout.
+
+Checkout writes the payment, clears the cart and adds one outbox row
+describing the purchase, all in the same transaction, so a committed
+payment always has its follow-up work recorded and a rolled-back one
+never does. Awarding points, the points_history entry and the customer's
+order notification are then done by the handlers in HANDLERS, off the
+request path. Further consumers (analytics, emails) register a handler
+for the event type they care about.
+
+A dispatcher thread claims up to `batch_size` due rows at a time by
+writing a claim token and a `lease` deadline on them, and hands them to a
+pool of `workers` threads. Each event runs in its own transaction that
+also deletes the row, and only while the claim is still ours, so a
+handler's writes happen once even with several processes draining the
+table. A failed event is retried after `retry_base` seconds, doubling
+with each attempt, and is marked 'failed' after `max_attempts`; rows a
+crashed process had claimed are picked up again once their lease ends.
+
+app.py starts the dispatcher on the first request, so events left
+pending, waiting for a retry or claimed by a process that died are
+delivered without waiting for a new checkout; notify() wakes it as soon
+as a checkout commits. While the outbox table does not exist (migrations
+not run yet) the dispatcher stops polling until notify() wakes it.
+`python outbox.py` drains whatever is due and exits.
+"""
+import atexit
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import conditional
+import db
+import queries
+from db import Error, StorageError, db_connection
+
+OUTBOX_CONFIG = {
+    'workers': 4,          # threads running handlers
+    'batch_size': 50,      # events claimed per round trip
+    'poll_interval': 1.0,  # seconds between polls when nothing wakes the dispatcher
+    'lease': 60,           # seconds a claim lasts before another worker may take the event
+    'max_attempts': 8,     # tries before an event is marked 'failed'
+    'retry_base': 2.0,     # seconds before the first retry; doubles per attempt
+    'retry_max': 300       # longest wait between retries
+}
+
+
+def enqueue(cursor, event_type, payload):
+    """Record an event inside the caller's transaction; call notify() after the commit"""
+    cursor.execute("""
+        INSERT INTO outbox (event_type, payload, available_at)
+        VALUES (%s, %s, %s)
+    """, (event_type, json.dumps(payload), int(time.time())))
+
+
+def payment_completed(cursor, payload):
+    """Award the purchase points, log them and tell the customer the order is placed"""
+    customer_id = payload['customer_id']
+    points = payload['points']
+    if points > 0:
+        cursor.execute(queries.AWARD_POINTS, (points, customer_id))
+        cursor.execute("""
+            INSERT INTO points_history (customer_id, points_earned, transaction_type, payment_id, description, created_at)
+            VALUES (%s, %s, 'earned', %s, %s, NOW())
+        """, (customer_id, points, payload['payment_id'],
+              f"Purchase reward: {points} points for ৳{payload['amount']} purchase"))
+    cursor.execute("""
+        INSERT INTO notifications (customer_id, message, type, created_at)
+        VALUES (%s, %s, 'order_placed', NOW())
+    """, (customer_id, f"Your order (Payment #{payload['payment_id']}) for ৳{payload['amount']:.2f} has been placed."))
+
+    def committed():
+        if points > 0:
+            conditional.bump('points', customer_id)
+        conditional.bump('notifications', customer_id)
+    return committed
+
+
+def claim_query(token, claimed_until, event_ids, now):
+    """SQL and params that claim the events whose lease has run out"""
+    sql = f"""
+        UPDATE outbox SET claim_token = %s, claimed_until = %s
+        WHERE event_id IN ({', '.join(['%s'] * len(event_ids))}) AND claimed_until <= %s
+    """
+    return sql, [token, claimed_until] + list(event_ids) + [now]
+
+
+# event_type -> handler(cursor, payload); a handler may return a function to run after its commit
+HANDLERS = {
+    'payment_completed': payment_completed
+}
+
+
+class Outbox:
+    """Claims due outbox rows in batches and runs their handlers on a thread pool"""
+
+    def __init__(self, workers=4, batch_size=50, poll_interval=1.0, lease=60,
+                 max_attempts=8, retry_base=2.0, retry_max=300):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._pool = None
+        self._thread = None
+        self._stats = {'batches': 0, 'processed': 0, 'retried': 0, 'failed': 0, 'lost_claims': 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def start(self):
+        """Start the dispatcher and worker pool (once)"""
+        if self._thread:
+            return
+        with self._lock:
+            if self._thread:
+                return
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='outbox-worker')
+            self._thread = threading.Thread(target=self._dispatch_loop, name='outbox-dispatcher', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def notify(self):
+        """Wake the dispatcher after committing new events"""
+        self.start()
+        self._wake.set()
+
+    def claim(self):
+        """Claim a batch of due events; returns (token, [(event_id, event_type, payload, attempts)])"""
+        token = uuid.uuid4().hex
+        now = int(time.time())
+        with db_connection() as connection:
+            if not connection:
+                raise StorageError("Database connection failed")
+            cursor = connection.cursor()
+            try:
+                cursor.execute(queries.OUTBOX_DUE, (now, now, self.batch_size))
+                event_ids = [row[0] for row in cursor.fetchall()]
+                if not event_ids:
+                    connection.commit()
+                    return token, []
+                # Rows another worker claimed since the SELECT no longer match
+                cursor.execute(*claim_query(token, now + self.lease, event_ids, now))
+                cursor.execute(queries.OUTBOX_CLAIMED, (token,))
+                events = cursor.fetchall()
+                connection.commit()
+            except Error:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        return token, events
+
+    def process(self, token, event):
+        """Run one event's handler and delete the event in one transaction"""
+        event_id, event_type, payload, attempts = event
+        with db_connection() as connection:
+            if not connection:
+                raise StorageError("Database connection failed")
+            cursor = connection.cursor()
+            try:
+                handler = HANDLERS.get(event_type)
+                if handler is None:
+                    raise StorageError(f"No outbox handler for {event_type}")
+                committed = handler(cursor, json.loads(payload))
+                cursor.execute(queries.OUTBOX_DONE, (event_id, token))
+                if cursor.rowcount != 1:
+                    # The lease ran out and another worker owns the event now
+                    connection.rollback()
+                    self._count('lost_claims')
+                    return
+                connection.commit()
+                self._count('processed')
+                if committed:
+                    committed()
+            except Exception as e:
+                connection.rollback()
+                print(f"Error handling outbox event {event_id} ({event_type}): {e}")
+                self._retry(cursor, connection, token, event_id, attempts + 1, e)
+            finally:
+                cursor.close()
+
+    def _retry(self, cursor, connection, token, event_id, attempts, error):
+        """Record a failed attempt and schedule the next one, or give up"""
+        failed = attempts >= self.max_attempts
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        try:
+            cursor.execute(queries.OUTBOX_RETRY, ('failed' if failed else 'pending', attempts, int(time.time() + delay),
+                                                  str(error)[:255], event_id, token))
+            connection.commit()
+        except Error as e:
+            connection.rollback()
+            print(f"Error rescheduling outbox event {event_id}: {e}")  # the lease expires and it runs again
+            return
+        self._count('failed' if failed else 'retried')
+
+    def drain(self):
+        """Process one claimed batch; returns how many events it held"""
+        token, events = self.claim()
+        if events:
+            pool = self._pool or ThreadPoolExecutor(max_workers=self.workers)
+            try:
+                list(pool.map(lambda event: self.process(token, event), events))
+            finally:
+                if pool is not self._pool:
+                    pool.shutdown()
+            self._count('batches')
+        return len(events)
+
+    def _dispatch_loop(self):
+        while not self._stopped.is_set():
+            timeout = self.poll_interval
+            try:
+                if self.drain() == self.batch_size:
+                    continue  # more may be waiting
+            except Exception as e:
+                if isinstance(e, Error) and db.backend.is_missing_table(e):
+                    print("Outbox table not found; run `python migrations.py`. Waiting for the next checkout.")
+                    timeout = None
+                else:
+                    print(f"Error in outbox dispatcher: {e}")
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def close(self):
+        """Stop the dispatcher; events already handed to workers finish first"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self.lease)
+        if self._pool:
+            self._pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+outbox = Outbox(**OUTBOX_CONFIG)
+
+
+def notify():
+    outbox.notify()
+
+
+if __name__ == '__main__':
+    total = 0
+    while True:
+        handled = outbox.drain()
+        total += handled
+        if handled < outbox.batch_size:
+            break
+    print(f"Handled {total} outbox event(s).")
@@ -0,0 +1,265 @@
+"""SQL run on the request path and by the background workers.
+
+Handlers and modules execute these constants, and query_plans.py EXPLAINs
+the same constants, so the plan check always sees the SQL that actually
+runs. query_plans.py fails if a constant here is not registered in its
+HOT_QUERIES. Statements assembled at run time (IN lists, CASE updates,
+keyset pages, FULLTEXT searches) are built by functions in their own
+modules, which query_plans.py calls instead.
+"""
+
+# app.py
+LOGIN_USER = "SELECT * FROM user WHERE email = %s AND password = %s"
+ADMIN_BY_ID = "SELECT * FROM admin WHERE Admin_ID = %s"
+DELIVERYMAN_BY_ID = "SELECT * FROM deliveryman WHERE DeliveryMan_ID = %s"
+CUSTOMER_BY_ID = "SELECT * FROM customer WHERE Customer_ID = %s"
+USER_BY_EMAIL = "SELECT * FROM user WHERE email = %s"
+CUSTOMER_ID_FLOOR = "UPDATE id_sequence SET next_value = 2 WHERE name = 'customer' AND next_value < 2"
+
+# customer.py
+CUSTOMER_POINTS = "SELECT points FROM customer WHERE Customer_ID = %s"
+NOTIFICATIONS = """
+    SELECT notification_id, message, type, is_read, created_at
+    FROM notifications
+    WHERE customer_id = %s
+    ORDER BY created_at DESC
+"""
+MARK_NOTIFICATIONS_READ = "UPDATE notifications SET is_read = TRUE WHERE customer_id = %s"
+POINTS_HISTORY = """
+    SELECT points_earned, transaction_type, payment_id, description, created_at
+    FROM points_history
+    WHERE customer_id = %s
+    ORDER BY created_at DESC
+"""
+RECENT_NOTIFICATIONS = """
+    SELECT Notification_ID, Message, Type, Created_at, Is_read
+    FROM notifications
+    WHERE Customer_ID = %s
+    ORDER BY Created_at DESC
+    LIMIT 10
+"""
+MARK_RECENT_NOTIFICATIONS_READ = """
+    UPDATE notifications
+    SET Is_read = 1
+    WHERE Customer_ID = %s AND Is_read = 0
+"""
+REVIEWS = """
+    SELECT cr.review, u.F_name, u.L_name, cr.Customer_ID
+    FROM customer_review cr
+    JOIN user u ON cr.Customer_ID = u.ID
+    ORDER BY cr.Customer_ID DESC
+"""
+CUSTOMER_REQUESTS = """
+    SELECT request_med_name, Expected_date,
+           IFNULL(Status, 'Pending') as Status
+    FROM customer_request
+    WHERE Customer_ID = %s
+    ORDER BY request_med_name DESC
+"""
+RECENT_REQUESTS = """
+    SELECT request_med_name, Expected_date,
+           IFNULL(Status, 'Pending') as Status
+    FROM customer_request
+    WHERE Customer_ID = %s
+    ORDER BY request_med_name DESC
+    LIMIT 5
+"""
+UPDATE_PROFILE = """
+    UPDATE user SET F_name = %s, L_name = %s, email = %s,
+    phone = %s, address = %s WHERE ID = %s
+"""
+USER_BY_ID = "SELECT * FROM user WHERE ID = %s"
+RECENT_REVIEWS = """
+    SELECT review
+    FROM customer_review
+    WHERE Customer_ID = %s
+    ORDER BY Customer_ID DESC
+    LIMIT 3
+"""
+CHECKOUT_CART_LINES = """
+    SELECT c.Med_Code, c.quantity
+    FROM cart c
+    WHERE c.Customer_ID = %s
+    FOR UPDATE
+"""
+CHECKOUT_TOTAL = """
+    SELECT SUM(c.quantity * m.Price)
+    FROM cart c
+    JOIN medicine m ON m.Med_Code = c.Med_Code
+    WHERE c.Customer_ID = %s
+"""
+CHECKOUT_PAYMENT_ITEMS = """
+    INSERT INTO payment_item (payment_id, Med_Code, quantity, unit_price, total_price)
+    SELECT %s, c.Med_Code, c.quantity, m.Price, c.quantity * m.Price
+    FROM cart c
+    JOIN medicine m ON m.Med_Code = c.Med_Code
+    WHERE c.Customer_ID = %s
+"""
+
+# admin.py
+ADMIN_PAYMENTS = """
+    SELECT p.payment_id, p.Customer_ID, p.amount, p.payment_type, p.DeliveryMan_ID,
+           CONCAT(u.F_name, ' ', u.L_name) as customer_name, u.phone as customer_phone, u.address as customer_address
+    FROM payment p
+    JOIN customer c ON p.Customer_ID = c.Customer_ID
+    JOIN user u ON c.Customer_ID = u.ID
+    ORDER BY p.created_at DESC, p.payment_id DESC
+"""
+PAYMENT_DELIVERYMAN = """
+    SELECT CONCAT(u.F_name, ' ', u.L_name) as Name, u.phone as Phone
+    FROM deliveryman d
+    JOIN user u ON d.DeliveryMan_ID = u.ID
+    WHERE d.DeliveryMan_ID = %s
+"""
+DELIVERYMEN_BY_NAME = """
+    SELECT d.DeliveryMan_ID, CONCAT(u.F_name, ' ', u.L_name) as Name, u.phone as Phone
+    FROM deliveryman d
+    JOIN user u ON d.DeliveryMan_ID = u.ID
+    ORDER BY u.F_name, u.L_name
+"""
+ASSIGN_DELIVERYMAN = """
+    UPDATE payment
+    SET DeliveryMan_ID = %s
+    WHERE payment_id = %s
+"""
+DELIVERYMAN_NAME = "SELECT Name FROM deliveryman WHERE DeliveryMan_ID = %s"
+ADMIN_MEDICINES = "SELECT * FROM medicine ORDER BY Med_Code"
+ADMIN_REVIEWS = """
+    SELECT cr.*, CONCAT(u.F_name, ' ', u.L_name) as customer_name
+    FROM customer_review cr
+    JOIN customer c ON cr.Customer_ID = c.Customer_ID
+    JOIN user u ON c.Customer_ID = u.ID
+"""
+ADMIN_REQUESTS = """
+    SELECT cmr.Customer_ID, cmr.request_med_name, cmr.Expected_date,
+           IFNULL(cmr.Status, 'Pending') as Status,
+           CONCAT(u.F_name, ' ', u.L_name) as customer_name
+    FROM customer_request cmr
+    JOIN customer c ON cmr.Customer_ID = c.Customer_ID
+    JOIN user u ON c.Customer_ID = u.ID
+    ORDER BY cmr.request_med_name
+"""
+ADMIN_PROFILE = """
+    SELECT u.F_name, u.L_name, u.email, u.phone, u.address,
+           a.Admin_ID
+    FROM user u
+    JOIN admin a ON u.ID = a.Admin_ID
+    WHERE u.ID = %s
+"""
+REQUEST_LOOKUP = """
+    SELECT Customer_ID, request_med_name
+    FROM customer_request
+    WHERE Customer_ID = %s AND request_med_name = %s
+    LIMIT 1
+"""
+ACCEPT_REQUEST = """
+    UPDATE customer_request
+    SET Status = 'Accepted'
+    WHERE Customer_ID = %s AND request_med_name = %s
+"""
+DECLINE_REQUEST = """
+    UPDATE customer_request
+    SET Status = 'Declined'
+    WHERE Customer_ID = %s AND request_med_name = %s
+"""
+DELIVERYMEN = """
+    SELECT d.DeliveryMan_ID, CONCAT(u.F_name, ' ', u.L_name) as name
+    FROM deliveryman d
+    JOIN user u ON d.DeliveryMan_ID = u.ID
+"""
+PAYMENT_ITEMS = """
+    SELECT pi.Med_Code, m.Name, pi.quantity, pi.unit_price, pi.total_price
+    FROM payment_item pi
+    JOIN medicine m ON m.Med_Code = pi.Med_Code
+    WHERE pi.payment_id = %s
+    ORDER BY pi.Med_Code
+"""
+
+# deliveryman.py
+ASSIGNED_PAYMENTS = """
+    SELECT p.payment_id as Payment_ID, p.Customer_ID, p.amount as Total_Amount,
+           p.payment_type, p.DeliveryMan_ID,
+           CONCAT(u.F_name, ' ', u.L_name) as Customer_name,
+           u.email as Customer_email, u.phone as Customer_phone,
+           u.address as Customer_address,
+           COALESCE(p.status, 'Assigned') as Status,
+           p.created_at as Payment_date, p.delivery_date
+    FROM payment p
+    JOIN customer c ON p.Customer_ID = c.Customer_ID
+    JOIN user u ON c.Customer_ID = u.ID
+    WHERE p.DeliveryMan_ID = %s
+    ORDER BY p.created_at DESC
+"""
+DELIVERY_PAYMENT = """
+    SELECT p.*, CONCAT(u.F_name, ' ', u.L_name) as customer_name,
+           u.email as customer_email
+    FROM payment p
+    JOIN customer c ON p.Customer_ID = c.Customer_ID
+    JOIN user u ON c.Customer_ID = u.ID
+    WHERE p.payment_id = %s AND p.DeliveryMan_ID = %s
+"""
+ACCEPT_DELIVERY = """
+    UPDATE payment
+    SET status = 'Accepted for Delivery', delivery_date = %s
+    WHERE payment_id = %s
+"""
+RELEASE_DELIVERY = """
+    UPDATE payment
+    SET DeliveryMan_ID = NULL, status = 'Pending Assignment'
+    WHERE payment_id = %s
+"""
+DELIVERYMAN_PROFILE = """
+    SELECT u.F_name, u.L_name, u.email, u.phone, u.address,
+           d.DeliveryMan_ID
+    FROM user u
+    JOIN deliveryman d ON u.ID = d.DeliveryMan_ID
+    WHERE u.ID = %s
+"""
+
+# catalog.py: rows behind the in-process indexes, and single medicines
+FACET_ROWS = "SELECT Med_Code, Category, Price FROM medicine"
+NAME_ROWS = "SELECT Med_Code, Name, Generic_name FROM medicine"
+SEARCH_ROWS = "SELECT * FROM medicine"
+MEDICINE_BY_CODE = "SELECT * FROM medicine WHERE Med_Code = %s"
+
+# cart_store.py
+CART_LINES = "SELECT Med_Code, quantity FROM cart WHERE Customer_ID = %s ORDER BY Cart_ID"
+CART_LINE_DELETE = "DELETE FROM cart WHERE Customer_ID = %s AND Med_Code = %s"
+CLEAR_CART = "DELETE FROM cart WHERE Customer_ID = %s"
+
+# idempotency.py
+CHECKOUT_KEY_LOOKUP = """
+    SELECT payment_id FROM checkout_key
+    WHERE Customer_ID = %s AND idem_key = %s AND expires_at > %s
+"""
+CHECKOUT_KEY_SWEEP = "DELETE FROM checkout_key WHERE expires_at <= %s"
+CHECKOUT_KEY_EXPIRE = "DELETE FROM checkout_key WHERE Customer_ID = %s AND idem_key = %s AND expires_at <= %s"
+
+# ids.py
+WORKER_FREE = "SELECT worker FROM id_worker WHERE expires_at <= %s LIMIT 1"
+WORKER_TAKE = "UPDATE id_worker SET owner = %s, expires_at = %s WHERE worker = %s AND expires_at <= %s"
+WORKER_LAST = "SELECT MAX(worker) FROM id_worker"
+WORKER_ADD = "INSERT IGNORE INTO id_worker (worker, owner, expires_at) VALUES (%s, %s, %s)"
+WORKER_RENEW = "UPDATE id_worker SET expires_at = %s WHERE worker = %s AND owner = %s"
+WORKER_RELEASE = "UPDATE id_worker SET owner = NULL, expires_at = %s WHERE worker = %s AND owner = %s"
+
+# outbox.py
+OUTBOX_DUE = """
+    SELECT event_id FROM outbox
+    WHERE status = 'pending' AND available_at <= %s AND claimed_until <= %s
+    ORDER BY available_at
+    LIMIT %s
+"""
+OUTBOX_CLAIMED = "SELECT event_id, event_type, payload, attempts FROM outbox WHERE claim_token = %s"
+OUTBOX_DONE = "DELETE FROM outbox WHERE event_id = %s AND claim_token = %s"
+OUTBOX_RETRY = """
+    UPDATE outbox
+    SET status = %s, attempts = %s, available_at = %s, claim_token = NULL, claimed_until = 0,
+        last_error = %s
+    WHERE event_id = %s AND claim_token = %s
+"""
+AWARD_POINTS = """
+    UPDATE customer
+    SET points = points + %s
+    WHERE Customer_ID = %s
+"""
@@ -0,0 +1,208 @@
+"""Query-plan regression check for the queries the blueprints run.
+
+Runs EXPLAIN on every registered query against a migrated database and
+fails when a table is read with a full scan:
+
+    python query_plans.py
+    DRUGWEB_DB_BACKEND=sqlite python query_plans.py   # no MySQL server needed
+
+Exits with status 1 if any query regressed, so it can gate CI after
+`python migrations.py`. Whole-table listings (admin pages, full review
+list) are registered with the tables they are expected to scan.
+"""
+import sys
+import cart_store
+import catalog
+import catalog_import
+import db
+import exports
+import inventory
+import outbox
+import queries
+import reservations
+import search
+from db import Error, db_connection
+from storage import MySQLBackend, SQLiteBackend
+
+
+def _built(name, query, allowed=(), backend=None):
+    """A HOT_QUERIES entry for SQL assembled by a builder function"""
+    sql, params = query
+    return name, {backend: sql} if backend else sql, params, allowed
+
+
+# (name, sql, params, tables allowed to be scanned); sql given as a dict
+# keyed by backend name applies only to those backends
+HOT_QUERIES = [
+    # app.py
+    ('login', queries.LOGIN_USER, ('customer@test.com', 'x'), ()),
+    ('login_admin', queries.ADMIN_BY_ID, ('AD001',), ()),
+    ('login_deliveryman', queries.DELIVERYMAN_BY_ID, ('DM001',), ()),
+    ('login_customer', queries.CUSTOMER_BY_ID, ('CM001',), ()),
+    ('signup_email', queries.USER_BY_EMAIL, ('customer@test.com',), ()),
+    ('customer_id_floor', queries.CUSTOMER_ID_FLOOR, (), ()),
+
+    # customer.py
+    ('customer_points', queries.CUSTOMER_POINTS, ('CM001',), ()),
+    _built('dashboard_medicines', catalog.list_query('', 'name', 9)),
+    # SQLite searches the in-process index instead
+    _built('search_fulltext', search.fulltext_query('para', 'Pain Relief'), backend='mysql'),
+    _built('browse_first_page', catalog.seek_query('', 'price_desc', None, True, 12)),
+    _built('browse_seek_page', catalog.seek_query('', 'name', ('Paracetamol', 'MED001'), True, 12)),
+    _built('browse_seek_back', catalog.seek_query('', 'name', ('Paracetamol', 'MED001'), False, 12)),
+    _built('browse_category_seek_page', catalog.seek_query('Pain Relief', 'price_desc', (5, 'MED001'), True, 12)),
+    _built('browse_price_seek_page', catalog.seek_query('', 'price', (12, 'MED001'), True, 12, (10, 50))),
+    ('browse_facets', queries.FACET_ROWS, (), ('medicine',)),
+    ('suggest_index', queries.NAME_ROWS, (), ('medicine',)),
+    ('search_index', queries.SEARCH_ROWS, (), ('medicine',)),
+    ('medicine', queries.MEDICINE_BY_CODE, ('MED001',), ()),
+    ('notifications', queries.NOTIFICATIONS, ('CM001',), ()),
+    ('notifications_mark_read', queries.MARK_NOTIFICATIONS_READ, ('CM001',), ()),
+    ('get_notifications', queries.RECENT_NOTIFICATIONS, ('CM001',), ()),
+    ('get_notifications_mark_read', queries.MARK_RECENT_NOTIFICATIONS_READ, ('CM001',), ()),
+    ('points_history', queries.POINTS_HISTORY, ('CM001',), ()),
+    ('reviews', queries.REVIEWS, (), ('cr',)),
+    ('customer_requests', queries.CUSTOMER_REQUESTS, ('CM001',), ()),
+    ('profile_user', queries.USER_BY_ID, ('CM001',), ()),
+    ('profile_update', queries.UPDATE_PROFILE, ('A', 'B', 'a@b.c', '1', 'x', 'CM001'), ()),
+    ('profile_requests', queries.RECENT_REQUESTS, ('CM001',), ()),
+    ('profile_reviews', queries.RECENT_REVIEWS, ('CM001',), ()),
+    ('checkout_cart_lines', queries.CHECKOUT_CART_LINES, ('CM001',), ()),
+    _built('checkout_take_stock', reservations.take_stock_query({'MED001': 2, 'MED002': 1})),
+    _built('checkout_shortages', reservations.stock_query(['MED001', 'MED002'])),
+    ('checkout_total', queries.CHECKOUT_TOTAL, ('CM001',), ()),
+    ('checkout_payment_items', queries.CHECKOUT_PAYMENT_ITEMS, ('PAY000001', 'CM001'), ()),
+
+    # cart_store.py
+    ('cart_load', queries.CART_LINES, ('CM001',), ()),
+    ('cart_flush_delete', queries.CART_LINE_DELETE, ('CM001', 'MED001'), ()),
+    ('cart_recover_clear', queries.CLEAR_CART, ('CM001',), ()),
+    _built('cart_recover_paid', cart_store.paid_query(['PAY000001', 'PAY000002'])),
+
+    # idempotency.py
+    ('checkout_key_lookup', queries.CHECKOUT_KEY_LOOKUP, ('CM001', 'k', 0), ()),
+    ('checkout_key_sweep', queries.CHECKOUT_KEY_SWEEP, (0,), ()),
+    ('checkout_key_expire', queries.CHECKOUT_KEY_EXPIRE, ('CM001', 'k', 0), ()),
+
+    # ids.py
+    ('id_worker_free', queries.WORKER_FREE, (0,), ()),
+    ('id_worker_take', queries.WORKER_TAKE, ('o', 60, 1, 0), ()),
+    ('id_worker_last', queries.WORKER_LAST, (), ()),
+    ('id_worker_add', queries.WORKER_ADD, (1, 'o', 60), ()),
+    ('id_worker_renew', queries.WORKER_RENEW, (60, 1, 'o'), ()),
+    ('id_worker_release', queries.WORKER_RELEASE, (0, 1, 'o'), ()),
+    ('customer_id_block', {'mysql': MySQLBackend.reserve_sql, 'sqlite': SQLiteBackend.reserve_sql},
+     (20, 'customer'), ()),
+
+    # outbox.py
+    ('outbox_due', queries.OUTBOX_DUE, (0, 0, 50), ()),
+    _built('outbox_claim', outbox.claim_query('t', 60, [1, 2], 0)),
+    ('outbox_claimed', queries.OUTBOX_CLAIMED, ('t',), ()),
+    ('outbox_done', queries.OUTBOX_DONE, (1, 't'), ()),
+    ('outbox_retry', queries.OUTBOX_RETRY, ('pending', 1, 0, 'e', 1, 't'), ()),
+    ('outbox_award_points', queries.AWARD_POINTS, (10, 'CM001'), ()),
+
+    # admin.py
+    ('admin_payments', queries.ADMIN_PAYMENTS, (), ('p',)),
+    ('admin_payment_deliveryman', queries.PAYMENT_DELIVERYMAN, ('DM001',), ()),
+    ('admin_deliverymen_by_name', queries.DELIVERYMEN_BY_NAME, (), ('d', 'u')),
+    ('admin_assign_deliveryman', queries.ASSIGN_DELIVERYMAN, ('DM001', '1001'), ()),
+    ('admin_deliveryman_name', queries.DELIVERYMAN_NAME, ('DM001',), ()),
+    ('admin_medicines', queries.ADMIN_MEDICINES, (), ('medicine',)),
+    ('admin_reviews', queries.ADMIN_REVIEWS, (), ('cr',)),
+    ('admin_requests', queries.ADMIN_REQUESTS, (), ('cmr',)),
+    ('admin_profile', queries.ADMIN_PROFILE, ('AD001',), ()),
+    ('admin_request_lookup', queries.REQUEST_LOOKUP, ('CM001', 'Paracetamol'), ()),
+    ('admin_accept_request', queries.ACCEPT_REQUEST, ('CM001', 'Paracetamol'), ()),
+    ('admin_decline_request', queries.DECLINE_REQUEST, ('CM001', 'Paracetamol'), ()),
+    ('admin_deliverymen', queries.DELIVERYMEN, (), ('d', 'u')),
+    ('admin_payment_items', queries.PAYMENT_ITEMS, ('PAY000001',), ()),
+    _built('import_existing_codes', catalog_import.existing_codes_query(['MED001', 'MED002', 'S0000001'])),
+    _built('adjust_lock_rows', inventory.lock_query(['MED001', 'MED002'])),
+    _built('adjust_update', inventory.update_query({'MED001': {'Stock': 10, 'Price': '5.00'}})),
+] + [
+    (f'export_{table}', sql, (), (table,)) for table, sql in exports.EXPORTS.items()
+] + [
+    # deliveryman.py
+    ('deliveryman_assigned', queries.ASSIGNED_PAYMENTS, ('DM001',), ()),
+    ('deliveryman_payment', queries.DELIVERY_PAYMENT, ('1001', 'DM001'), ()),
+    ('deliveryman_accept', queries.ACCEPT_DELIVERY, ('2026-01-01', '1001'), ()),
+    ('deliveryman_decline', queries.RELEASE_DELIVERY, ('1001',), ()),
+    ('deliveryman_profile', queries.DELIVERYMAN_PROFILE, ('DM001',), ())
+]
+
+
+def unregistered():
+    """Names of queries.py constants missing from HOT_QUERIES"""
+    registered = set()
+    for _, sql, _, _ in HOT_QUERIES:
+        registered.update(sql.values() if isinstance(sql, dict) else [sql])
+    return [name for name, value in vars(queries).items()
+            if name.isupper() and isinstance(value, str) and value not in registered]
+
+
+def full_scans(plan, allowed):
+    """Return the tables in an EXPLAIN plan read by a full scan that the query does not allow.
+
+    A scan fails even when the table has candidate indexes: the optimizer
+    chose not to use them, which is the regression this check exists for.
+    """
+    scans = []
+    for row in plan:
+        table = row.get('table') or ''
+        if table.startswith('<') or table in allowed:
+            continue
+        if row.get('type') == 'ALL':
+            scans.append(table)
+    return scans
+
+
+def active_queries():
+    """The registered queries that apply to the configured backend"""
+    for name, sql, params, allowed in HOT_QUERIES:
+        if isinstance(sql, dict):
+            sql = sql.get(db.backend.name)
+            if sql is None:
+                continue
+        yield name, sql, params, allowed
+
+
+def check_query_plans(connection):
+    """EXPLAIN every hot query; returns a list of (name, tables) that regressed"""
+    failures = []
+    cursor = connection.cursor(dictionary=True)
+    try:
+        for name, sql, params, allowed in active_queries():
+            scans = full_scans(db.backend.explain(cursor, sql, params), allowed)
+            if scans:
+                failures.append((name, scans))
+    finally:
+        cursor.close()
+    return failures
+
+
+def main():
+    missing = unregistered()
+    if missing:
+        print(f"Not registered in HOT_QUERIES: {', '.join(missing)}")
+        return 1
+
+    with db_connection() as connection:
+        if not connection:
+            print("Database connection failed")
+            return 1
+        try:
+            failures = check_query_plans(connection)
+        except Error as e:
+            print(f"EXPLAIN failed: {e}")
+            return 1
+
+    for name, tables in failures:
+        print(f"FULL SCAN  {name}: {', '.join(tables)}")
+    total = len(list(active_queries()))
+    print(f"{total - len(failures)}/{total} queries use an index.")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Stock reservations: time-limited holds on cart items and the checkout decrement.
+
+When a customer puts a medicine in the cart, a hold for that quantity is
+placed if the stock not held by other customers covers it. Holds last
+`hold_ttl` seconds from the customer's last change to the item; expired
+holds are swept every `sweep_interval` seconds and stop counting then.
+Holds live in this process beside the cart store, split into
+`stripes` shards with one lock each, so customers holding different
+medicines never wait on each other and a popular medicine only
+serialises its own holds. Nothing is locked in the database. Holds are
+not saved: when the cart store reads a cart back from the cart table or
+replays a journal, it places holds for its items again with place().
+Stock for a new hold comes from the catalog cache, whose rows checkout
+lowers as it sells (catalog.stock_changed()), so with the single worker
+process the cart store requires it is current.
+
+Holds only keep carts honest. The guarantee against overselling is
+take_stock() at checkout: one conditional UPDATE that decrements every
+medicine in the order only if each still has enough stock, inside the
+payment transaction.
+"""
+import threading
+import time
+
+RESERVATION_CONFIG = {
+    'hold_ttl': 900,        # seconds a cart item keeps its stock held
+    'sweep_interval': 30,   # seconds between removals of expired holds
+    'stripes': 64           # lock shards for the hold table
+}
+
+
+class HoldLedger:
+    """Per-customer stock holds by Med_Code with a running total per medicine"""
+
+    def __init__(self, hold_ttl=900, sweep_interval=30, stripes=64):
+        self.hold_ttl = hold_ttl
+        self.sweep_interval = sweep_interval
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._holds = [{} for _ in range(stripes)]    # Med_Code -> {customer: (quantity, expires)}
+        self._totals = [{} for _ in range(stripes)]   # Med_Code -> units held
+        self._sweep_lock = threading.Lock()
+        self._next_sweep = time.time() + sweep_interval
+        self._stats = {'placed': 0, 'refused': 0, 'released': 0, 'expired': 0}
+
+    def _stripe(self, med_code):
+        return hash(med_code) % len(self._locks)
+
+    def _drop(self, stripe, med_code, customer_id):
+        """Remove one hold (caller holds the stripe lock); returns its quantity"""
+        holds = self._holds[stripe].get(med_code)
+        if not holds or customer_id not in holds:
+            return 0
+        quantity, _ = holds.pop(customer_id)
+        if holds:
+            self._totals[stripe][med_code] -= quantity
+        else:
+            del self._holds[stripe][med_code]
+            del self._totals[stripe][med_code]
+        return quantity
+
+    def reserve(self, customer_id, med_code, quantity, stock):
+        """Hold quantity units for a customer, replacing their earlier hold.
+
+        Returns (placed, units available to this customer). A refused hold
+        leaves the earlier one in place.
+        """
+        self._maybe_sweep()
+        stripe = self._stripe(med_code)
+        with self._locks[stripe]:
+            holds = self._holds[stripe].get(med_code, {})
+            own = holds.get(customer_id, (0, 0))[0]
+            available = stock - (self._totals[stripe].get(med_code, 0) - own)
+            if quantity > available:
+                self._stats['refused'] += 1
+                return False, max(available, 0)
+            self._holds[stripe].setdefault(med_code, {})[customer_id] = (quantity, time.time() + self.hold_ttl)
+            self._totals[stripe][med_code] = self._totals[stripe].get(med_code, 0) - own + quantity
+            self._stats['placed'] += 1
+            return True, available
+
+    def place(self, customer_id, med_code, quantity):
+        """Hold quantity units for an item already in a cart, without checking stock"""
+        stripe = self._stripe(med_code)
+        with self._locks[stripe]:
+            holds = self._holds[stripe].setdefault(med_code, {})
+            own = holds.get(customer_id, (0, 0))[0]
+            holds[customer_id] = (quantity, time.time() + self.hold_ttl)
+            self._totals[stripe][med_code] = self._totals[stripe].get(med_code, 0) - own + quantity
+            self._stats['placed'] += 1
+
+    def release(self, customer_id, med_codes):
+        """Drop a customer's holds on some medicines (removed from the cart or bought)"""
+        for med_code in med_codes:
+            stripe = self._stripe(med_code)
+            with self._locks[stripe]:
+                if self._drop(stripe, med_code, customer_id):
+                    self._stats['released'] += 1
+
+    def held(self, med_code):
+        """Units of a medicine held across all carts"""
+        stripe = self._stripe(med_code)
+        with self._locks[stripe]:
+            return self._totals[stripe].get(med_code, 0)
+
+    def sweep(self):
+        """Remove expired holds; returns how many were removed"""
+        now = time.time()
+        removed = 0
+        for stripe, lock in enumerate(self._locks):
+            with lock:
+                for med_code, holds in list(self._holds[stripe].items()):
+                    for customer_id, (_, expires) in list(holds.items()):
+                        if expires <= now:
+                            self._drop(stripe, med_code, customer_id)
+                            removed += 1
+        self._stats['expired'] += removed
+        return removed
+
+    def _maybe_sweep(self):
+        if time.time() < self._next_sweep or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self.sweep()
+            self._next_sweep = time.time() + self.sweep_interval
+        finally:
+            self._sweep_lock.release()
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['holds'] = sum(len(h) for shard in self._holds for h in shard.values())
+        return stats
+
+
+holds = HoldLedger(**RESERVATION_CONFIG)
+
+
+def _cases(quantities):
+    codes = sorted(quantities)
+    params = []
+    for med_code in codes:
+        params.extend([med_code, quantities[med_code]])
+    return codes, ' '.join(['WHEN %s THEN %s'] * len(codes)), params
+
+
+def take_stock(cursor, quantities):
+    """Decrement Stock by {Med_Code: quantity} in one conditional UPDATE.
+
+    Returns False when any medicine is short. The others may have been
+    decremented, so the caller must roll back.
+    """
+    cursor.execute(*take_stock_query(quantities))
+    return cursor.rowcount == len(quantities)
+
+
+def take_stock_query(quantities):
+    """SQL and params for take_stock()"""
+    codes, cases, params = _cases(quantities)
+    sql = f"""
+        UPDATE medicine
+        SET Stock = Stock - CASE Med_Code {cases} END
+        WHERE Med_Code IN ({', '.join(['%s'] * len(codes))})
+          AND Stock >= CASE Med_Code {cases} END
+    """
+    return sql, params + codes + params
+
+
+def stock_query(codes):
+    """SQL and params reading the Stock of some medicines"""
+    return f"SELECT Med_Code, Stock FROM medicine WHERE Med_Code IN ({', '.join(['%s'] * len(codes))})", list(codes)
+
+
+def shortages(cursor, quantities):
+    """(Med_Code, units in stock) for each medicine with less stock than wanted"""
+    codes = sorted(quantities)
+    cursor.execute(*stock_query(codes))
+    stock = {med_code: units for med_code, units in cursor.fetchall()}
+    return [(med_code, stock.get(med_code, 0)) for med_code in codes if stock.get(med_code, 0) < quantities[med_code]]
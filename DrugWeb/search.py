@@ -0,0 +1,176 @@
+"""Medicine search engines.
+
+Two engines answer catalog searches with the same filters and ordering:
+
+* FULLTEXT on MySQL: MATCH ... AGAINST in boolean mode, with every word
+  required and matched as a prefix, ranked by MySQL's relevance score.
+* An in-process trigram index, used on SQLite, for terms MySQL's FULLTEXT
+  ignores (shorter than three characters), or when SEARCH_CONFIG asks for
+  it. It keeps LIKE's substring semantics ("mol" finds "Paracetamol") but
+  only verifies the documents whose trigrams match.
+
+Both accept sort_by='relevance' in addition to the route's name, price and
+price_desc orders.
+"""
+import re
+from collections import defaultdict
+
+SEARCH_CONFIG = {
+    'engine': 'auto'   # 'auto' (FULLTEXT on MySQL, memory elsewhere), 'fulltext' or 'memory'
+}
+
+SEARCH_FIELDS = ('Name', 'Generic_name', 'Category')
+
+# How much a match in each field counts towards relevance
+FIELD_WEIGHTS = {'Name': 3.0, 'Generic_name': 2.0, 'Category': 1.0}
+
+# FULLTEXT indexes created by migration 8, keyed by the columns they cover
+FULLTEXT_COLUMNS = {
+    ('Name', 'Generic_name'): 'Name, Generic_name',
+    ('Name', 'Generic_name', 'Category'): 'Name, Generic_name, Category'
+}
+
+FULLTEXT_MIN_TERM = 3  # InnoDB innodb_ft_min_token_size
+
+_EMPTY = frozenset()
+
+
+def normalize(text):
+    """Lower-case and collapse whitespace"""
+    return ' '.join(str(text or '').lower().split())
+
+
+def terms(query):
+    """Search terms in a query"""
+    return normalize(query).split()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _sort_key(sort_by):
+    if sort_by == 'price':
+        return lambda item: (item[1]['Price'], normalize(item[1]['Name']))
+    if sort_by == 'price_desc':
+        return lambda item: (-item[1]['Price'], normalize(item[1]['Name']))
+    if sort_by == 'relevance':
+        return lambda item: (-item[0], normalize(item[1]['Name']))
+    return lambda item: normalize(item[1]['Name'])
+
+
+class SearchIndex:
+    """Trigram inverted index over medicine Name, Generic_name and Category"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self._by_code = {row.get('Med_Code'): row for row in self.rows}
+        self._texts = []
+        self._postings = defaultdict(set)
+        for doc_id, row in enumerate(self.rows):
+            texts = {field: normalize(row.get(field)) for field in SEARCH_FIELDS}
+            self._texts.append(texts)
+            for text in texts.values():
+                for gram in trigrams(text):
+                    self._postings[gram].add(doc_id)
+
+    def take_stock(self, quantities):
+        """Lower the Stock of indexed rows by {Med_Code: quantity} after a checkout;
+        returns the Med_Codes now out of stock"""
+        sold_out = set()
+        for med_code, quantity in quantities.items():
+            row = self._by_code.get(med_code)
+            if row is not None:
+                row['Stock'] -= quantity
+                if row['Stock'] <= 0:
+                    sold_out.add(med_code)
+        return sold_out
+
+    def _candidates(self, query_terms):
+        """Documents containing every trigram of every term of three or more characters"""
+        candidates = None
+        for term in query_terms:
+            grams = trigrams(term)
+            if not grams:
+                continue
+            postings = sorted((self._postings.get(g, _EMPTY) for g in grams), key=len)
+            matched = set(postings[0])
+            for posting in postings[1:]:
+                matched &= posting
+                if not matched:
+                    break
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return set()
+        return range(len(self.rows)) if candidates is None else candidates
+
+    def _score(self, doc_id, query_terms, fields):
+        """Relevance of a document, or 0 if some term matches none of the fields"""
+        texts = self._texts[doc_id]
+        score = 0.0
+        for term in query_terms:
+            best = 0.0
+            for field in fields:
+                text = texts[field]
+                if term not in text:
+                    continue
+                if text == term:
+                    quality = 4
+                elif text.startswith(term):
+                    quality = 3
+                elif ' ' + term in text:
+                    quality = 2
+                else:
+                    quality = 1
+                best = max(best, quality * FIELD_WEIGHTS[field])
+            if not best:
+                return 0.0
+            score += best
+        return score
+
+    def search(self, query, category='', sort_by='relevance', fields=SEARCH_FIELDS):
+        """Rows matching every term of the query in one of the fields"""
+        query_terms = terms(query)
+        if not query_terms:
+            return []
+        results = []
+        for doc_id in self._candidates(query_terms):
+            row = self.rows[doc_id]
+            if category and row.get('Category') != category:
+                continue
+            score = self._score(doc_id, query_terms, fields)
+            if score:
+                results.append((score, row))
+        results.sort(key=_sort_key(sort_by))
+        return [row for _, row in results]
+
+
+def fulltext_supported(query, fields):
+    """Whether MySQL FULLTEXT can answer this query"""
+    query_terms = _fulltext_terms(query)
+    return (tuple(fields) in FULLTEXT_COLUMNS and bool(query_terms)
+            and all(len(term) >= FULLTEXT_MIN_TERM for term in query_terms))
+
+
+def _fulltext_terms(query):
+    # Boolean-mode operators in user input would change the query's meaning
+    return [t for t in re.split(r'[^\w]+', normalize(query)) if t]
+
+
+def fulltext_query(query, category='', sort_by='relevance', fields=SEARCH_FIELDS):
+    """SQL and params for a MySQL FULLTEXT search"""
+    columns = FULLTEXT_COLUMNS[tuple(fields)]
+    boolean_query = ' '.join(f'+{term}*' for term in _fulltext_terms(query))
+    sql = (f"SELECT *, MATCH({columns}) AGAINST (%s IN BOOLEAN MODE) AS relevance "
+           f"FROM medicine WHERE MATCH({columns}) AGAINST (%s IN BOOLEAN MODE)")
+    params = [boolean_query, boolean_query]
+    if category:
+        sql += " AND Category = %s"
+        params.append(category)
+    orders = {
+        'price': "Price ASC, Name ASC",
+        'price_desc': "Price DESC, Name ASC",
+        'relevance': "relevance DESC, Name ASC"
+    }
+    sql += " ORDER BY " + orders.get(sort_by, "Name ASC")
+    return sql, params
@@ -0,0 +1,296 @@
+"""Storage backends behind the shared connection pool.
+
+Handlers talk to a DB-API connection in mysql.connector style
+(`%s` placeholders, `cursor(dictionary=True)`, MySQL SQL). MySQLBackend
+hands out real MySQL connections; SQLiteBackend hands out an adapter that
+accepts the same calls and SQL, so the app, migrations and benchmarks run
+on a single machine with no database server.
+"""
+import re
+import sqlite3
+from functools import lru_cache
+
+try:
+    import mysql.connector
+    from mysql.connector import Error as MySQLError
+except ImportError:  # SQLite-only installs (CI, benchmarks)
+    mysql = None
+    MySQLError = None
+
+
+class StorageError(Exception):
+    """Errors raised by the storage layer itself"""
+
+
+# Catch-all for `except Error` in handlers, whichever backend is active
+Error = tuple(e for e in (StorageError, MySQLError, sqlite3.Error) if e is not None)
+
+
+class MySQLBackend:
+    """Production backend: mysql.connector against a MySQL server"""
+
+    name = 'mysql'
+
+    # Advances an id_sequence row; SELECT LAST_INSERT_ID() reads the new value back
+    reserve_sql = "UPDATE id_sequence SET next_value = LAST_INSERT_ID(next_value + %s) WHERE name = %s"
+
+    # Errors that mean a migration step was already applied by hand
+    ALREADY_APPLIED_ERRORS = {
+        1060,  # Duplicate column name
+        1061,  # Duplicate key name
+        1068   # Multiple primary key defined
+    }
+
+    NO_SUCH_TABLE = 1146
+
+    def __init__(self, config):
+        if mysql is None:
+            raise StorageError("mysql-connector-python is not installed")
+        self.config = config
+
+    def connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def ensure_database(self):
+        """Create the configured database if the server does not have it yet"""
+        server_config = {k: v for k, v in self.config.items() if k != 'database'}
+        connection = mysql.connector.connect(**server_config)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.config['database']}")
+            cursor.close()
+        finally:
+            connection.close()
+
+    def is_already_applied(self, error):
+        return getattr(error, 'errno', None) in self.ALREADY_APPLIED_ERRORS
+
+    def is_missing_table(self, error):
+        return getattr(error, 'errno', None) == self.NO_SUCH_TABLE
+
+    def acquire_migration_lock(self, cursor):
+        # Serialise concurrent deploys so each migration runs exactly once
+        cursor.execute("SELECT GET_LOCK('drugweb_migrations', 60)")
+        if cursor.fetchone()[0] != 1:
+            raise StorageError("Another migration run holds the lock")
+
+    def release_migration_lock(self, cursor):
+        cursor.execute("SELECT RELEASE_LOCK('drugweb_migrations')")
+        cursor.fetchone()
+
+    def upsert_sql(self, table, columns, keys):
+        """INSERT that updates the non-key columns of rows whose key already exists"""
+        updates = ', '.join(f'{c} = VALUES({c})' for c in columns if c not in keys)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON DUPLICATE KEY UPDATE {updates}")
+
+    def reserve_range(self, cursor, name, count):
+        """Advance an id_sequence row by count; returns the first value reserved"""
+        cursor.execute(self.reserve_sql, (count, name))
+        if cursor.rowcount != 1:
+            raise StorageError(f"Unknown ID sequence: {name}")
+        cursor.execute("SELECT LAST_INSERT_ID()")
+        return cursor.fetchone()[0] - count
+
+    def explain(self, cursor, sql, params):
+        """EXPLAIN rows as dicts with table, type and possible_keys"""
+        cursor.execute("EXPLAIN " + sql, params)
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) if not isinstance(row, dict) else row
+                for row in cursor.fetchall()]
+
+
+class SQLiteBackend:
+    """Embedded backend for tests and benchmarks"""
+
+    name = 'sqlite'
+
+    reserve_sql = "UPDATE id_sequence SET next_value = next_value + %s WHERE name = %s RETURNING next_value"
+
+    ALREADY_APPLIED_MESSAGES = ('duplicate column name', 'already exists')
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        return SQLiteConnection(self.path)
+
+    def ensure_database(self):
+        pass  # the file is created on first connect
+
+    def is_already_applied(self, error):
+        message = str(error).lower()
+        return any(m in message for m in self.ALREADY_APPLIED_MESSAGES)
+
+    def is_missing_table(self, error):
+        return 'no such table' in str(error).lower()
+
+    def acquire_migration_lock(self, cursor):
+        pass  # SQLite serialises writers on its own
+
+    def release_migration_lock(self, cursor):
+        pass
+
+    def upsert_sql(self, table, columns, keys):
+        """INSERT that updates the non-key columns of rows whose key already exists"""
+        updates = ', '.join(f'{c} = excluded.{c}' for c in columns if c not in keys)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}")
+
+    def reserve_range(self, cursor, name, count):
+        """Advance an id_sequence row by count; returns the first value reserved"""
+        cursor.execute(self.reserve_sql, (count, name))
+        row = cursor.fetchone()
+        if row is None:
+            raise StorageError(f"Unknown ID sequence: {name}")
+        return row[0] - count
+
+    def explain(self, cursor, sql, params):
+        """EXPLAIN QUERY PLAN mapped onto MySQL's table/type/possible_keys shape"""
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        plan = []
+        for row in cursor.fetchall():
+            detail = row[-1] if not isinstance(row, dict) else row['detail']
+            match = re.match(r'(SCAN|SEARCH) (\S+)(?: USING (?:COVERING )?(?:INDEX|INTEGER PRIMARY KEY) ?(\S*))?', detail)
+            if not match:
+                continue
+            action, table, index = match.groups()
+            if action == 'SEARCH':
+                access = 'ref'
+            elif index is not None:
+                access = 'index'
+            else:
+                access = 'ALL'
+            plan.append({'table': table, 'type': access, 'possible_keys': index})
+        return plan
+
+
+def _concat(*args):
+    if any(a is None for a in args):
+        return None
+    return ''.join(str(a) for a in args)
+
+
+_PLACEHOLDER = re.compile(r"'(?:[^']|'')*'|%s")
+
+_REWRITES = [
+    (re.compile(r'\bINT AUTO_INCREMENT PRIMARY KEY\b', re.I), 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    (re.compile(r'\bINSERT IGNORE\b', re.I), 'INSERT OR IGNORE'),
+    (re.compile(r'\bNOW\(\)', re.I), 'CURRENT_TIMESTAMP'),
+    # SQLite locks the whole database for writes; there are no row locks to take
+    (re.compile(r'\s+FOR UPDATE\b', re.I), '')
+]
+
+
+@lru_cache(maxsize=512)
+def translate_sql(sql):
+    """Rewrite mysql.connector-style SQL into SQLite SQL"""
+    sql = _PLACEHOLDER.sub(lambda m: '?' if m.group(0) == '%s' else m.group(0), sql)
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class SQLiteRow(dict):
+    """Dictionary row with MySQL's case-insensitive column lookup.
+
+    SQLite reports the declared column name (Quantity) where MySQL reports
+    the name as written in the query (quantity).
+    """
+
+    def __missing__(self, key):
+        if isinstance(key, str):
+            lowered = key.lower()
+            for name, value in self.items():
+                if name.lower() == lowered:
+                    return value
+        raise KeyError(key)
+
+
+def _dict_row(cursor, row):
+    return SQLiteRow((d[0], value) for d, value in zip(cursor.description, row))
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that accepts mysql.connector-style calls"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def execute(self, sql, params=None):
+        self._cursor.execute(translate_sql(sql), tuple(params or ()))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate_sql(sql), [tuple(p) for p in seq_of_params])
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 connection that looks enough like a mysql.connector connection"""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(
+            path,
+            timeout=30,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False  # pooled connections move between request threads
+        )
+        self._connection.create_function('CONCAT', -1, _concat, deterministic=True)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._closed = False
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._connection.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self):
+        return not self._closed
+
+    def close(self):
+        self._closed = True
+        self._connection.close()
+
+
+def create_backend(name, mysql_config=None, sqlite_path=None):
+    """Build the backend selected in db.py"""
+    if name == 'mysql':
+        return MySQLBackend(mysql_config)
+    if name == 'sqlite':
+        return SQLiteBackend(sqlite_path)
+    raise StorageError(f"Unknown database backend: {name}")
@@ -0,0 +1,127 @@
+"""Prefix index for the medicine search-box typeahead.
+
+Medicine names and generic names are kept in one sorted array of
+(normalized key, display text, field) entries. Each name is indexed from
+the start of every word, so "para" suggests both "Paracetamol" and
+"Medicine 7 Paracetamol". A prefix lookup is a bisect plus a short scan.
+Entries are reference-counted per Med_Code, so inserting, renaming or
+deleting a medicine updates the array in place instead of rebuilding it.
+"""
+import bisect
+import threading
+import time
+from collections import Counter
+from search import normalize
+
+SUGGEST_CONFIG = {
+    'fields': ('Name', 'Generic_name'),
+    'default_limit': 8,
+    'max_limit': 20,
+    'rebuild_after': 300   # seconds between full rebuilds from the database
+}
+
+
+def _entries(row, fields):
+    """Index entries for one medicine row"""
+    entries = set()
+    for field in fields:
+        display = ' '.join(str(row.get(field) or '').split())
+        text = normalize(display)
+        if not text:
+            continue
+        words = text.split(' ')
+        for i in range(len(words)):
+            entries.add((' '.join(words[i:]), display, field))
+    return entries
+
+
+class PrefixIndex:
+    """Sorted array of name keys answering prefix lookups"""
+
+    def __init__(self, loader, fields=SUGGEST_CONFIG['fields'], rebuild_after=300):
+        self._loader = loader
+        self.fields = fields
+        self.rebuild_after = rebuild_after
+        self._lock = threading.Lock()
+        self._keys = []
+        self._refs = Counter()
+        self._members = {}   # Med_Code -> set of entries
+        self._built_at = None
+
+    def _ensure_built(self):
+        with self._lock:
+            fresh = self._built_at is not None and time.monotonic() - self._built_at < self.rebuild_after
+        if not fresh:
+            self.rebuild()
+
+    def rebuild(self):
+        """Reindex every medicine from the database"""
+        refs = Counter()
+        members = {}
+        for row in self._loader():
+            entries = _entries(row, self.fields)
+            members[row['Med_Code']] = entries
+            refs.update(entries)
+        keys = sorted(refs)
+        with self._lock:
+            self._keys = keys
+            self._refs = refs
+            self._members = members
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a rebuild on next use"""
+        with self._lock:
+            self._built_at = None
+
+    def _add(self, entry):
+        self._refs[entry] += 1
+        if self._refs[entry] == 1:
+            bisect.insort(self._keys, entry)
+
+    def _discard(self, entry):
+        self._refs[entry] -= 1
+        if self._refs[entry] <= 0:
+            del self._refs[entry]
+            index = bisect.bisect_left(self._keys, entry)
+            if index < len(self._keys) and self._keys[index] == entry:
+                del self._keys[index]
+
+    def save(self, row):
+        """Record an inserted or updated medicine"""
+        entries = _entries(row, self.fields)
+        with self._lock:
+            if self._built_at is None:
+                return  # the next rebuild will see the write
+            old = self._members.get(row['Med_Code'], set())
+            for entry in old - entries:
+                self._discard(entry)
+            for entry in entries - old:
+                self._add(entry)
+            self._members[row['Med_Code']] = entries
+
+    def suggest(self, prefix, limit=8):
+        """Up to `limit` distinct names starting with (a word starting with) prefix.
+
+        Names that start with the prefix come before those where a later
+        word matches, then shorter names first.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self._ensure_built()
+        candidates = {}
+        with self._lock:
+            index = bisect.bisect_left(self._keys, (prefix,))
+            scanned = 0
+            while index < len(self._keys) and scanned < limit * 4:
+                key, display, field = self._keys[index]
+                if not key.startswith(prefix):
+                    break
+                whole = normalize(display) == key
+                if display not in candidates or whole:
+                    candidates[display] = (not whole, len(display), display, field)
+                index += 1
+                scanned += 1
+        ranked = sorted(candidates.values())[:limit]
+        return [{'text': display, 'field': field} for _, _, display, field in ranked]
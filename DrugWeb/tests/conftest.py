@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests run against a scratch SQLite database, never the configured MySQL server
+_scratch = tempfile.mkdtemp(prefix='drugweb-tests-')
+os.environ['DRUGWEB_DB_BACKEND'] = 'sqlite'
+os.environ['DRUGWEB_SQLITE_PATH'] = os.path.join(_scratch, 'drugweb.sqlite3')
+os.environ['DRUGWEB_CART_JOURNAL'] = os.path.join(_scratch, 'cart_journal')
+
+# Children first, so foreign keys never block a delete
+TABLES = ('payment_item', 'payment', 'cart', 'checkout_key', 'outbox', 'points_history', 'notifications',
+          'customer_review', 'customer_request', 'customer', 'admin', 'deliveryman', 'user', 'medicine')
+
+MEDICINES = [
+    ('MED001', 'Paracetamol', 'Acetaminophen', 'Pain Relief', 5.00, 10),
+    ('MED002', 'Aspirin', 'Acetylsalicylic Acid', 'Pain Relief', 3.50, 5),
+    ('MED003', 'Amoxicillin', 'Amoxicillin', 'Antibiotic', 12.00, 2)
+]
+
+
+@pytest.fixture
+def database():
+    """The scratch database, migrated and holding only customer CM001 and MEDICINES"""
+    import catalog
+    import migrations
+    from db import db_connection
+
+    migrations.run_migrations()
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        for table in TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute("""
+            INSERT INTO user (ID, F_name, L_name, email, password, address, phone)
+            VALUES ('CM001', 'John', 'Doe', 'customer@test.com', 'password123', '123 Main St', '555-1234')
+        """)
+        cursor.execute("INSERT INTO customer (Customer_ID, points) VALUES ('CM001', 100)")
+        cursor.executemany("""
+            INSERT INTO medicine (Med_Code, Name, Generic_name, Category, Price, Stock)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, MEDICINES)
+        connection.commit()
+        cursor.close()
+    catalog.invalidate()
+
+
+
+@pytest.fixture
+def client(database, tmp_path, monkeypatch):
+    """A test client logged in as CM001, with its own cart store, holds and idempotency results"""
+    import app
+    import cart
+    import cart_store
+    import idempotency
+    import reservations
+
+    holds = reservations.HoldLedger()
+    store = cart_store.CartStore(cart_store.MemoryKV(), cart_store.Journal(str(tmp_path)), flush_interval=3600)
+    for module in (cart, cart_store, reservations):
+        monkeypatch.setattr(module, 'holds', holds)
+    for module in (cart, cart_store):
+        monkeypatch.setattr(module, 'store', store)
+    monkeypatch.setattr(idempotency, 'checkouts', idempotency.KeyResults())
+
+    app.app.testing = True
+    with app.app.test_client() as client:
+        with client.session_transaction() as session:
+            session['user_id'] = 'CM001'
+            session['user_type'] = 'customer'
+            session['user_name'] = 'John Doe'
+        yield client
+    store.close()
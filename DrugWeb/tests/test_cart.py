@@ -0,0 +1,43 @@
+def batch(client, *operations):
+    return client.post('/customer/cart/batch', json={'operations': list(operations)}).json
+
+
+def test_batch_applies_operations_in_order_and_skips_rejected_ones(client):
+    response = batch(client,
+                     {'op': 'add', 'med_code': 'MED001', 'quantity': 2},
+                     {'op': 'set', 'med_code': 'MED001', 'quantity': 4},
+                     {'op': 'add', 'med_code': 'MED002'},
+                     {'op': 'remove', 'med_code': 'MED003'},
+                     {'op': 'add', 'med_code': 'MED002', 'quantity': 0},
+                     {'op': 'refund'})
+    assert [result['success'] for result in response['results']] == [True, True, True, False, False, False]
+    assert response['results'][5]['message'] == 'Unknown operation: refund'
+    assert {item['med_code']: item['quantity'] for item in response['items']} == {'MED001': 4, 'MED002': 1}
+    assert response['total_amount'] == 23.5
+
+
+def test_batch_rejects_an_empty_or_oversized_list(client):
+    assert batch(client)['message'] == 'No operations given'
+    too_many = [{'op': 'add', 'med_code': 'MED001'}] * 101
+    assert not batch(client, *too_many)['success']
+
+
+def test_adding_more_than_the_free_stock_is_refused(client):
+    assert batch(client, {'op': 'add', 'med_code': 'MED003', 'quantity': 3})['results'][0] == \
+        {'op': 'add', 'success': False, 'message': 'Only 2 units available'}
+    assert batch(client, {'op': 'add', 'med_code': 'MED003', 'quantity': 2})['results'][0]['success']
+
+
+def test_count_follows_cart_changes(client):
+    assert client.get('/customer/cart/count').json == {'success': True, 'count': 0}
+    batch(client, {'op': 'add', 'med_code': 'MED001'}, {'op': 'add', 'med_code': 'MED002'})
+    client.post('/customer/add_to_cart', json={'med_code': 'MED001', 'quantity': 1})
+    assert client.get('/customer/cart/count').json['count'] == 2
+    batch(client, {'op': 'remove', 'med_code': 'MED002'})
+    assert client.get('/customer/cart/count').json['count'] == 1
+
+
+def test_count_needs_a_customer_login(client):
+    with client.session_transaction() as session:
+        session.clear()
+    assert not client.get('/customer/cart/count').json['success']
@@ -0,0 +1,141 @@
+import threading
+
+import pytest
+
+import cart_store
+import reservations
+from db import db_connection
+
+
+@pytest.fixture
+def holds(monkeypatch):
+    ledger = reservations.HoldLedger()
+    monkeypatch.setattr(cart_store, 'holds', ledger)
+    return ledger
+
+
+@pytest.fixture
+def make_store(tmp_path, holds):
+    """Build stores journaling to one directory, as processes sharing it would"""
+    stores = []
+
+    def make(**options):
+        store = cart_store.CartStore(cart_store.MemoryKV(), cart_store.Journal(str(tmp_path)),
+                                     flush_interval=3600, **options)
+        stores.append(store)
+        return store
+    yield make
+    for store in stores:
+        store.close()
+
+
+def crash(journal):
+    """Leave a journal's segments behind as a process killed mid-run would"""
+    journal.rotate()
+    journal._owner_lock.close()
+    journal._owner_lock = None
+
+
+def cart_rows(customer_id='CM001'):
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT Med_Code, quantity FROM cart WHERE Customer_ID = %s ORDER BY Med_Code", (customer_id,))
+        result = [tuple(row) for row in cursor.fetchall()]
+        cursor.close()
+    return result
+
+
+def add_payment(payment_id):
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("""
+            INSERT INTO payment (payment_id, Customer_ID, amount, payment_type)
+            VALUES (%s, 'CM001', 15.00, 'Cash on Delivery')
+        """, (payment_id,))
+        connection.commit()
+        cursor.close()
+
+
+def test_flush_writes_changes_to_the_cart_table(database, make_store):
+    store = make_store()
+    store.update('CM001', 'MED001', lambda current: current + 2)
+    store.update('CM001', 'MED002', lambda current: current + 1)
+    store.update('CM001', 'MED002', lambda current: 0)
+    assert cart_rows() == []
+    store.flush()
+    assert cart_rows() == [('MED001', 2)]
+    assert store.count('CM001') == 1
+
+
+def test_concurrent_updates_are_not_lost(database, make_store):
+    store = make_store()
+
+    def add():
+        for _ in range(50):
+            store.update('CM001', 'MED001', lambda current: current + 1)
+    threads = [threading.Thread(target=add) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.lines('CM001') == {'MED001': 400}
+
+
+def test_recovery_replays_a_stopped_process(database, make_store, holds):
+    stopped = make_store()
+    stopped.update('CM001', 'MED001', lambda current: current + 3)
+    crash(stopped.journal)
+
+    store = make_store()
+    assert store.lines('CM001') == {'MED001': 3}
+    assert cart_rows() == [('MED001', 3)]
+    assert holds.held('MED001') == 3
+    assert stopped.journal.segments() == []
+
+
+def test_recovery_does_not_revive_paid_lines(database, make_store):
+    stopped = make_store()
+    stopped.update('CM001', 'MED001', lambda current: current + 3)
+    stopped.checkout_started('CM001', 'PAY1', {'MED001': 3})
+    stopped.update('CM001', 'MED002', lambda current: current + 1)     # another tab, after the cart was read
+    stopped.checkout_started('CM001', 'PAY2', {'MED002': 1})           # never committed
+    add_payment('PAY1')
+    crash(stopped.journal)
+
+    make_store().recover()
+    assert cart_rows() == [('MED002', 1)]
+
+
+def test_checkout_done_keeps_items_added_in_another_tab(database, make_store):
+    store = make_store()
+    store.update('CM001', 'MED001', lambda current: current + 2)
+    store.checkout_started('CM001', 'PAY1', {'MED001': 2})
+    store.update('CM001', 'MED001', lambda current: current + 1)
+    store.update('CM001', 'MED002', lambda current: current + 1)
+
+    assert store.checkout_done('CM001', 'PAY1', {'MED001': 2}) == {'MED001': 1}
+    assert store.lines('CM001') == {'MED001': 1, 'MED002': 1}
+    assert store.count('CM001') == 2
+
+
+def test_cart_only_read_is_evicted_when_idle(database, make_store):
+    store = make_store(idle_ttl=0)
+    assert store.lines('CM001') == {}
+    store.flush()
+    assert store.kv.get('CM001') is None
+
+
+def test_flush_upserts_one_row_per_medicine(database, make_store):
+    store = make_store()
+    store.update('CM001', 'MED002', lambda current: current + 1)
+    store.flush()
+    store.update('CM001', 'MED002', lambda current: current + 2)
+    store.flush()
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT quantity, total_price FROM cart WHERE Customer_ID = 'CM001'")
+        assert [tuple(row) for row in cursor.fetchall()] == [(3, 10.5)]
+        with pytest.raises(Exception):
+            cursor.execute("INSERT INTO cart (Customer_ID, Med_Code, quantity, total_price) VALUES ('CM001', 'MED002', 1, 3.5)")
+        connection.rollback()
+        cursor.close()
@@ -0,0 +1,50 @@
+import catalog
+from db import db_connection
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = catalog.CatalogCache(max_entries=2)
+    cache.get('a', lambda: 1)
+    cache.get('b', lambda: 2)
+    cache.get('a', lambda: 0)     # hit: 'a' is now the most recent
+    cache.get('c', lambda: 3)
+    assert cache.get('a', lambda: 0) == 1
+    assert cache.get('b', lambda: 0) == 0
+    assert cache.stats()['evictions'] == 2
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    cache = catalog.CatalogCache()
+
+    def load():
+        cache.invalidate()    # a write lands while the value is loading
+        return 'stale'
+    assert cache.get('key', load) == 'stale'
+    assert cache.get('key', lambda: 'fresh') == 'fresh'
+
+
+def test_expired_entry_is_reloaded():
+    cache = catalog.CatalogCache(ttl=0)
+    cache.get('key', lambda: 1)
+    assert cache.get('key', lambda: 2) == 2
+
+
+def test_saved_medicine_shows_up_everywhere(database):
+    catalog.list_medicines()
+    version = catalog.version()
+    row = {'Med_Code': 'MED004', 'Name': 'Ibuprofen', 'Generic_name': 'Ibuprofen',
+           'Category': 'Pain Relief', 'Price': 4.25}
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("""
+            INSERT INTO medicine (Med_Code, Name, Generic_name, Category, Price, Stock)
+            VALUES (%s, %s, %s, %s, %s, 7)
+        """, (row['Med_Code'], row['Name'], row['Generic_name'], row['Category'], row['Price']))
+        connection.commit()
+        cursor.close()
+
+    catalog.medicines_saved([row])
+    assert catalog.version() != version
+    assert 'MED004' in [medicine['Med_Code'] for medicine in catalog.list_medicines()]
+    assert [entry['text'] for entry in catalog.suggest_names('ibu')] == ['Ibuprofen']
+    assert catalog.get_medicine('MED004')['Stock'] == 7
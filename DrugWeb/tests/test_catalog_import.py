@@ -0,0 +1,46 @@
+import io
+
+import catalog
+import catalog_import
+from db import db_connection
+
+CSV = """Med_Code,Name,Generic_name,Category,Price,Stock
+MED001,Paracetamol 500,,,6.5,
+MED004,Cetirizine,Cetirizine,Allergy,2.25,40
+MED005,,,,1.00,1
+MED006,Loratadine,,Allergy,-1,1
+MED007,Omeprazole,,,7,3
+"""
+
+
+def medicine(med_code):
+    with db_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT Name, Generic_name, Category, Price, Stock FROM medicine WHERE Med_Code = %s",
+                       (med_code,))
+        row = cursor.fetchone()
+        cursor.close()
+    return dict(row, Price=float(row['Price'])) if row else None
+
+
+def test_csv_import_upserts_valid_rows_and_reports_the_rest(database):
+    catalog.list_medicines()
+    version = catalog.version()
+    result = catalog_import.import_medicines(io.StringIO(CSV), 'csv', chunk_size=2)
+
+    assert (result['inserted'], result['updated'], result['rejected']) == (2, 1, 2)
+    assert result['errors'] == [{'row': 4, 'reason': 'Missing Name'},
+                                {'row': 5, 'reason': 'Price out of range: -1'}]
+    # Blank optional columns keep the existing values
+    assert medicine('MED001') == {'Name': 'Paracetamol 500', 'Generic_name': 'Acetaminophen',
+                                  'Category': 'Pain Relief', 'Price': 6.5, 'Stock': 10}
+    assert medicine('MED004')['Stock'] == 40
+    assert catalog.version() != version
+
+
+def test_json_array_and_lines_are_both_read(database):
+    array = '[{"Med_Code": "MED010", "Name": "A", "Price": 1}, {"Med_Code": "MED011", "Name": "B", "Price": 2}]'
+    lines = '{"Med_Code": "MED012", "Name": "C", "Price": 3}\n{"Med_Code": "MED013", "Name": "D", "Price": 4}\n'
+    assert catalog_import.import_medicines(io.StringIO(array), 'json')['inserted'] == 2
+    assert catalog_import.import_medicines(io.StringIO(lines), 'json')['inserted'] == 2
+    assert medicine('MED013')['Price'] == 4.0
@@ -0,0 +1,93 @@
+import threading
+
+import idempotency
+from db import db_connection
+
+
+def scalar(sql, params=()):
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        value = cursor.fetchone()[0]
+        cursor.close()
+    return value
+
+
+def flashes(client):
+    with client.session_transaction() as session:
+        return [message for _, message in session.pop('_flashes', [])]
+
+
+def pay(client, key):
+    return client.post('/customer/process_payment', data={'payment_method': 'Cash on Delivery', 'idempotency_key': key})
+
+
+def test_repeated_key_replays_the_first_payment(client):
+    client.post('/customer/add_to_cart', json={'med_code': 'MED001', 'quantity': 2})
+    pay(client, 'key-1')
+    payment_id = scalar("SELECT payment_id FROM payment WHERE Customer_ID = 'CM001'")
+    assert any(payment_id in message for message in flashes(client))
+
+    client.post('/customer/add_to_cart', json={'med_code': 'MED002', 'quantity': 1})
+    pay(client, 'key-1')
+    assert flashes(client) == [f"Payment already processed. Payment ID: {payment_id}"]
+    assert scalar("SELECT COUNT(*) FROM payment") == 1
+    assert scalar("SELECT Stock FROM medicine WHERE Med_Code = 'MED001'") == 8
+
+
+def test_key_recorded_by_another_worker_is_replayed(client, monkeypatch):
+    client.post('/customer/add_to_cart', json={'med_code': 'MED001', 'quantity': 1})
+    pay(client, 'key-2')
+    flashes(client)
+    # A worker that did not run the first checkout finds the key in checkout_key
+    monkeypatch.setattr(idempotency, 'checkouts', idempotency.KeyResults())
+    pay(client, 'key-2')
+    assert flashes(client)[0].startswith("Payment already processed")
+    assert scalar("SELECT COUNT(*) FROM payment") == 1
+
+
+def test_concurrent_duplicates_wait_for_the_first_result():
+    results = idempotency.KeyResults()
+    seen = []
+    first_running = threading.Event()
+    finish_first = threading.Event()
+
+    def first():
+        with results.single_flight('CM001', 'k') as earlier:
+            seen.append(earlier)
+            first_running.set()
+            finish_first.wait(5)
+            results.put('CM001', 'k', 'PAY1')
+
+    def duplicate():
+        with results.single_flight('CM001', 'k') as earlier:
+            seen.append(earlier)
+
+    threads = [threading.Thread(target=first), threading.Thread(target=duplicate)]
+    threads[0].start()
+    first_running.wait(5)
+    threads[1].start()
+    finish_first.set()
+    for thread in threads:
+        thread.join()
+    assert seen == [None, 'PAY1']
+    assert results.stats()['in_flight'] == 0
+
+
+def test_checkout_saves_order_lines_and_empties_the_cart(client):
+    client.post('/customer/add_to_cart', json={'med_code': 'MED001', 'quantity': 2})
+    client.post('/customer/add_to_cart', json={'med_code': 'MED003', 'quantity': 1})
+    pay(client, 'key-3')
+    payment_id = scalar("SELECT payment_id FROM payment WHERE Customer_ID = 'CM001'")
+
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT Med_Code, quantity, unit_price, total_price FROM payment_item
+            WHERE payment_id = %s ORDER BY Med_Code
+        """, (payment_id,))
+        lines = [(code, quantity, float(unit), float(total)) for code, quantity, unit, total in cursor.fetchall()]
+        cursor.close()
+    assert lines == [('MED001', 2, 5.0, 10.0), ('MED003', 1, 12.0, 12.0)]
+    assert scalar("SELECT amount FROM payment WHERE payment_id = %s", (payment_id,)) == 22
+    assert client.get('/customer/cart/count').json['count'] == 0
@@ -0,0 +1,44 @@
+import csv
+import io
+import json
+
+import pytest
+
+import exports
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(exports, 'FETCH_SIZE', 2)
+
+
+def test_csv_export_has_a_header_and_every_row(database, small_batches):
+    chunks = list(exports.export_rows('medicine', 'csv'))
+    assert len(chunks) == 3   # header, then batches of two rows
+    rows = list(csv.reader(io.StringIO(''.join(chunks))))
+    assert rows[0] == ['Med_Code', 'Name', 'Generic_name', 'Category', 'Price', 'Stock']
+    assert [row[0] for row in rows[1:]] == ['MED001', 'MED002', 'MED003']
+
+
+def test_ndjson_export_has_one_object_per_line(database, small_batches):
+    lines = ''.join(exports.export_rows('medicine', 'ndjson')).splitlines()
+    assert [json.loads(line)['Med_Code'] for line in lines] == ['MED001', 'MED002', 'MED003']
+
+
+def test_unknown_export_is_refused():
+    with pytest.raises(KeyError):
+        exports.export_rows('user', 'csv')
+
+
+def test_admin_download(database):
+    import app
+    app.app.testing = True
+    with app.app.test_client() as client:
+        with client.session_transaction() as session:
+            session['user_id'] = 'AD001'
+            session['user_type'] = 'admin'
+        response = client.get('/admin/export/medicine?format=ndjson')
+        assert response.mimetype == 'application/x-ndjson'
+        assert response.headers['Content-Disposition'] == 'attachment; filename=medicine.ndjson'
+        assert len(response.get_data(as_text=True).splitlines()) == 3
+        assert client.get('/admin/export/user').status_code == 404
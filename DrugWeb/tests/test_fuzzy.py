@@ -0,0 +1,42 @@
+import pytest
+import fuzzy
+
+ROWS = [
+    {'Med_Code': 'MED001', 'Name': 'Zinc', 'Generic_name': 'Zinc sulfate'},
+    {'Med_Code': 'MED002', 'Name': 'Iron', 'Generic_name': 'Ferrous sulfate'},
+    {'Med_Code': 'MED003', 'Name': 'Paracetamol', 'Generic_name': 'Acetaminophen'},
+    {'Med_Code': 'MED004', 'Name': 'Amoxicillin', 'Generic_name': 'Amoxicillin'}
+]
+
+
+@pytest.fixture
+def index():
+    index = fuzzy.FuzzyIndex(lambda: ROWS)
+    index.rebuild()
+    return index
+
+
+@pytest.mark.parametrize('term, word', [
+    ('zicn', 'zinc'),   # transpositions in short words
+    ('znic', 'zinc'),
+    ('izinc', 'zinc'),
+    ('iorn', 'iron'),
+    ('irno', 'iron'),
+    ('rion', 'iron'),
+    ('paracetmaol', 'paracetamol'),
+    ('aprcetamol', 'paracetamol'),
+    ('amoxicilin', 'amoxicillin'),
+    ('sluftae', 'sulfate')
+])
+def test_corrects_within_limit(index, term, word):
+    assert index.correct(term) == word
+
+
+@pytest.mark.parametrize('term', ['izno', 'xyz', 'zzzz', 'paramol'])
+def test_leaves_distant_terms(index, term):
+    assert index.correct(term) is None
+
+
+def test_did_you_mean(index):
+    assert index.did_you_mean('zicn sulfaet') == 'zinc sulfate'
+    assert index.did_you_mean('zinc') is None
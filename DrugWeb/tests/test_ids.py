@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+import ids
+from db import StorageError, db_connection
+
+
+@pytest.fixture
+def workers(database):
+    """Payment ID generators with 2 worker numbers, all released afterwards"""
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("DELETE FROM id_worker")
+        connection.commit()
+        cursor.close()
+    made = []
+
+    def make(lease=600):
+        generator = ids.Snowflake('PAY', 17, ids.IDS_CONFIG['epoch_ms'], 1, 8, lease)
+        made.append(generator)
+        return generator
+    yield make
+    for generator in made:
+        generator.release()
+
+
+def test_payment_ids_are_unique_ordered_and_fit_the_column(workers):
+    generator = workers()
+    made = [generator.next() for _ in range(2000)]
+    assert len(set(made)) == len(made)
+    assert made == sorted(made)
+    assert all(len(payment_id) == 20 and payment_id.startswith('PAY') for payment_id in made)
+
+
+def test_running_processes_get_different_workers(workers):
+    first, second = workers(), workers()
+    first.next()
+    second.next()
+    assert first.stats()['worker'] != second.stats()['worker']
+
+
+def test_no_free_worker_number_refuses_to_make_ids(workers):
+    workers().next()
+    workers().next()
+    with pytest.raises(StorageError):
+        workers().next()
+
+
+def test_released_worker_number_is_reused(workers):
+    first, second = workers(), workers()
+    first.next()
+    second.next()
+    number = first.stats()['worker']
+    first.release()
+    time.sleep(1.1)   # released numbers are free from the next second
+    third = workers()
+    third.next()
+    assert third.stats()['worker'] == number
+
+
+def test_lease_taken_over_after_expiry_is_replaced(workers):
+    stale = workers(lease=1)
+    stale.next()
+    number = stale.stats()['worker']
+    time.sleep(1.1)
+    workers().next()            # takes the expired number
+    stale.next()
+    assert stale.stats()['worker'] != number
+    assert stale.stats()['leases'] == 2
+
+
+def test_customer_blocks_never_overlap(database):
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("UPDATE id_sequence SET next_value = 2 WHERE name = 'customer'")
+        connection.commit()
+        cursor.close()
+    first, second = ids.BlockAllocator('customer', 3), ids.BlockAllocator('customer', 3)
+    numbers = [first.next(), second.next(), first.next(), first.next(), first.next(), second.next()]
+    assert numbers == [2, 5, 3, 4, 8, 6]
+    assert first.stats() == {'issued': 4, 'blocks': 2, 'remaining': 2}
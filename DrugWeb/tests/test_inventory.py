@@ -0,0 +1,44 @@
+import catalog
+import inventory
+from db import db_connection
+
+
+def stock_and_price():
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT Med_Code, Stock, Price FROM medicine ORDER BY Med_Code")
+        result = {code: (stock, float(price)) for code, stock, price in cursor.fetchall()}
+        cursor.close()
+    return result
+
+
+def test_adjustments_apply_in_order_and_reject_individually(database):
+    assert catalog.get_medicine('MED001')['Stock'] == 10
+    results = inventory.adjust_medicines([
+        {'Med_Code': 'MED001', 'Stock_Delta': -4},
+        {'Med_Code': 'MED001', 'Stock_Delta': -3, 'Price': '5.5'},
+        {'Med_Code': 'MED002', 'Stock_Delta': -6},
+        {'Med_Code': 'MED003', 'Stock': 20},
+        {'Med_Code': 'MED999', 'Stock': 1},
+        {'Med_Code': 'MED002', 'Stock': 1, 'Stock_Delta': 1},
+        {'Stock': 1}
+    ], chunk_size=2)
+
+    assert [result['status'] for result in results] == \
+        ['updated', 'updated', 'rejected', 'updated', 'not_found', 'rejected', 'rejected']
+    assert results[2]['reason'] == 'Only 5 in stock'
+    assert inventory.summarize(results) == '3 updated, 1 not found, 3 rejected'
+    assert stock_and_price() == {'MED001': (3, 5.5), 'MED002': (5, 3.5), 'MED003': (20, 12.0)}
+    assert catalog.get_medicine('MED001')['Stock'] == 3
+
+
+def test_admin_endpoint_runs_a_batch(database):
+    import app
+    app.app.testing = True
+    with app.app.test_client() as client:
+        with client.session_transaction() as session:
+            session['user_id'] = 'AD001'
+            session['user_type'] = 'admin'
+        response = client.post('/admin/adjust_medicines', json={'changes': [{'Med_Code': 'MED002', 'Price': 4}]})
+    assert response.json['success']
+    assert stock_and_price()['MED002'] == (5, 4.0)
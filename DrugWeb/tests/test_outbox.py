@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import migrations
+import outbox
+from db import db_connection
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    """Events seen by a 'test_event' handler, and a flag set on the first one"""
+    migrations.run_migrations()
+    seen = []
+    done = threading.Event()
+
+    def handler(cursor, payload):
+        seen.append(payload)
+        done.set()
+    monkeypatch.setitem(outbox.HANDLERS, 'test_event', handler)
+    return seen, done
+
+
+def pending(event_type):
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM outbox WHERE event_type = %s", (event_type,))
+        count = cursor.fetchone()[0]
+        cursor.close()
+    return count
+
+
+def test_pending_event_drained_without_notify(handled):
+    seen, done = handled
+    # Left behind by an earlier run: committed, but nobody called notify()
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        outbox.enqueue(cursor, 'test_event', {'n': 1})
+        connection.commit()
+        cursor.close()
+
+    box = outbox.Outbox(workers=1, poll_interval=0.05)
+    box.start()
+    try:
+        assert done.wait(5)
+    finally:
+        box.close()
+    assert seen == [{'n': 1}]
+    assert pending('test_event') == 0
+
+
+def test_app_starts_dispatcher_on_first_request():
+    import app
+    app.app.test_client().get('/')
+    assert outbox.outbox._thread is not None and outbox.outbox._thread.is_alive()
+
+
+def test_missing_table_stops_polling(monkeypatch):
+    claims = []
+
+    def claim():
+        claims.append(1)
+        raise sqlite3.OperationalError("no such table: outbox")
+
+    box = outbox.Outbox(workers=1, poll_interval=0.01)
+    monkeypatch.setattr(box, 'claim', claim)
+    box.start()
+    try:
+        time.sleep(0.2)
+        assert len(claims) == 1
+        box.notify()
+        time.sleep(0.2)
+        assert len(claims) == 2
+    finally:
+        box.close()
@@ -0,0 +1,43 @@
+import pytest
+
+import catalog
+
+
+def names(page):
+    return [row['Name'] for row in page['medicines']]
+
+
+@pytest.mark.parametrize('state', [
+    {'s': 'name', 'c': '', 'q': '', 'r': '', 'd': 'next', 'k': ['Paracetamol', 'MED001'], 'p': 2},
+    {'s': 'price_desc', 'c': 'Pain Relief', 'q': 'para', 'r': '', 'o': 12, 'p': 2},
+    {'k': ['Zoë "x"/+', 'MED/001']}
+])
+def test_cursor_round_trips(state):
+    token = catalog.encode_cursor(state)
+    assert '=' not in token and '/' not in token and '+' not in token
+    assert catalog.decode_cursor(token) == state
+
+
+@pytest.mark.parametrize('token', [None, '', 'not a token', '!!!!', 'W10', 'bnVsbA'])
+def test_malformed_cursor_is_ignored(token):
+    assert catalog.decode_cursor(token) is None
+
+
+def test_browse_pages_forward_and_back(database):
+    first = catalog.browse_page(per_page=2)
+    assert names(first) == ['Amoxicillin', 'Aspirin']
+    assert first['prev_cursor'] is None
+
+    second = catalog.browse_page(cursor=first['next_cursor'], per_page=2)
+    assert names(second) == ['Paracetamol']
+    assert second['page'] == 2 and second['next_cursor'] is None
+
+    back = catalog.browse_page(cursor=second['prev_cursor'], per_page=2)
+    assert names(back) == ['Amoxicillin', 'Aspirin']
+    assert back['page'] == 1 and back['prev_cursor'] is None
+
+
+def test_cursor_from_another_listing_starts_over(database):
+    first = catalog.browse_page(sort_by='price', per_page=2)
+    assert names(catalog.browse_page(sort_by='name', cursor=first['next_cursor'], per_page=2)) == \
+        ['Amoxicillin', 'Aspirin']
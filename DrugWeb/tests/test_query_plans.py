@@ -0,0 +1,25 @@
+import migrations
+import queries
+import query_plans
+from db import db_connection
+
+
+def test_every_query_constant_is_registered():
+    assert query_plans.unregistered() == []
+
+
+def test_unregistered_constant_is_reported(monkeypatch):
+    monkeypatch.setattr(queries, 'NEW_QUERY', "SELECT * FROM medicine WHERE Name = %s", raising=False)
+    assert query_plans.unregistered() == ['NEW_QUERY']
+
+
+def test_hot_queries_use_an_index():
+    migrations.run_migrations()
+    with db_connection() as connection:
+        assert query_plans.check_query_plans(connection) == []
+
+
+def test_scan_fails_even_with_candidate_indexes():
+    plan = [{'table': 'medicine', 'type': 'ALL', 'possible_keys': 'idx_medicine_name_code'}]
+    assert query_plans.full_scans(plan, ()) == ['medicine']
+    assert query_plans.full_scans(plan, ('medicine',)) == []
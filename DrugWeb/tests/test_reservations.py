@@ -0,0 +1,68 @@
+import time
+
+import catalog
+import reservations
+from db import db_connection
+
+
+def stock():
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT Med_Code, Stock FROM medicine ORDER BY Med_Code")
+        result = dict(cursor.fetchall())
+        cursor.close()
+    return result
+
+
+def test_hold_beyond_free_stock_is_refused():
+    holds = reservations.HoldLedger()
+    assert holds.reserve('CM001', 'MED001', 4, 5) == (True, 5)
+    assert holds.reserve('CM002', 'MED001', 2, 5) == (False, 1)
+    assert holds.reserve('CM002', 'MED001', 1, 5) == (True, 1)
+    # Raising your own hold counts only the other carts
+    assert holds.reserve('CM001', 'MED001', 5, 5) == (False, 4)
+    assert holds.held('MED001') == 5
+
+
+def test_placed_hold_counts_against_other_carts():
+    holds = reservations.HoldLedger()
+    holds.place('CM001', 'MED001', 5)
+    assert holds.reserve('CM002', 'MED001', 1, 5) == (False, 0)
+    holds.release('CM001', ['MED001'])
+    assert holds.reserve('CM002', 'MED001', 1, 5) == (True, 5)
+
+
+def test_expired_hold_stops_counting():
+    holds = reservations.HoldLedger(hold_ttl=0.01)
+    holds.reserve('CM001', 'MED001', 5, 5)
+    time.sleep(0.02)
+    assert holds.sweep() == 1
+    assert holds.held('MED001') == 0
+    assert holds.reserve('CM002', 'MED001', 5, 5) == (True, 5)
+
+
+def test_take_stock_sells_nothing_when_one_item_is_short(database):
+    with db_connection() as connection:
+        cursor = connection.cursor()
+        assert not reservations.take_stock(cursor, {'MED001': 2, 'MED003': 3})
+        assert reservations.shortages(cursor, {'MED001': 2, 'MED003': 3}) == [('MED003', 2)]
+        connection.rollback()
+        assert reservations.take_stock(cursor, {'MED001': 2, 'MED003': 2})
+        connection.commit()
+        cursor.close()
+    assert stock() == {'MED001': 8, 'MED002': 5, 'MED003': 0}
+
+
+def test_stock_changed_patches_cached_rows_without_a_new_version(database):
+    listing = catalog.list_medicines()
+    version = catalog.version()
+    catalog.get_medicine('MED001')
+
+    catalog.stock_changed({'MED001': 2})
+    assert catalog.get_medicine('MED001')['Stock'] == 8
+    assert {row['Med_Code']: row['Stock'] for row in catalog.list_medicines()}['MED001'] == 8
+    assert {row['Med_Code']: row['Stock'] for row in listing}['MED001'] == 10   # callers' rows are untouched
+    assert catalog.version() == version
+
+    catalog.stock_changed({'MED003': 2})   # sold out: pages show it as out of stock now
+    assert catalog.version() != version